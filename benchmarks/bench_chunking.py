@@ -0,0 +1,97 @@
+"""
+Бенчмарк LateChunker: чанки в секунду на больших текстах для прежнего алгоритма склейки
+(перекрытие собирается через insert(0, ...), длина сегментов пересчитывается) и линейного.
+
+    python -m benchmarks.bench_chunking --megabytes 20
+    python -m benchmarks.bench_chunking --chunk-size 4000 --chunk-overlap 1500 --line-words 2
+    python -m benchmarks.bench_chunking --length words --chunk-size 200 --chunk-overlap 40
+
+Квадратичность прежней склейки проявляется, когда в перекрытие попадает много коротких
+сегментов: большие chunk_overlap и короткие строки (--line-words). С --length words длина
+считается в словах через TokenLength, как с настоящим токенизатором: прежняя склейка
+вызывала функцию длины повторно для каждого сегмента перекрытия.
+"""
+import argparse
+import json
+import random
+import time
+
+from src.internal.file_processor.processor import LateChunker, TokenLength
+
+
+WORDS = ("студент курсовая работа экзамен кафедра деканат стипендия сессия зачёт преподаватель "
+         "расписание семестр аудитория ведомость пересдача комиссия практика диплом").split()
+
+
+def make_text(megabytes: float, line_words: int, seed: int = 0) -> str:
+    """Синтетический текст из строк по line_words слов общим размером около megabytes МБ."""
+    rng = random.Random(seed)
+    lines, size = [], 0
+    while size < megabytes * 2 ** 20:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 2 * line_words)))
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def legacy_merge_splits(chunker: LateChunker, splits: list[str]) -> list[str]:
+    """Склейка сегментов в том виде, в каком она была до перехода на линейную."""
+    chunks, current_chunk, current_chunk_size = [], [], 0
+    for split in splits:
+        split_size = chunker.length_function(split)
+        if not current_chunk or current_chunk_size + split_size <= chunker.chunk_size:
+            current_chunk.append(split)
+            current_chunk_size += split_size
+        else:
+            chunks.append(chunker.separator.join(current_chunk))
+            overlap_size, overlap_chunks = 0, []
+            for i in range(len(current_chunk) - 1, -1, -1):
+                if overlap_size < chunker.chunk_overlap:
+                    overlap_size += chunker.length_function(current_chunk[i])
+                    overlap_chunks.insert(0, current_chunk[i])
+                else:
+                    break
+            current_chunk = overlap_chunks + [split]
+            current_chunk_size = overlap_size + split_size
+    if current_chunk:
+        chunks.append(chunker.separator.join(current_chunk))
+    return chunks
+
+
+def measure(name: str, merge, splits: list[str], megabytes: float, repeats: int) -> dict:
+    best, chunks = float("inf"), []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        chunks = merge(splits)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "engine": name,
+        "seconds": round(best, 4),
+        "chunks": len(chunks),
+        "chunks_per_sec": round(len(chunks) / best, 1),
+        "mb_per_sec": round(megabytes / best, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=10.0)
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--line-words", type=int, default=8, help="средняя длина строки в словах")
+    parser.add_argument("--length", choices=["chars", "words"], default="chars", help="единица chunk_size")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    length_function = TokenLength(str.split) if args.length == "words" else len
+    chunker = LateChunker(args.chunk_size, args.chunk_overlap, length_function=length_function)
+    splits = chunker._split_text(make_text(args.megabytes, args.line_words))
+    results = [
+        measure("legacy", lambda s: legacy_merge_splits(chunker, s), splits, args.megabytes, args.repeats),
+        measure("linear", chunker._merge_splits, splits, args.megabytes, args.repeats),
+    ]
+    print(json.dumps({"segments": len(splits), **vars(args), "results": results}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Офлайн-бенчмарк индексации и /api/ask без облачных сервисов: модель эмбеддингов и LLM
+заменены детерминированными заменителями из tests.fakes, Qdrant работает в режиме
+QdrantClient(":memory:"). Сервис собирается так же, как в main.py (LexicalIndexedStorage,
+гибридный поиск, Server), запросы идут через ASGI без сети.
+
+Измеряется:
+  * индексация: чанки и страницы в секунду через IngestionPipeline;
+  * /api/ask: задержка p50/p95/p99 и пропускная способность для каждого числа
+    одновременных клиентов из --clients;
+  * пиковый RSS процесса в каждой фазе (фоновый замер /proc/self/statm).
+
+    python -m benchmarks.bench_offline --output bench.json
+    python -m benchmarks.bench_offline --clients 1 8 32 --requests 400 --llm-latency 0.2
+    python -m benchmarks.bench_offline --baseline bench.json --max-regression 0.2
+
+С --baseline скрипт завершается с кодом 1, если скорость индексации упала или задержка
+выросла больше чем на --max-regression относительно сохранённого прогона.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import PointStruct
+
+from benchmarks.bench_pdf_parsing import make_corpus
+from src.internal.file_processor.processor import PDFChunker
+from src.internal.generator.generator import AsyncGenerator, Generator
+from src.internal.http_server.server import Server
+from src.internal.ingestion.pipeline import IngestionPipeline
+from src.internal.retriever.bm25 import BM25Index
+from src.internal.retriever.retriever import AsyncRetriever, Retriever
+from src.internal.storage.indexed import LexicalIndexedStorage
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.internal.storage.qdrant import AsyncQdrantStorage, QdrantStorage, collection_params
+from src.storage_config.config import StorageConfig
+from tests.fakes import FakeAsyncSDK, FakeLLMClient, FakeSDK
+
+
+TOPICS = ["курсовая работа", "экзамен", "пропуск", "учебный план", "кафедра", "билеты",
+          "сроки сдачи", "студенческий билет", "заседание кафедры", "территория университета"]
+TEMPLATES = ["Что нужно знать про {}?", "Как устроен {}?", "Кто отвечает за {}?",
+             "Какие сроки у {}?", "Где узнать про {}?"]
+
+
+def current_rss_mb() -> float:
+    """Текущий RSS процесса; без /proc — пиковый RSS за всё время работы."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRSS:
+    """Контекстный менеджер: RSS в начале фазы и максимум за фазу по замерам в фоновом потоке."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="bench-rss", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self) -> "PeakRSS":
+        self.baseline_mb = self.peak_mb = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def report(self) -> dict:
+        return {"rss_start_mb": round(self.baseline_mb, 1), "rss_peak_mb": round(self.peak_mb, 1)}
+
+
+def percentiles_ms(latencies: list[float]) -> dict:
+    latencies_ms = np.array(latencies) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(latencies_ms, p)), 2) for p in (50, 95, 99)}
+
+
+def make_queries(count: int) -> list[str]:
+    queries = [template.format(topic) for topic in TOPICS for template in TEMPLATES]
+    return [queries[i % len(queries)] + ("" if i < len(queries) else f" ({i})") for i in range(count)]
+
+
+def build_storages(args):
+    """Синхронное хранилище для индексации и асинхронное для /api/ask поверх тех же данных."""
+    config = StorageConfig(host="localhost", port=6333, vector_size=args.dim, upsert_parallelism=1,
+                           backend=args.backend)
+    if args.backend == "numpy":
+        storage = NumpyStorage(config)
+        return config, storage, AsyncNumpyStorage(storage)
+    storage = QdrantStorage(config, client=QdrantClient(":memory:"))
+    # In-memory клиенты не разделяют данные: точки копируются после индексации (mirror_points)
+    return config, storage, AsyncQdrantStorage(config, client=AsyncQdrantClient(":memory:"))
+
+
+async def mirror_points(config: StorageConfig, source: QdrantStorage, target: AsyncQdrantStorage):
+    await target.client.create_collection(collection_name=config.collection_name, **collection_params(config))
+    offset = None
+    while True:
+        points, offset = source.client.scroll(collection_name=config.collection_name, limit=256, offset=offset,
+                                              with_payload=True, with_vectors=True)
+        if points:
+            await target.client.upsert(
+                collection_name=config.collection_name,
+                points=[PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in points],
+            )
+        if offset is None:
+            return
+
+
+def run_ingest(args, retriever: Retriever, sdk: FakeSDK, paths: list[str]) -> dict:
+    pipeline = IngestionPipeline(retriever, PDFChunker(args.chunk_size, args.chunk_overlap),
+                                 batch_size=args.batch_size)
+    pages = []
+    with PeakRSS() as memory:
+        started = time.perf_counter()
+        stats = [pipeline.run(path, progress=lambda event, n: pages.append(n) if event == "pages" else None)
+                 for path in paths]
+        elapsed = time.perf_counter() - started
+    chunks = sum(item["added"] for item in stats)
+    return {
+        "files": len(paths),
+        "pages": sum(pages),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(chunks / elapsed, 1),
+        "pages_per_sec": round(sum(pages) / elapsed, 1),
+        "embedding_calls": sdk.models.text_embeddings("doc").calls,
+        **memory.report(),
+    }
+
+
+async def run_clients(client: httpx.AsyncClient, queries: list[str], requests: int, clients: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for number in numbers:
+            started = time.perf_counter()
+            response = await client.post("/api/ask", json={"query": queries[number % len(queries)]})
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code != 200
+
+    with PeakRSS() as memory:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        **percentiles_ms(latencies),
+        "max_ms": round(max(latencies) * 1000, 2),
+        **memory.report(),
+    }
+
+
+async def run_ask(args, config, storage, async_storage, index: BM25Index) -> list[dict]:
+    if isinstance(async_storage, AsyncQdrantStorage):
+        await mirror_points(config, storage, async_storage)
+
+    sdk, async_sdk = FakeSDK(args.dim, args.embed_latency), FakeAsyncSDK(args.dim, args.embed_latency)
+    generator = Generator(Retriever(storage, lexical_index=index, search_mode=args.search_mode, sdk=sdk))
+    generator.client = FakeLLMClient(args.llm_latency)
+    async_generator = None
+    if args.generator == "async":
+        async_generator = AsyncGenerator(AsyncRetriever(async_storage, lexical_index=index,
+                                                        search_mode=args.search_mode, sdk=async_sdk))
+        async_generator.client = FakeLLMClient(args.llm_latency, asynchronous=True)
+
+    app = FastAPI()
+    app.include_router(Server(storage=storage, generator=generator, async_generator=async_generator).router)
+    queries = make_queries(args.distinct_queries)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await run_clients(client, queries, min(args.requests, 20), 1)  # прогрев
+        for clients in args.clients:
+            results.append(await run_clients(client, queries, args.requests, clients))
+    if isinstance(async_storage, AsyncQdrantStorage):
+        await async_storage.close()
+    return results
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Список регрессий текущего прогона относительно baseline."""
+    problems = []
+    before, after = baseline["ingest"]["chunks_per_sec"], current["ingest"]["chunks_per_sec"]
+    if after < before * (1 - max_regression):
+        problems.append(f"ingest chunks_per_sec {before} -> {after}")
+    previous = {level["clients"]: level for level in baseline["ask"]}
+    for level in current["ask"]:
+        old = previous.get(level["clients"])
+        if old is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if level[key] > old[key] * (1 + max_regression):
+                problems.append(f"ask clients={level['clients']} {key} {old[key]} -> {level[key]}")
+    return problems
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "commit": commit}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=50, help="страниц в каждом синтетическом PDF")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--backend", choices=["qdrant", "numpy"], default="qdrant")
+    parser.add_argument("--search-mode", choices=["vector", "hybrid"], default="hybrid")
+    parser.add_argument("--generator", choices=["async", "sync"], default="async",
+                        help="async — AsyncGenerator в event loop, sync — Generator в пуле потоков")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="запросов на каждое число клиентов")
+    parser.add_argument("--distinct-queries", type=int, default=100)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="задержка одного вызова эмбеддинга, с")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="задержка ответа LLM, с")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Клиенты OpenAI требуют ключ при создании; запросы уходят в FakeLLMClient
+    os.environ.setdefault("api", "offline")
+
+    config, storage, async_storage = build_storages(args)
+    index = BM25Index()
+    indexed = LexicalIndexedStorage(storage, index)
+    sdk = FakeSDK(args.dim, args.embed_latency)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_corpus(directory, args.files, args.pages)
+        ingest = run_ingest(args, Retriever(indexed, lexical_index=index, sdk=sdk), sdk, paths)
+
+    ask = asyncio.run(run_ask(args, config, storage, async_storage, index))
+    result = {"environment": environment(), "config": vars(args), "ingest": ingest, "ask": ask}
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
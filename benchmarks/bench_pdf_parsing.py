@@ -0,0 +1,82 @@
+"""
+Бенчмарк многопроцессного разбора PDF: масштабирование PDFChunker по числу процессов.
+
+    python -m benchmarks.bench_pdf_parsing --files 4 --pages 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import fitz
+
+from src.internal.file_processor.processor import PDFChunker
+
+
+PARAGRAPH = (
+    "Студент обязан выполнить курсовую работу в сроки, установленные учебным планом. "
+    "Экзамен проводится по билетам, утверждённым на заседании кафедры. "
+    "Пропуск на территорию выдаётся при предъявлении студенческого билета. "
+)
+
+
+def make_corpus(directory: str, files: int, pages: int) -> list[str]:
+    """Создаёт синтетические PDF файлы с несколькими абзацами текста на каждой странице."""
+    paths = []
+    for file_index in range(files):
+        doc = fitz.open()
+        for page_index in range(pages):
+            page = doc.new_page()
+            text = "\n".join(f"{page_index}.{line} {PARAGRAPH}" for line in range(12))
+            page.insert_textbox(fitz.Rect(36, 36, 560, 800), text, fontsize=8, fontname="helv")
+        path = os.path.join(directory, f"synthetic_{file_index}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def run(paths: list[str], workers: int) -> dict:
+    chunker = PDFChunker(chunk_size=800, chunk_overlap=150, workers=workers, min_parallel_pages=1)
+    try:
+        if workers > 1:
+            # Прогреваем пул, чтобы не учитывать время запуска процессов
+            chunker.process_pdfs(paths[:1])
+        started = time.perf_counter()
+        results = chunker.process_pdfs(paths)
+        elapsed = time.perf_counter() - started
+    finally:
+        chunker.close()
+    pages = sum(len(fitz.open(path)) for path in paths)
+    return {
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 1),
+        "chunks": sum(len(chunks) for chunks in results),
+        "fingerprint": hash(tuple(chunk.chunk_id + chunk.text for chunks in results for chunk in chunks)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workers = sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i <= args.max_workers], args.max_workers})
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_corpus(directory, args.files, args.pages)
+        results = [run(paths, count) for count in workers]
+
+    baseline, reference = results[0]["seconds"], results[0]["fingerprint"]
+    for result in results:
+        result["speedup"] = round(baseline / result["seconds"], 2)
+        # Результат должен совпадать с последовательной обработкой
+        result["deterministic"] = result.pop("fingerprint") == reference
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Recall@k относительно точного поиска, задержка p50/p99 и оценка RAM для настроек
+HNSW и квантования из StorageConfig.
+
+    python -m benchmarks.bench_qdrant_tuning --qdrant-host localhost --points 50000
+    python -m benchmarks.bench_qdrant_tuning --qdrant-host localhost --configs baseline scalar binary-x3
+
+HNSW и квантование работают только в сервере Qdrant: без --qdrant-host используется
+in-memory клиент, который всегда ищет точно, и результаты показывают лишь накладные расходы.
+Граф строится после превышения indexing_threshold (~20 МБ векторов), поэтому на малых
+--points сервер тоже ищет полным перебором.
+"""
+import argparse
+import json
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import CollectionStatus
+
+from benchmarks.bench_vector_stores import exact_top_k, make_dataset
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+
+
+CONFIGS = {
+    "baseline": {},
+    "hnsw-m32": {"hnsw_m": 32, "hnsw_ef_construct": 200},
+    "ef-256": {"search_ef": 256},
+    "scalar": {"quantization": "scalar"},
+    "scalar-on-disk": {"quantization": "scalar", "on_disk": True},
+    "binary-x3": {"quantization": "binary", "oversampling": 3.0},
+    "binary-no-rescore": {"quantization": "binary", "rescore": False},
+}
+
+
+def estimate_ram_mb(config: StorageConfig, points: int) -> float:
+    """
+    Оценка памяти под вектора и граф: исходные float32 (если не on_disk), квантованные
+    вектора (int8 или 1 бит на измерение) и связи HNSW (2 * m ссылок по 4 байта на точку).
+    """
+    dim = config.vector_size
+    total = 0.0 if config.on_disk else points * dim * 4
+    if config.quantization == "scalar" and config.quantization_always_ram:
+        total += points * dim
+    elif config.quantization == "binary" and config.quantization_always_ram:
+        total += points * dim / 8
+    total += points * 2 * (config.hnsw_m or 16) * 4
+    return total / 2 ** 20
+
+
+def wait_indexed(client: QdrantClient, collection_name: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection_name).status != CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Collection {collection_name} was not indexed in {timeout} s")
+        time.sleep(0.5)
+
+
+def run_config(name: str, overrides: dict, args, vectors, queries, truth) -> dict:
+    config = StorageConfig(host=args.qdrant_host or "localhost", port=args.qdrant_port, vector_size=args.dim,
+                           collection_name=f"bench_{uuid.uuid4().hex[:8]}",
+                           upsert_parallelism=4 if args.qdrant_host else 1, **overrides)
+    client = QdrantClient(url=config.qdrant_url) if args.qdrant_host else QdrantClient(":memory:")
+    storage = QdrantStorage(config, client=client)
+    try:
+        started = time.perf_counter()
+        storage.save_data(vectors, [str(i) for i in range(len(vectors))],
+                          [{"source": "bench", "chunk_index": i} for i in range(len(vectors))])
+        wait_indexed(client, config.collection_name)
+        ingest = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = storage.get_data(query, top_k=args.top_k)
+            latencies.append(time.perf_counter() - started)
+            hits += len({int(payload["text"]) for payload in result} & set(expected.tolist()))
+    finally:
+        client.delete_collection(config.collection_name)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "config": name,
+        **overrides,
+        "ingest_seconds": round(ingest, 2),
+        f"recall@{args.top_k}": round(hits / (len(queries) * args.top_k), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "ram_estimate_mb": round(estimate_ram_mb(config, len(vectors)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--qdrant-host", help="хост Qdrant; без него используется in-memory клиент")
+    parser.add_argument("--qdrant-port", type=int, default=6333)
+    args = parser.parse_args()
+
+    vectors, queries = make_dataset(args.points, args.queries, args.dim)
+    truth = exact_top_k(vectors, queries, args.top_k)
+    results = [run_config(name, CONFIGS[name], args, vectors, queries, truth) for name in args.configs]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Бенчмарк скорости загрузки точек в QdrantStorage при разных режимах upsert.
+
+Запуск против локального Qdrant (REST и gRPC):
+    python -m benchmarks.bench_qdrant_upsert --host localhost --points 20000
+Без Qdrant используется in-memory клиент с имитацией сетевой задержки:
+    python -m benchmarks.bench_qdrant_upsert --points 5000 --rtt-ms 5
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+
+
+class InMemoryQdrant:
+    """
+    Заменитель сервера Qdrant: in-memory клиент за блокировкой плюс фиксированная задержка
+    на запрос, имитирующая сетевой round-trip и ожидание индексации при wait=True.
+    """
+
+    def __init__(self, rtt: float, apply_per_point: float):
+        self._client = QdrantClient(":memory:")
+        self._lock = threading.Lock()
+        self.rtt = rtt
+        self.apply_per_point = apply_per_point
+
+    def upsert(self, collection_name, points, wait=True):
+        time.sleep(self.rtt + (self.apply_per_point * len(points) if wait else 0.0))
+        with self._lock:
+            return self._client.upsert(collection_name=collection_name, points=points)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+MODES = {
+    "single-request": dict(upsert_batch_size=10 ** 9, upsert_parallelism=1, upsert_wait=True),
+    "batched-serial-wait": dict(upsert_batch_size=256, upsert_parallelism=1, upsert_wait=True),
+    "batched-parallel-wait": dict(upsert_batch_size=256, upsert_parallelism=4, upsert_wait=True),
+    "batched-parallel-nowait": dict(upsert_batch_size=256, upsert_parallelism=4, upsert_wait=False),
+}
+
+
+def run_mode(name: str, overrides: dict, args, prefer_grpc: bool) -> dict:
+    collection = f"bench_{uuid.uuid4().hex[:8]}"
+    config = StorageConfig(host=args.host or "localhost", port=args.port, vector_size=args.dim,
+                           collection_name=collection, prefer_grpc=prefer_grpc, **overrides)
+    client = None if args.host else InMemoryQdrant(args.rtt_ms / 1000, args.apply_us / 1e6)
+    storage = QdrantStorage(config, client=client)
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.points, args.dim), dtype=np.float32)
+    chunks = [f"chunk {i}" for i in range(args.points)]
+    metadata = [{"source": "bench.pdf", "page": i // 10, "chunk_index": i} for i in range(args.points)]
+
+    started = time.perf_counter()
+    storage.save_data(embeddings, chunks, metadata)
+    elapsed = time.perf_counter() - started
+
+    count = storage.client.count(collection).count
+    storage.client.delete_collection(collection)
+    return {
+        "mode": name,
+        "transport": ("grpc" if prefer_grpc else "rest") if args.host else "in-memory",
+        "points": count,
+        "seconds": round(elapsed, 3),
+        "points_per_sec": round(args.points / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", help="хост Qdrant; без него используется in-memory заменитель")
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="задержка запроса in-memory заменителя")
+    parser.add_argument("--apply-us", type=float, default=20.0,
+                        help="время применения одной точки при wait=True в in-memory заменителе")
+    args = parser.parse_args()
+
+    transports = [False, True] if args.host else [False]
+    results = [run_mode(name, overrides, args, prefer_grpc)
+               for prefer_grpc in transports
+               for name, overrides in MODES.items()]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
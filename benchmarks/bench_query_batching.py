@@ -0,0 +1,142 @@
+"""
+Бенчмарк микропакетирования запросов AsyncRetriever: пропускная способность и задержка
+при --clients одновременных клиентах для каждого окна из --windows-ms ("off" — без пакетирования).
+
+Модель эмбеддингов — FakeAsyncSDK с задержкой --embed-latency на вызов, кэш запросов выключен.
+Хранилище — Qdrant-сервер (--qdrant-host) или NumpyStorage, к каждому обращению которого
+добавляется --search-rtt (сетевой круг до Qdrant), причём одновременно обслуживается не больше
+--search-slots обращений: так моделируется сервер, у которого пакетный поиск экономит
+круги и очередь, а не вычисления.
+
+    python -m benchmarks.bench_query_batching
+    python -m benchmarks.bench_query_batching --clients 64 --windows-ms off 1 2 5 10 --max-batch-size 32
+    python -m benchmarks.bench_query_batching --qdrant-host localhost --search-rtt 0
+
+Окно добавляет к задержке одиночного запроса до window мс; выигрыш появляется, когда
+запросов в полёте больше, чем хранилище успевает обслужить по одному.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from benchmarks.bench_offline import make_queries, percentiles_ms
+from src.internal.retriever.batching import BATCH_SIZE
+from src.internal.retriever.retriever import AsyncRetriever
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.internal.storage.qdrant import AsyncQdrantStorage, QdrantStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import FakeAsyncSDK, fake_vector
+
+
+WORDS = ("студент курсовая работа экзамен кафедра деканат стипендия сессия зачёт преподаватель "
+         "расписание семестр аудитория ведомость пересдача комиссия практика диплом пропуск билеты").split()
+
+
+class RemoteLikeStorage(AsyncNumpyStorage):
+    """AsyncNumpyStorage с задержкой сетевого круга и ограниченным числом одновременных обращений."""
+
+    def __init__(self, storage: NumpyStorage, rtt: float, slots: int):
+        super().__init__(storage)
+        self.rtt = rtt
+        self.slots = slots
+        self.calls = 0
+        self._semaphore = None
+
+    async def _round_trip(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.slots)
+        self.calls += 1
+        async with self._semaphore:
+            await asyncio.sleep(self.rtt)
+
+    async def get_data(self, query_embedding, top_k, with_vectors=False, filters=None):
+        await self._round_trip()
+        return await super().get_data(query_embedding, top_k, with_vectors, filters)
+
+    async def get_data_batch(self, query_embeddings, top_k, with_vectors=False, filters=None):
+        await self._round_trip()
+        return await super().get_data_batch(query_embeddings, top_k, with_vectors, filters)
+
+
+def make_chunks(count: int, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, size=int(rng.integers(20, 60)))) for _ in range(count)]
+
+
+def build_storage(args, chunks: list[str]):
+    config = StorageConfig(host=args.qdrant_host or "localhost", port=args.qdrant_port, vector_size=args.dim,
+                           collection_name="bench_query_batching")
+    embeddings = np.stack([fake_vector(chunk, args.dim) for chunk in chunks])
+    metadata = [{"source": f"doc{i % 20}.pdf", "page": 1, "chunk_index": i} for i in range(len(chunks))]
+    if args.qdrant_host:
+        storage = QdrantStorage(config, client=QdrantClient(url=config.qdrant_url))
+        storage.save_data(embeddings, chunks, metadata)
+        return AsyncQdrantStorage(config, client=AsyncQdrantClient(url=config.qdrant_url))
+    storage = NumpyStorage(config)
+    storage.save_data(embeddings, chunks, metadata)
+    return RemoteLikeStorage(storage, args.search_rtt, args.search_slots)
+
+
+async def run_window(args, storage, window_ms, queries: list[str]) -> dict:
+    batch_window = None if window_ms == "off" else float(window_ms) / 1000
+    retriever = AsyncRetriever(storage, query_cache_size=0, sdk=FakeAsyncSDK(args.dim, args.embed_latency),
+                               batch_window=batch_window, max_batch_size=args.max_batch_size)
+    pending = iter(queries)
+    latencies = []
+
+    async def client():
+        for query in pending:
+            started = time.perf_counter()
+            await retriever.search(query)
+            latencies.append(time.perf_counter() - started)
+
+    batches = BATCH_SIZE.snapshot()
+    calls = getattr(storage, "calls", None)
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    after = BATCH_SIZE.snapshot()
+    batch_count = after["count"] - batches["count"]
+    return {
+        "window_ms": window_ms,
+        "queries_per_sec": round(len(latencies) / elapsed, 1),
+        **percentiles_ms(latencies),
+        "avg_batch_size": round((after["sum"] - batches["sum"]) / batch_count, 2) if batch_count else 1.0,
+        "storage_calls": storage.calls - calls if calls is not None else None,
+    }
+
+
+async def run(args) -> list[dict]:
+    storage = build_storage(args, make_chunks(args.points))
+    queries = make_queries(args.requests)
+    results = []
+    for window_ms in args.windows_ms:
+        results.append(await run_window(args, storage, window_ms, queries))
+    await storage.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--windows-ms", nargs="+", default=["off", "1", "2", "5", "10"])
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="задержка модели эмбеддингов, с")
+    parser.add_argument("--search-rtt", type=float, default=0.004, help="сетевой круг до хранилища, с")
+    parser.add_argument("--search-slots", type=int, default=4, help="одновременных обращений к хранилищу")
+    parser.add_argument("--qdrant-host", help="хост Qdrant; без него — NumpyStorage с --search-rtt")
+    parser.add_argument("--qdrant-port", type=int, default=6333)
+    args = parser.parse_args()
+
+    print(json.dumps({**vars(args), "results": asyncio.run(run(args))}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Время импорта и пиковая память (RSS) модулей сервиса в чистом интерпретаторе.
+Каждый модуль импортируется в отдельном процессе; дополнительно проверяется,
+что тяжёлые зависимости (torch, sentence_transformers) не попали в sys.modules.
+
+    python -m benchmarks.bench_startup --repeat 3
+    python -m benchmarks.bench_startup --max-seconds 3 --max-rss-mb 400
+С порогами скрипт завершается с кодом 1 при превышении — удобно для CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+MODULES = [
+    "src.interfaces.interfaces",
+    "src.internal.retriever.retriever",
+    "src.internal.generator.generator",
+    "src.internal.http_server.server",
+    "main",
+]
+
+FORBIDDEN = ("torch", "sentence_transformers")
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "forbidden": [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, forbidden=FORBIDDEN)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, help="порог времени импорта main")
+    parser.add_argument("--max-rss-mb", type=float, help="порог пиковой памяти после импорта main")
+    args = parser.parse_args()
+
+    results = []
+    for module in MODULES:
+        runs = [probe(module) for _ in range(args.repeat)]
+        results.append({
+            "module": module,
+            "import_seconds": round(statistics.median(run["seconds"] for run in runs), 3),
+            "rss_mb": round(max(run["rss_mb"] for run in runs), 1),
+            "forbidden_imports": runs[0]["forbidden"],
+        })
+    print(json.dumps(results, indent=2))
+
+    app = results[-1]
+    failed = bool(app["forbidden_imports"])
+    if args.max_seconds is not None and app["import_seconds"] > args.max_seconds:
+        failed = True
+    if args.max_rss_mb is not None and app["rss_mb"] > args.max_rss_mb:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
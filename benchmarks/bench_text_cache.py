@@ -0,0 +1,62 @@
+"""
+Бенчмарк кэша текста страниц PDF: повторное разбиение синтетического корпуса на чанки
+с другими chunk_size/chunk_overlap без кэша (каждый раз разбор PDF через PyMuPDF)
+и с PageTextCache (первый проход заполняет кэш, следующие читают текст из mmap).
+
+    python -m benchmarks.bench_text_cache
+    python -m benchmarks.bench_text_cache --files 8 --pages 300 --workers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.bench_pdf_parsing import make_corpus
+from src.internal.file_processor.processor import PDFChunker
+from src.internal.file_processor.text_cache import PageTextCache
+
+
+SETTINGS = [(800, 150), (500, 100), (1200, 200), (300, 50)]
+
+
+def run(paths: list[str], workers: int, text_cache) -> list[dict]:
+    results = []
+    for chunk_size, chunk_overlap in SETTINGS:
+        chunker = PDFChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap, workers=workers,
+                             text_cache=text_cache)
+        try:
+            started = time.perf_counter()
+            chunks = chunker.process_pdfs(paths)
+            elapsed = time.perf_counter() - started
+        finally:
+            chunker.close()
+        results.append({"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "seconds": round(elapsed, 3),
+                        "chunks": sum(len(document) for document in chunks)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_corpus(directory, args.files, args.pages)
+        uncached = run(paths, args.workers, None)
+        cache = PageTextCache(os.path.join(directory, "text_cache"))
+        cached = run(paths, args.workers, cache)
+        stats = cache.stats()
+
+    for plain, with_cache in zip(uncached, cached):
+        # Кэш не должен менять результат разбиения
+        assert plain["chunks"] == with_cache["chunks"]
+        with_cache["speedup"] = round(plain["seconds"] / with_cache["seconds"], 2)
+    print(json.dumps({"config": vars(args), "uncached": uncached, "cached": cached,
+                      "text_cache": stats}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Сравнение задержки поиска и полноты (recall@k) NumpyStorage и QdrantStorage.
+
+    python -m benchmarks.bench_vector_stores --points 5000 --queries 200
+    python -m benchmarks.bench_vector_stores --qdrant-host localhost
+Без --qdrant-host QdrantStorage работает поверх in-memory QdrantClient(":memory:").
+"""
+import argparse
+import json
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from src.internal.storage.numpy_storage import NumpyStorage
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+
+
+def make_dataset(points: int, queries: int, dim: int, seed: int = 0):
+    """Кластеризованные вектора: ближе к реальным эмбеддингам, чем равномерный шум."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(points // 50, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), points)] + 0.3 * rng.standard_normal((points, dim))
+    query_vectors = centers[rng.integers(0, len(centers), queries)] + 0.3 * rng.standard_normal((queries, dim))
+    return vectors.astype(np.float32), query_vectors.astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = queries @ normed.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def measure(name: str, storage, vectors, queries, truth, k: int) -> dict:
+    texts = [str(i) for i in range(len(vectors))]
+    metadata = [{"source": "bench", "chunk_index": i} for i in range(len(vectors))]
+    started = time.perf_counter()
+    storage.save_data(vectors, texts, metadata)
+    ingest = time.perf_counter() - started
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = storage.get_data(query, top_k=k)
+        latencies.append(time.perf_counter() - started)
+        hits += len({int(payload["text"]) for payload in result} & set(expected.tolist()))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "storage": name,
+        "ingest_seconds": round(ingest, 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        f"recall@{k}": round(hits / (len(queries) * k), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--qdrant-host", help="хост Qdrant; без него используется in-memory клиент")
+    parser.add_argument("--qdrant-port", type=int, default=6333)
+    args = parser.parse_args()
+
+    vectors, queries = make_dataset(args.points, args.queries, args.dim)
+    truth = exact_top_k(vectors, queries, args.top_k)
+
+    config = StorageConfig(host=args.qdrant_host or "localhost", port=args.qdrant_port, vector_size=args.dim,
+                           collection_name=f"bench_{uuid.uuid4().hex[:8]}", upsert_parallelism=1)
+    client = None if args.qdrant_host else QdrantClient(":memory:")
+    qdrant = QdrantStorage(config, client=client)
+    results = [
+        measure("numpy", NumpyStorage(config), vectors, queries, truth, args.top_k),
+        measure("qdrant" if args.qdrant_host else "qdrant-in-memory", qdrant, vectors, queries, truth, args.top_k),
+    ]
+    qdrant.client.delete_collection(config.collection_name)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Нагрузочный тест масштабирования по воркерам: для каждого значения --workers запускается
+uvicorn с фабрикой приложения main.create_app, и --clients одновременных клиентов шлют
+/api/ask по HTTP. Облачные модели заменены заменителями из tests.fakes, у каждого воркера
+своё NumpyStorage с одинаковым синтетическим корпусом (BENCH_POINTS точек), поэтому
+на запрос приходится реальная работа CPU: JSON, векторный поиск, BM25, сборка промпта.
+
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --clients 64 --duration 20
+    python -m benchmarks.bench_workers --llm-latency 0.2 --points 50000
+
+Запросы в секунду растут с числом воркеров, пока воркеров не больше ядер и узкое место —
+CPU одного процесса, а не задержка LLM.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_offline import environment, make_queries, percentiles_ms
+
+
+def offline_app():
+    """Фабрика для uvicorn --factory: main.create_app с офлайн-сервисами (параметры — из BENCH_*)."""
+    from main import create_app
+
+    return create_app(services_factory=build_offline_services)
+
+
+def build_offline_services():
+    from main import Services
+    from src.internal.generator.generator import AsyncGenerator, Generator
+    from src.internal.ingestion.jobs import JobManager
+    from src.internal.retriever.bm25 import BM25Index
+    from src.internal.retriever.retriever import AsyncRetriever, Retriever
+    from src.internal.storage.indexed import LexicalIndexedStorage
+    from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+    from src.storage_config.config import StorageConfig
+    from tests.fakes import FakeAsyncSDK, FakeLLMClient, FakeSDK, fake_vector
+    from benchmarks.bench_query_batching import make_chunks
+
+    points = int(os.getenv("BENCH_POINTS", 20000))
+    dim = int(os.getenv("BENCH_DIM", 256))
+    llm_latency = float(os.getenv("BENCH_LLM_LATENCY", 0.0))
+    config = StorageConfig(host="localhost", port=6333, vector_size=dim, backend="numpy")
+
+    index = BM25Index()
+    storage = LexicalIndexedStorage(NumpyStorage(config, initial_capacity=points), index)
+    chunks = make_chunks(points)
+    storage.save_data(np.stack([fake_vector(chunk, dim) for chunk in chunks]), chunks,
+                      [{"source": f"doc{i % 50}.pdf", "page": i % 30 + 1, "chunk_index": i} for i in range(points)])
+
+    retriever = Retriever(storage, lexical_index=index, search_mode="hybrid", sdk=FakeSDK(dim))
+    async_retriever = AsyncRetriever(AsyncNumpyStorage(storage.storage), lexical_index=index, search_mode="hybrid",
+                                     query_cache_size=0, sdk=FakeAsyncSDK(dim))
+    return Services(
+        storage=storage,
+        retriever=retriever,
+        generator=Generator(retriever, client=FakeLLMClient(llm_latency)),
+        async_generator=AsyncGenerator(async_retriever, client=FakeLLMClient(llm_latency, asynchronous=True)),
+        job_manager=JobManager(retriever, workers=1, parse_workers=1),
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "api": "offline", "BENCH_POINTS": str(args.points), "BENCH_DIM": str(args.dim),
+           "BENCH_LLM_LATENCY": str(args.llm_latency)}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_workers:offline_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, workers: int, timeout: float):
+    """Ждёт, пока сервер начнёт отвечать на /api/ask, и прогревает воркеры несколькими запросами."""
+    deadline = time.monotonic() + timeout
+    successes = 0
+    while time.monotonic() < deadline:
+        try:
+            response = await client.post("/api/ask", json={"query": "прогрев"})
+            successes += response.status_code == 200
+            if successes >= 4 * workers:
+                return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start in time")
+
+
+async def load(args, port: int, workers: int) -> dict:
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        await wait_ready(client, workers, args.startup_timeout)
+        queries = make_queries(args.distinct_queries)
+        latencies, errors = [], 0
+        deadline = time.monotonic() + args.duration
+
+        async def user(offset: int):
+            nonlocal errors
+            i = offset
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = await client.post("/api/ask", json={"query": queries[i % len(queries)]})
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+                i += args.clients
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(args.clients)))
+        elapsed = time.perf_counter() - started
+    return {"workers": workers, "requests_per_sec": round(len(latencies) / elapsed, 1), "errors": errors,
+            **percentiles_ms(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность нагрузки, с")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--distinct-queries", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="задержка ответа LLM, с")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        server = start_server(args, workers, port)
+        try:
+            results.append(asyncio.run(load(args, port, workers)))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+
+    base = results[0]["requests_per_sec"] or 1.0
+    for result in results:
+        result["speedup"] = round(result["requests_per_sec"] / base, 2)
+    print(json.dumps({"environment": environment(), "config": vars(args),
+                      "results": results}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,271 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from src.internal.http_server.server import Server
-from src.internal.storage.qdrant import QdrantStorage
-from src.internal.retriever.retriever import Retriever
+from src.internal.storage.qdrant import AsyncQdrantStorage, QdrantStorage
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.internal.storage.indexed import LexicalIndexedStorage
+from src.internal.retriever.retriever import AsyncRetriever, Retriever
 import uvicorn
-from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+import inspect
 import os
 import logging
 from src.storage_config.config import StorageConfig
-from src.internal.generator.generator import Generator
+from src.internal.generator.generator import AsyncGenerator, Generator, create_llm_client
+from src.internal.generator.answer_cache import SemanticAnswerCache
+from src.internal.metrics.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
+from src.internal.metrics.multiprocess import WorkerMetricsExporter
+from src.internal.metrics.tracing import RequestMetricsMiddleware, configure_logging
+from src.internal.retriever.embedding_cache import EmbeddingCache
+from src.internal.retriever.bm25 import BM25Index
+from src.internal.ingestion.generation import CorpusGeneration
+from src.internal.ingestion.jobs import DEFAULT_DOCUMENTS_DIR, JobManager
+from src.internal.file_processor.processor import load_tokenizer_length
+from src.internal.file_processor.text_cache import PageTextCache
 
 
-logging.basicConfig(level=logging.INFO)
+# LOG_TRACE_IDS=true добавляет trace id запроса (заголовок X-Request-ID) в каждую строку лога
+configure_logging(logging.INFO, trace_ids=os.getenv("LOG_TRACE_IDS", "false").lower() == "true")
 logger = logging.getLogger(__name__)
 
 
-def main() -> None:
+def optional_env(name: str, cast=str):
+    """Значение переменной окружения, приведённое к типу, или None, если она не задана."""
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+
+def worker_count() -> int:
+    """
+    Число процессов сервера: WORKERS или WEB_CONCURRENCY. Флаги uvicorn --workers и gunicorn -w
+    воркерам не видны, поэтому при запуске через них WORKERS задаётся вместе с флагом (см. create_app).
+    """
+    return int(os.getenv("WORKERS") or os.getenv("WEB_CONCURRENCY") or 1)
+
+
+def ingestion_enabled(workers: int) -> bool:
+    """
+    Индексирует ли этот экземпляр документы: только при явном INGESTION_ENABLED=true (python main.py
+    с одним воркером задаёт его сам). Задания индексации, запись BM25 индекса и кэш текста PDF живут
+    в памяти и файлах одного процесса, а воркер не может надёжно узнать, что он не единственный,
+    поэтому по умолчанию экземпляр только отвечает на вопросы. Документы загружает отдельный
+    экземпляр с одним воркером и теми же Qdrant, BM25_INDEX_PATH и CORPUS_GENERATION_PATH.
+    """
+    enabled = os.getenv("INGESTION_ENABLED", "false").lower() == "true"
+    if enabled and workers > 1:
+        raise ValueError("Ingestion requires a single worker: run it in a separate instance with WORKERS=1 "
+                         "and set INGESTION_ENABLED=false here")
+    return enabled
+
+
+@dataclass
+class Services:
+    """Клиенты и сервисы одного воркера: создаются при старте приложения, закрываются при остановке."""
+    storage: LexicalIndexedStorage
+    retriever: Retriever
+    generator: Generator
+    async_generator: AsyncGenerator
+    # None — индексация в этом экземпляре отключена
+    job_manager: Optional[JobManager]
+    on_shutdown: List[Callable] = field(default_factory=list)
+
+    async def close(self):
+        """Вызывает обработчики on_shutdown по порядку; ошибка одного не мешает остальным."""
+        for handler in self.on_shutdown:
+            try:
+                result = handler()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Shutdown handler %r failed", handler)
+
+
+def build_services(workers: int = 1) -> Services:
+    """
+    Создаёт хранилища, клиенты моделей и сервисы. Вызывается в каждом воркере при старте
+    приложения: соединения с Qdrant, облачными моделями и LLM не разделяются между процессами.
+    :param workers: число процессов сервера; при нескольких воркерах экземпляр не индексирует документы
+    """
+    ingesting = ingestion_enabled(workers)
     config = StorageConfig(
         host=os.getenv("QDRANT_HOST", "localhost"),
         port=int(os.getenv("QDRANT_PORT", 6333)),
-        vector_size=312
+        vector_size=312,
+        grpc_port=int(os.getenv("QDRANT_GRPC_PORT", 6334)),
+        prefer_grpc=os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true",
+        upsert_batch_size=int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", 256)),
+        upsert_parallelism=int(os.getenv("QDRANT_UPSERT_PARALLELISM", 4)),
+        backend=os.getenv("STORAGE_BACKEND", "qdrant"),
+        numpy_path=os.getenv("NUMPY_STORAGE_PATH"),
+        hnsw_m=optional_env("QDRANT_HNSW_M", int),
+        hnsw_ef_construct=optional_env("QDRANT_HNSW_EF_CONSTRUCT", int),
+        search_ef=optional_env("QDRANT_SEARCH_EF", int),
+        on_disk=os.getenv("QDRANT_ON_DISK", "false").lower() == "true",
+        quantization=optional_env("QDRANT_QUANTIZATION"),
+        oversampling=optional_env("QDRANT_OVERSAMPLING", float)
     )
-    logger.info(f"Storage config: host={config.host}, port={config.port}")
+    logger.info(f"Storage config: backend={config.backend}, host={config.host}, port={config.port}, "
+                f"prefer_grpc={config.prefer_grpc}, quantization={config.quantization}, on_disk={config.on_disk}")
 
-    storage = QdrantStorage(config)
-    retriever = Retriever(storage=storage)
+    if config.backend == "numpy":
+        if workers > 1:
+            # У каждого процесса была бы своя копия матрицы: загруженное одним воркером не видно остальным
+            raise ValueError("STORAGE_BACKEND=numpy supports a single worker, set WORKERS=1")
+        # Встроенное хранилище: без контейнера Qdrant и сетевого запроса на каждый поиск
+        storage = NumpyStorage(config)
+        async_storage = AsyncNumpyStorage(storage)
+    else:
+        storage = QdrantStorage(config)
+        async_storage = AsyncQdrantStorage(config)
 
-    # Создаём приложение FastAPI
-    app = FastAPI()
+    # Поколение корпуса: индексирующий экземпляр увеличивает его после изменения документов,
+    # остальные, увидев новый номер, перечитывают BM25 индекс и сбрасывают кэш ответов
+    corpus_generation = CorpusGeneration(
+        path=os.getenv("CORPUS_GENERATION_PATH", ".cache/corpus_generation"),
+        poll_interval=float(os.getenv("CORPUS_GENERATION_POLL_INTERVAL", 1))
+    )
 
-    # Монтируем статические файлы
-    app.mount("/static", StaticFiles(directory="src/internal/http_server/static"), name="static")
+    # BM25 индекс для гибридного поиска ведётся вместе с векторным хранилищем при индексации
+    search_mode = os.getenv("SEARCH_MODE", "hybrid")
+    # Файл индекса пишет только индексирующий экземпляр, остальные перечитывают его при смене поколения
+    lexical_index = BM25Index(path=os.getenv("BM25_INDEX_PATH", ".cache/bm25.pkl"),
+                              corpus_generation=None if ingesting else corpus_generation.current)
+    storage = LexicalIndexedStorage(storage, lexical_index)
+
+    # Кэш векторов чанков: повторная индексация неизменённых документов не ходит в облако
+    embedding_cache = EmbeddingCache(
+        path=os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3"),
+        max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", 512)) * 1024 * 1024
+    )
+    # Микропакетирование: одновременные вопросы векторизуются вместе и ищутся одним пакетным запросом.
+    # QUERY_BATCH_WINDOW_MS — сколько ждать попутные запросы; не задано — пакетирование выключено
+    batch_window_ms = optional_env("QUERY_BATCH_WINDOW_MS", float)
+    batching = {
+        "batch_window": batch_window_ms / 1000 if batch_window_ms is not None else None,
+        "max_batch_size": int(os.getenv("QUERY_BATCH_MAX_SIZE", 16)),
+    }
+    retriever = Retriever(storage=storage, embedding_cache=embedding_cache,
+                          lexical_index=lexical_index, search_mode=search_mode, **batching)
+
+    # Семантический кэш ответов: перефразированные вопросы не доходят до LLM
+    answer_cache = SemanticAnswerCache(
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92)),
+        max_size=int(os.getenv("ANSWER_CACHE_SIZE", 1024)),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", 86400)),
+        # Воркер без индексации опрашивает поколение через BM25 индекс: он перечитывается до сброса кэша,
+        # и ответы нового поколения строятся уже по новому индексу
+        corpus_generation=corpus_generation.current if ingesting else lexical_index.sync_corpus_generation
+    )
+    REGISTRY.register_collector("rag_answer_cache", answer_cache.stats)
+
+    # Бюджет токенов контекста: соседние чанки склеиваются, перекрытия удаляются
+    context_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", 1500))
+
+    # Клиенты LLM держат пул HTTP-соединений на воркер
+    llm_connections = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    llm_client = create_llm_client(max_connections=llm_connections)
+    async_llm_client = create_llm_client(asynchronous=True, max_connections=llm_connections)
 
     # Создание генератора с переданным retriever
-    generator = Generator(retriever=retriever)
+    generator = Generator(retriever=retriever, answer_cache=answer_cache, context_tokens=context_tokens,
+                          client=llm_client)
+
+    # Асинхронный стек для /api/ask: запросы не блокируют event loop друг друга
+    async_generator = AsyncGenerator(retriever=AsyncRetriever(storage=async_storage, lexical_index=lexical_index,
+                                                              search_mode=search_mode, **batching),
+                                     answer_cache=answer_cache, context_tokens=context_tokens,
+                                     client=async_llm_client,
+                                     batch_concurrency=int(os.getenv("ASK_BATCH_CONCURRENCY", 8)))
+
+    on_shutdown = [async_storage.close, storage.close, async_llm_client.close, llm_client.close]
+    if not ingesting:
+        return Services(storage=storage, retriever=retriever, generator=generator, async_generator=async_generator,
+                        job_manager=None, on_shutdown=on_shutdown)
 
-    # Создаём экземпляр класса Server и подключаем его роутер
-    server = Server(storage=storage, retriever=retriever, generator=generator)
+    # Размер чанков считается в токенах модели эмбеддингов, если задан её токенизатор
+    # (путь к tokenizer.json или имя модели), иначе — в символах
+    chunk_tokenizer = os.getenv("CHUNK_TOKENIZER")
+
+    # Кэш текста страниц PDF: переиндексация с другими CHUNK_SIZE/CHUNK_OVERLAP не разбирает PDF заново
+    text_cache = PageTextCache(
+        directory=os.getenv("PDF_TEXT_CACHE_DIR", ".cache/pdf_text"),
+        max_bytes=int(os.getenv("PDF_TEXT_CACHE_MAX_MB", 1024)) * 1024 * 1024
+    )
+    REGISTRY.register_collector("rag_pdf_text_cache", text_cache.stats)
+
+    def on_indexed(source: str, stats: dict):
+        answer_cache.invalidate_indexed(source, stats["added"])
+        # BM25 индекс сохраняется до смены поколения: увидев новый номер, воркеры перечитывают уже новый файл
+        lexical_index.save()
+        corpus_generation.bump()
+
+    # Индексация документов выполняется в фоновых потоках, не блокируя обработку запросов
+    job_manager = JobManager(
+        retriever=retriever,
+        workers=int(os.getenv("INGEST_WORKERS", 2)),
+        chunk_size=int(os.getenv("CHUNK_SIZE", 800)),
+        chunk_overlap=int(os.getenv("CHUNK_OVERLAP", 150)),
+        parse_workers=int(os.getenv("INGEST_PARSE_WORKERS", 0)) or None,
+        on_indexed=on_indexed,
+        length_function=load_tokenizer_length(chunk_tokenizer) if chunk_tokenizer else len,
+        text_cache=text_cache,
+        # Задания принимают только файлы из этого каталога
+        documents_root=os.getenv("DOCUMENTS_DIR", DEFAULT_DOCUMENTS_DIR)
+    )
+
+    return Services(
+        storage=storage, retriever=retriever, generator=generator, async_generator=async_generator,
+        job_manager=job_manager, on_shutdown=[job_manager.shutdown, lexical_index.save, *on_shutdown],
+    )
+
+
+def create_app(services_factory: Optional[Callable[[], Services]] = None) -> FastAPI:
+    """
+    Фабрика приложения. Сервисы создаются в lifespan каждого воркера и закрываются при его остановке.
+    Число воркеров передаётся и в WORKERS — сами uvicorn и gunicorn его воркерам не сообщают:
+        WORKERS=4 uvicorn main:create_app --factory --workers 4
+        WORKERS=4 gunicorn "main:create_app()" -k uvicorn.workers.UvicornWorker -w 4
+    Такие экземпляры только отвечают на вопросы, документы индексирует отдельный процесс:
+        INGESTION_ENABLED=true uvicorn main:create_app --factory --port 8001
+    :param services_factory: создаёт сервисы воркера; по умолчанию build_services из переменных окружения
+    """
+    if services_factory is None:
+        def services_factory():
+            return build_services(workers=worker_count())
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.services = services_factory()
+        # С несколькими воркерами каждый выкладывает свои метрики в общий каталог, /metrics собирает все
+        exporter = None
+        if worker_count() > 1:
+            exporter = WorkerMetricsExporter(os.getenv("METRICS_DIR", ".cache/metrics"),
+                                             interval=float(os.getenv("METRICS_EXPORT_INTERVAL", 5)))
+            exporter.start()
+        app.state.metrics_exporter = exporter
+        try:
+            yield
+        finally:
+            if exporter is not None:
+                exporter.stop()
+            await app.state.services.close()
+
+    # Создаём приложение FastAPI
+    app = FastAPI(lifespan=lifespan)
+
+    # Роутер подключается сразу, а сервисы воркера берёт из app.state при каждом запросе
+    server = Server(services=lambda: app.state.services)
     app.include_router(server.router)
 
+    # Длительность и число HTTP-запросов по маршрутам, trace id запроса
+    app.add_middleware(RequestMetricsMiddleware, log_requests=os.getenv("LOG_REQUESTS", "false").lower() == "true")
+
+    # Монтируем статические файлы
+    app.mount("/static", StaticFiles(directory="src/internal/http_server/static"), name="static")
+
     @app.get("/")
     async def read_root():
         return FileResponse("src/internal/http_server/static/index.html")
@@ -48,8 +274,24 @@ def main() -> None:
     async def health_check():
         return {"status": "healthy"}
 
-    # Запускаем сервер
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        exporter = getattr(app.state, "metrics_exporter", None)
+        text = exporter.render_prometheus() if exporter is not None else REGISTRY.render_prometheus()
+        return PlainTextResponse(text, media_type=PROMETHEUS_CONTENT_TYPE)
+
+    return app
+
+
+def main() -> None:
+    workers = worker_count()
+    # Воркеры наследуют окружение: число процессов им известно, единственный воркер индексирует документы
+    os.environ["WORKERS"] = str(workers)
+    if workers == 1:
+        os.environ.setdefault("INGESTION_ENABLED", "true")
+    # Каждый воркер — отдельный процесс со своим event loop и клиентами, созданными в create_app
+    uvicorn.run("main:create_app", factory=True, host=os.getenv("HOST", "0.0.0.0"),
+                port=int(os.getenv("PORT", 8000)), workers=workers)
 
 
 if __name__ == "__main__":
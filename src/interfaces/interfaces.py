@@ -1,22 +1,44 @@
 """Модуль для задания базовых интерфейсов"""
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from typing import Any
-from numpy import ndarray
-from torch import Tensor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator
+
+if TYPE_CHECKING:
+    # Только для аннотаций: импорт torch стоит секунд и сотен МБ памяти при старте
+    from numpy import ndarray
+    from torch import Tensor
 
 
 class IStorage(ABC):
     """Абстрактный класс векторного хранилища"""
     @abstractmethod
     def get_data(self, query_embedding: Tensor | ndarray | list[Tensor],
-                 top_k: int) -> list[Any]:
+                 top_k: int, with_vectors: bool = False,
+                 filters: dict[str, Any] | None = None) -> list[Any]:
         """
         Получить данные из хранилища
         :param query_embedding: векторное представление запроса
         :param top_k: количество лучших чанков
+        :param with_vectors: добавить в результаты сохранённый вектор ("vector") и близость ("score")
+        :param filters: ограничение по полям payload, например {"source": ["a.pdf", "b.pdf"]}
         :return:
         """
 
+    def get_data_batch(self, query_embeddings: ndarray | list[ndarray], top_k: int,
+                       with_vectors: bool = False,
+                       filters: dict[str, Any] | None = None) -> list[list[Any]]:
+        """
+        Поиск по нескольким запросам за одно обращение к хранилищу.
+        По умолчанию — последовательные вызовы get_data.
+        :param query_embeddings: вектора запросов
+        :param top_k: количество лучших чанков для каждого запроса
+        :param with_vectors: добавить в результаты сохранённый вектор ("vector") и близость ("score")
+        :param filters: общее для всех запросов ограничение по полям payload
+        :return: результаты get_data в порядке запросов
+        """
+        return [self.get_data(embedding, top_k, with_vectors, filters) for embedding in query_embeddings]
+
     @abstractmethod
     def save_data(self, embeddings: Tensor | ndarray | list[Tensor],
                   chunks: list[str], metadata: dict):
@@ -35,6 +57,22 @@ class IStorage(ABC):
         :return:
         """
 
+    @abstractmethod
+    def get_ids_by_source(self, source: str) -> set[str]:
+        """
+        Получить id всех сохранённых чанков документа
+        :param source: путь к документу
+        :return:
+        """
+
+    @abstractmethod
+    def delete_by_ids(self, ids: list[str]):
+        """
+        Удалить чанки по списку id
+        :param ids: id точек
+        :return:
+        """
+
 
 class IRetriever(ABC):
     """Абстрактный класс для Ретривера"""
@@ -47,10 +85,32 @@ class IRetriever(ABC):
         :return:
         """
     @abstractmethod
-    def find_similar_context(self, query: str) -> list[(str, str)]:
+    def sync_document(self, source: str, chunks: list[str], metadata: list[dict],
+                      progress: Callable[[int], None] | None = None) -> dict:
+        """
+        Синхронизирует чанки документа с хранилищем: векторизует и добавляет только новые
+        или изменённые чанки, удаляет устаревшие
+        :param source: путь к документу
+        :param chunks:
+        :param metadata:
+        :param progress: колбэк с числом сохранённых векторов
+        :return: количество добавленных, неизменённых и удалённых чанков
+        """
+    @abstractmethod
+    def search(self, query: str, filters: dict[str, Any] | None = None) -> list[dict]:
+        """
+        Ищет контекст и возвращает результаты поиска с метаданными (source, page, chunk_index, score)
+        :param query: запрос
+        :param filters: ограничение поиска по полям payload
+        :return: payload'ы по убыванию релевантности
+        """
+
+    @abstractmethod
+    def find_similar_context(self, query: str, filters: dict[str, Any] | None = None) -> list[(str, str)]:
         """
         Парсит в вектора query, затем ищет в storage, ранжирует и отдает возможный контекст
         :param query:
+        :param filters: ограничение поиска по полям payload (например, набор документов)
         :return:
         """
     @abstractmethod
@@ -66,12 +126,121 @@ class IRetriever(ABC):
 class IGenerator(ABC):
     """Абстрактный класс Генератора"""
     @abstractmethod
-    def generate_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600) -> str:
+    def generate_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                        filters: dict[str, Any] | None = None) -> str:
+        """
+        Генерирует ответ на запрос с учётом контекста, полученного от ретривера.
+
+        :param query: Запрос, для которого нужно сгенерировать ответ
+        :param temperature: Температура для генерации (по умолчанию 0.2)
+        :param max_tokens: Максимальное количество токенов для генерации (по умолчанию 600)
+        :param filters: Ограничение поиска контекста по полям payload (например, набор документов)
+        :return: Сгенерированный ответ
+        """
+
+    @abstractmethod
+    def stream_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                      filters: dict[str, Any] | None = None) -> Iterator[str]:
+        """
+        Генерирует ответ потоково, отдавая токены по мере их получения от LLM.
+
+        :param query: Запрос, для которого нужно сгенерировать ответ
+        :param temperature: Температура для генерации
+        :param max_tokens: Максимальное количество токенов для генерации
+        :param filters: Ограничение поиска контекста по полям payload
+        :return: Итератор фрагментов ответа
+        """
+
+
+class IAsyncStorage(ABC):
+    """Абстрактный класс асинхронного векторного хранилища"""
+    @abstractmethod
+    async def get_data(self, query_embedding: Tensor | ndarray | list[Tensor],
+                       top_k: int, with_vectors: bool = False,
+                       filters: dict[str, Any] | None = None) -> list[Any]:
+        """
+        Получить данные из хранилища, не блокируя event loop
+        :param query_embedding: векторное представление запроса
+        :param top_k: количество лучших чанков
+        :param with_vectors: добавить в результаты сохранённый вектор ("vector") и близость ("score")
+        :param filters: ограничение по полям payload, например {"source": ["a.pdf", "b.pdf"]}
+        :return:
+        """
+
+    async def get_data_batch(self, query_embeddings: ndarray | list[ndarray], top_k: int,
+                             with_vectors: bool = False,
+                             filters: dict[str, Any] | None = None) -> list[list[Any]]:
+        """
+        Поиск по нескольким запросам за одно обращение к хранилищу.
+        По умолчанию — последовательные вызовы get_data.
+        :return: результаты get_data в порядке запросов
+        """
+        return [await self.get_data(embedding, top_k, with_vectors, filters) for embedding in query_embeddings]
+
+    @abstractmethod
+    async def save_data(self, embeddings: Tensor | ndarray | list[Tensor],
+                        chunks: list[str], metadata: dict):
+        """
+        Сохранить вектора в хранилище
+        :param embeddings: векторное представление чанков
+        :param chunks: чанки текста
+        :param metadata: метаданные чанков
+        :return:
+        """
+
+    @abstractmethod
+    async def delete_by_page_id(self, page_id: int):
+        """
+        Удалить все чанки определенного файла
+        :return:
+        """
+
+
+class IAsyncRetriever(ABC):
+    """Абстрактный класс асинхронного Ретривера"""
+    @abstractmethod
+    async def search(self, query: str, filters: dict[str, Any] | None = None) -> list[dict]:
+        """
+        Ищет контекст и возвращает результаты поиска с метаданными (source, page, chunk_index, score)
+        :param query: запрос
+        :param filters: ограничение поиска по полям payload
+        :return: payload'ы по убыванию релевантности
+        """
+
+    @abstractmethod
+    async def find_similar_context(self, query: str, filters: dict[str, Any] | None = None) -> list[(str, str)]:
+        """
+        Парсит в вектора query, затем ищет в storage и отдает возможный контекст
+        :param query:
+        :param filters: ограничение поиска по полям payload (например, набор документов)
+        :return:
+        """
+
+
+class IAsyncGenerator(ABC):
+    """Абстрактный класс асинхронного Генератора"""
+    @abstractmethod
+    async def generate_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                              filters: dict[str, Any] | None = None) -> str:
         """
         Генерирует ответ на запрос с учётом контекста, полученного от ретривера.
 
         :param query: Запрос, для которого нужно сгенерировать ответ
         :param temperature: Температура для генерации (по умолчанию 0.2)
         :param max_tokens: Максимальное количество токенов для генерации (по умолчанию 600)
+        :param filters: Ограничение поиска контекста по полям payload (например, набор документов)
         :return: Сгенерированный ответ
         """
+
+    @abstractmethod
+    def stream_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                      filters: dict[str, Any] | None = None) -> AsyncIterator[str]:
+        """
+        Генерирует ответ потоково, отдавая токены по мере их получения от LLM.
+
+        :param query: Запрос, для которого нужно сгенерировать ответ
+        :param temperature: Температура для генерации
+        :param max_tokens: Максимальное количество токенов для генерации
+        :param filters: Ограничение поиска контекста по полям payload
+        :return: Асинхронный итератор фрагментов ответа
+        """
@@ -3,13 +3,19 @@ PDF Reader для RAG с использованием PyMuPDF и LateChunker.
 Этот скрипт извлекает текст из PDF файлов и разбивает его на чанки для дальнейшего использования в RAG системах.
 """
 
+import math
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple
 import json
 from dataclasses import dataclass, asdict
 from tqdm import tqdm
 
+from src.internal.file_processor.text_cache import CachedPages, PageTextCache
+
 
 @dataclass
 class PDFChunk:
@@ -54,11 +60,22 @@ class PDFReader:
         Returns:
             Список кортежей (номер_страницы, текст)
         """
-        text_by_page = []
-        for page_num in range(len(self.doc)):
-            text = self.extract_text_from_page(page_num)
-            text_by_page.append((page_num, text))
-        return text_by_page
+        return list(self.iter_pages())
+
+    def iter_pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Лениво извлекает текст страниц по одной, не держа весь документ в памяти.
+
+        Args:
+            start: Номер первой страницы.
+            stop: Номер страницы, на которой остановиться (не включительно).
+
+        Returns:
+            Итератор кортежей (номер_страницы, текст)
+        """
+        stop = len(self.doc) if stop is None else stop
+        for page_num in range(start, stop):
+            yield page_num, self.extract_text_from_page(page_num)
 
     def extract_metadata(self) -> Dict[str, Any]:
         """
@@ -118,51 +135,86 @@ class LateChunker:
         splits = text.split(self.separator)
         return [s for s in splits if s.strip()]
 
-    def _merge_splits(self, splits: List[str]) -> List[str]:
+    def split(self, text: str) -> Tuple[List[str], List[int]]:
         """
-        Объединяет сегменты в чанки с учетом целевого размера и перекрытия.
+        Разбивает текст на сегменты и один раз измеряет длину каждого из них.
 
         Args:
-            splits: Список сегментов текста.
+            text: Текст для разбиения.
 
         Returns:
-            Список чанков текста.
+            Кортеж (сегменты, длины сегментов).
         """
-        chunks = []
-        current_chunk = []
-        current_chunk_size = 0
-
-        for split in splits:
-            split_size = self.length_function(split)
-
-            # Если текущий чанк пуст или добавление нового сегмента не превысит целевой размер
-            if not current_chunk or current_chunk_size + split_size <= self.chunk_size:
-                current_chunk.append(split)
-                current_chunk_size += split_size
-            else:
-                # Сохраняем текущий чанк и начинаем новый
-                chunks.append(self.separator.join(current_chunk))
-
-                # Определяем, сколько последних сегментов нужно перенести в новый чанк для перекрытия
-                overlap_size = 0
-                overlap_chunks = []
-
-                for i in range(len(current_chunk) - 1, -1, -1):
-                    if overlap_size < self.chunk_overlap:
-                        overlap_size += self.length_function(current_chunk[i])
-                        overlap_chunks.insert(0, current_chunk[i])
-                    else:
-                        break
+        splits = self._split_text(text)
+        return splits, [self.length_function(split) for split in splits]
 
-                # Начинаем новый чанк с перекрытием
-                current_chunk = overlap_chunks + [split]
-                current_chunk_size = overlap_size + split_size
+    def iter_spans(self, pages: Iterable[Tuple[int, List[str], List[int]]]) -> Iterator[Tuple[str, int, int]]:
+        """
+        Объединяет сегменты последовательности страниц в чанки за линейное время.
+        Окно текущего чанка переносится через границу страниц, поэтому абзац, разорванный
+        переносом страницы, попадает в один чанк, а не в два коротких обрывка.
+
+        Args:
+            pages: Кортежи (номер_страницы, сегменты, длины сегментов) в порядке страниц.
+
+        Returns:
+            Итератор кортежей (текст_чанка, первая_страница, последняя_страница).
+        """
+        # Окно текущего чанка — диапазон [start, i) списков сегментов страницы, поэтому на сегмент
+        # приходится одно сложение, а хвост для перекрытия ищется по уже посчитанным длинам.
+        # Незавершённый хвост страницы переносится в начало следующей; page_starts хранит
+        # позиции, с которых начинаются страницы, попавшие в перенесённый хвост
+        chunk_size, chunk_overlap, separator = self.chunk_size, self.chunk_overlap, self.separator
+        carry_splits: List[str] = []
+        carry_sizes: List[int] = []
+        carry_starts: List[Tuple[int, int]] = []
+
+        for page_num, page_splits, page_sizes in pages:
+            if not page_splits:
+                continue
+            offset = len(carry_splits)
+            splits, sizes = carry_splits + page_splits, carry_sizes + page_sizes
+            page_starts = carry_starts + [(offset, page_num)]
+            start, window_size = 0, sum(carry_sizes)
+
+            for i, split_size in enumerate(page_sizes, offset):
+                if i > start and window_size + split_size > chunk_size:
+                    if len(page_starts) == 1:
+                        yield separator.join(splits[start:i]), page_num, page_num
+                    else:
+                        yield (separator.join(splits[start:i]),
+                               _page_at(page_starts, start), _page_at(page_starts, i - 1))
+
+                    # В перекрытие уходит самый короткий хвост окна длиной не меньше chunk_overlap;
+                    # первый сегмент отбрасывается всегда, чтобы следующий чанк не повторял текущий
+                    keep_from, window_size = i, 0
+                    while keep_from > start + 1 and window_size < chunk_overlap:
+                        keep_from -= 1
+                        window_size += sizes[keep_from]
+                    start = keep_from
+                window_size += split_size
+
+            carry_splits, carry_sizes = splits[start:], sizes[start:]
+            carry_starts = [(max(0, position - start), page)
+                            for index, (position, page) in enumerate(page_starts)
+                            if index + 1 == len(page_starts) or page_starts[index + 1][0] > start]
 
         # Добавляем последний чанк, если он не пустой
-        if current_chunk:
-            chunks.append(self.separator.join(current_chunk))
+        if carry_splits:
+            yield separator.join(carry_splits), carry_starts[0][1], carry_starts[-1][1]
 
-        return chunks
+    def _merge_splits(self, splits: List[str]) -> List[str]:
+        """
+        Объединяет сегменты в чанки с учетом целевого размера и перекрытия.
+
+        Args:
+            splits: Список сегментов текста.
+
+        Returns:
+            Список чанков текста.
+        """
+        sizes = [self.length_function(split) for split in splits]
+        return [text for text, _, _ in self.iter_spans([(0, splits, sizes)])]
 
     def create_chunks(self, text: str) -> List[str]:
         """
@@ -179,6 +231,71 @@ class LateChunker:
         return chunks
 
 
+def _page_at(page_starts: List[Tuple[int, int]], position: int) -> int:
+    """Номер страницы сегмента на позиции position по списку (начало страницы, страница)."""
+    for start, page_num in reversed(page_starts):
+        if start <= position:
+            return page_num
+    return page_starts[0][1]
+
+
+class TokenLength:
+    """
+    Функция длины текста в токенах для LateChunker: chunk_size и chunk_overlap
+    задаются в токенах модели эмбеддингов, а не в символах.
+    Объект сериализуем, если сериализуем токенизатор, и может передаваться в пул процессов.
+    """
+
+    def __init__(self, tokenizer):
+        """
+        Args:
+            tokenizer: Объект с методом encode (tokenizers.Tokenizer, токенизатор transformers)
+                или функция, возвращающая список токенов.
+        """
+        self.tokenizer = tokenizer
+
+    def __call__(self, text: str) -> int:
+        encode = getattr(self.tokenizer, "encode", self.tokenizer)
+        encoded = encode(text)
+        # tokenizers.Tokenizer возвращает Encoding, остальные — список идентификаторов
+        return len(getattr(encoded, "ids", encoded))
+
+
+def load_tokenizer_length(name_or_path: str) -> TokenLength:
+    """
+    Загружает токенизатор HuggingFace (файл tokenizer.json или имя модели) для подсчёта длины в токенах.
+    Пакет tokenizers импортируется только здесь и нужен лишь при таком режиме.
+
+    Args:
+        name_or_path: Путь к tokenizer.json или идентификатор модели в HuggingFace Hub.
+
+    Returns:
+        Функция длины для LateChunker.
+    """
+    from tokenizers import Tokenizer
+
+    if os.path.isfile(name_or_path):
+        return TokenLength(Tokenizer.from_file(name_or_path))
+    return TokenLength(Tokenizer.from_pretrained(name_or_path))
+
+
+def _split_page_range(pdf_path: str, start: int, stop: int, chunker: LateChunker,
+                      with_text: bool = False) -> List[Tuple]:
+    """
+    Извлекает текст страниц [start, stop) одного PDF и разбивает его на измеренные сегменты.
+    Функция верхнего уровня, чтобы её можно было выполнять в пуле процессов; сборка чанков
+    из сегментов дешёвая и выполняется в вызывающем процессе, чтобы чанки переходили
+    через границы диапазонов так же, как при последовательной обработке.
+    С with_text к кортежу страницы добавляется её текст (для записи в кэш текста).
+    """
+    reader = PDFReader(pdf_path)
+    try:
+        return [(page_num, *chunker.split(page_text)) + ((page_text,) if with_text else ())
+                for page_num, page_text in reader.iter_pages(start, stop)]
+    finally:
+        reader.close()
+
+
 class PDFChunker:
     """
     Класс для разбиения PDF документов на чанки для использования в RAG.
@@ -189,7 +306,13 @@ class PDFChunker:
             self,
             chunk_size: int = 1000,
             chunk_overlap: int = 200,
-            separator: str = "\n"
+            separator: str = "\n",
+            workers: Optional[int] = 1,
+            pages_per_task: int = 32,
+            min_parallel_pages: int = 64,
+            length_function: Callable[[str], int] = len,
+            cross_page: bool = True,
+            text_cache: Optional[PageTextCache] = None
     ):
         """
         Инициализация PDFChunker.
@@ -198,47 +321,249 @@ class PDFChunker:
             chunk_size: Целевой размер чанка.
             chunk_overlap: Размер перекрытия между соседними чанками.
             separator: Разделитель для разбиения текста.
+            workers: Количество процессов для разбора PDF (None — по числу ядер, 1 — без пула).
+            pages_per_task: Максимальное число страниц в одной задаче пула.
+            min_parallel_pages: Минимальное суммарное число страниц, начиная с которого
+                используется пул процессов; маленькие входы обрабатываются последовательно.
+            length_function: Функция длины сегмента, в единицах которой заданы chunk_size
+                и chunk_overlap (len — символы, TokenLength — токены).
+            cross_page: Переносить чанк через границу страниц; metadata["page"] и
+                metadata["page_end"] задают диапазон страниц чанка. При False страницы
+                разбиваются независимо.
+            text_cache: Кэш извлечённого текста страниц по хэшу содержимого файла: документ,
+                уже разобранный однажды, разбивается на чанки без открытия PDF.
         """
-        self.chunker = LateChunker(chunk_size, chunk_overlap, separator)
+        self.chunker = LateChunker(chunk_size, chunk_overlap, separator, length_function)
+        self.cross_page = cross_page
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.min_parallel_pages = min_parallel_pages
+        self.text_cache = text_cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # spawn вместо fork: процесс сервера многопоточный (uvicorn, gRPC), fork в нём небезопасен
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        step = min(self.pages_per_task, max(1, math.ceil(page_count / self.workers)))
+        return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+    def _build_chunks(self, pdf_path: str, pages: Iterable[Tuple[int, List[str], List[int]]],
+                      doc_metadata: Dict[str, Any]) -> Iterator[PDFChunk]:
+        """Собирает чанки документа из сегментов страниц; chunk_index сквозной по документу."""
+        if self.cross_page:
+            spans = enumerate(self.chunker.iter_spans(pages))
+        else:
+            spans = (item for page in pages for item in enumerate(self.chunker.iter_spans([page])))
+
+        filename = os.path.basename(pdf_path)
+        for index, (chunk_text, first_page, last_page) in spans:
+            # Метаданные чанка: страница начала (по ней строится id), страница конца (фильтр по странице
+            # находит чанк на любой из страниц от page до page_end) и метаданные документа для payload
+            metadata = {
+                "source": pdf_path,
+                "page": first_page + 1,
+                "page_end": last_page + 1,
+                "chunk_index": index,
+                "doc_metadata": doc_metadata
+            }
+            yield PDFChunk(
+                text=chunk_text,
+                page_number=first_page + 1,
+                chunk_id=f"{filename}_p{first_page + 1}_c{index + 1}",
+                metadata=metadata
+            )
+
+    def _load_document(self, pdf_path: str, on_text_cache: Optional[Callable[[bool], None]] = None
+                       ) -> Tuple[Dict[str, Any], Optional[CachedPages], Optional[str]]:
+        """
+        Метаданные документа и его страницы из кэша текста, если они там есть.
 
-    def process_pdf(self, pdf_path: str) -> List[PDFChunk]:
+        Returns:
+            Кортеж (метаданные, страницы из кэша или None, хэш файла или None без кэша).
         """
-        Обрабатывает PDF файл и создает чанки.
+        digest = None
+        if self.text_cache is not None:
+            digest = self.text_cache.file_digest(pdf_path)
+            cached = self.text_cache.get(digest)
+            if on_text_cache:
+                on_text_cache(cached is not None)
+            if cached is not None:
+                # Тот же файл мог быть сохранён под другим именем
+                return {**cached.metadata, "filename": os.path.basename(pdf_path)}, cached, digest
+
+        reader = PDFReader(pdf_path)
+        try:
+            return reader.extract_metadata(), None, digest
+        finally:
+            reader.close()
+
+    def _cached_splits(self, cached: CachedPages,
+                       on_pages: Optional[Callable[[int], None]] = None) -> Iterator[Tuple[int, List[str], List[int]]]:
+        try:
+            for page_num, page_text in cached.iter_pages():
+                yield (page_num, *self.chunker.split(page_text))
+                if on_pages:
+                    on_pages(1)
+        finally:
+            cached.close()
+
+    def _store_splits(self, pages: Iterable[Tuple[int, List[str], List[int], str]], digest: str,
+                      doc_metadata: Dict[str, Any]) -> Iterator[Tuple[int, List[str], List[int]]]:
+        """Передаёт сегменты страниц дальше и записывает текст страниц в кэш, если документ разобран целиком."""
+        with self.text_cache.writer(digest, doc_metadata) as writer:
+            for page_num, splits, sizes, page_text in pages:
+                writer.add(page_text)
+                yield page_num, splits, sizes
+            writer.commit()
+
+    def process_pdfs(self, pdf_paths: List[str], return_exceptions: bool = False) -> List[Any]:
+        """
+        Обрабатывает несколько PDF файлов, распределяя их по процессам по файлам и диапазонам страниц.
+        Результат детерминирован и упорядочен так же, как при последовательной обработке.
 
         Args:
-            pdf_path: Путь к PDF файлу.
+            pdf_paths: Пути к PDF файлам.
+            return_exceptions: Вернуть исключение на месте файла, который не удалось обработать,
+                вместо того чтобы прервать обработку всех файлов.
 
         Returns:
-            Список чанков с метаданными.
+            Список чанков для каждого файла в порядке pdf_paths.
         """
-        reader = PDFReader(pdf_path)
-        doc_metadata = reader.extract_metadata()
-
-        all_chunks = []
-        text_by_page = reader.extract_all_text()
+        results: List[Any] = [None] * len(pdf_paths)
+        plans = []
+        for index, pdf_path in enumerate(pdf_paths):
+            try:
+                doc_metadata, cached, digest = self._load_document(pdf_path)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[index] = e
+                continue
+            plans.append((index, pdf_path, doc_metadata, cached, digest))
+
+        # Документы из кэша текста разбиваются в этом процессе, пул нужен только для разбора PDF
+        parse_pages = sum(doc_metadata["page_count"] for _, _, doc_metadata, cached, _ in plans if cached is None)
+        executor = None
+        if self.workers > 1 and parse_pages >= self.min_parallel_pages:
+            executor = self._get_executor()
+        tasks = []
+        for index, pdf_path, doc_metadata, cached, digest in plans:
+            futures = None
+            if cached is None and executor is not None:
+                futures = [
+                    executor.submit(_split_page_range, pdf_path, start, stop, self.chunker, digest is not None)
+                    for start, stop in self._page_ranges(doc_metadata["page_count"])
+                ]
+            tasks.append((index, pdf_path, doc_metadata, cached, digest, futures))
+
+        for index, pdf_path, doc_metadata, cached, digest, futures in tasks:
+            try:
+                if cached is not None:
+                    pages = self._cached_splits(cached)
+                else:
+                    if futures is not None:
+                        pages = (page for future in futures for page in future.result())
+                    else:
+                        pages = _split_page_range(pdf_path, 0, doc_metadata["page_count"], self.chunker,
+                                                  digest is not None)
+                    if digest is not None:
+                        pages = self._store_splits(pages, digest, doc_metadata)
+                results[index] = list(self._build_chunks(pdf_path, pages, doc_metadata))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[index] = e
+        return results
+
+    def iter_chunks(self, pdf_path: str, on_pages: Optional[Callable[[int], None]] = None,
+                    on_text_cache: Optional[Callable[[bool], None]] = None) -> Iterator[PDFChunk]:
+        """
+        Потоково отдаёт чанки PDF файла в порядке страниц, не накапливая документ целиком.
+        В режиме пула процессов в работе держится не больше 2 * workers диапазонов страниц.
 
-        for page_num, page_text in text_by_page:
-            # Создаем чанки для текущей страницы
-            chunks = self.chunker.create_chunks(page_text)
+        Args:
+            pdf_path: Путь к PDF файлу.
+            on_pages: Вызывается с числом обработанных страниц.
+            on_text_cache: Вызывается с True, если текст документа найден в кэше, и False при промахе.
 
-            # Создаем объекты PDFChunk для каждого чанка
-            for i, chunk_text in enumerate(chunks):
-                chunk_id = f"{os.path.basename(pdf_path)}_p{page_num + 1}_c{i + 1}"
+        Returns:
+            Итератор чанков с метаданными.
+        """
+        doc_metadata, cached, digest = self._load_document(pdf_path, on_text_cache)
+        if cached is not None:
+            pages = self._cached_splits(cached, on_pages)
+        elif digest is not None:
+            pages = self._store_splits(
+                self._iter_page_splits(pdf_path, doc_metadata["page_count"], on_pages, with_text=True),
+                digest, doc_metadata)
+        else:
+            pages = self._iter_page_splits(pdf_path, doc_metadata["page_count"], on_pages)
+        yield from self._build_chunks(pdf_path, pages, doc_metadata)
+
+    def _iter_page_splits(self, pdf_path: str, page_count: int, on_pages: Optional[Callable[[int], None]],
+                          with_text: bool = False) -> Iterator[Tuple]:
+        if self.workers <= 1 or page_count < self.min_parallel_pages:
+            reader = PDFReader(pdf_path)
+            try:
+                for page_num, page_text in reader.iter_pages():
+                    yield (page_num, *self.chunker.split(page_text)) + ((page_text,) if with_text else ())
+                    if on_pages:
+                        on_pages(1)
+            finally:
+                reader.close()
+            return
+
+        executor = self._get_executor()
+        ranges = iter(self._page_ranges(page_count))
+        in_flight = []
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                future = executor.submit(_split_page_range, pdf_path, *page_range, self.chunker, with_text)
+                in_flight.append((page_range, future))
+
+        for _ in range(2 * self.workers):
+            submit_next()
+        try:
+            while in_flight:
+                (start, stop), future = in_flight.pop(0)
+                pages = future.result()
+                submit_next()
+                yield from pages
+                if on_pages:
+                    on_pages(stop - start)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
 
-                # Собираем метаданные для чанка
-                metadata = {
-                    "source": pdf_path,
-                    "page": page_num + 1,
-                    "chunk_index": i,
-                    "doc_metadata": doc_metadata
-                }
+    def process_pdf(self, pdf_path: str) -> List[PDFChunk]:
+        """
+        Обрабатывает PDF файл и создает чанки.
 
-                chunk = chunk_text
+        Args:
+            pdf_path: Путь к PDF файлу.
 
-                all_chunks.append(chunk)
+        Returns:
+            Список чанков с метаданными.
+        """
+        return self.process_pdfs([pdf_path])[0]
 
-        reader.close()
-        return all_chunks
+    def close(self):
+        """Останавливает пул процессов, если он был запущен."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
 
     def save_chunks_to_qdrant(self, chunks: List[PDFChunk], output_path: str):
         """
@@ -255,7 +580,8 @@ class PDFChunker:
             json.dump(chunks_dict, f, ensure_ascii=False, indent=2)
 
 
-def process_pdf_directory(directory_path: str, output_directory: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+def process_pdf_directory(directory_path: str, output_directory: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                          workers: Optional[int] = None, text_cache_dir: Optional[str] = None):
     """
     Обрабатывает все PDF файлы в указанной директории.
 
@@ -264,28 +590,43 @@ def process_pdf_directory(directory_path: str, output_directory: str, chunk_size
         output_directory: Путь к директории для сохранения результатов.
         chunk_size: Размер чанка.
         chunk_overlap: Размер перекрытия между чанками.
+        workers: Количество процессов для разбора (None — по числу ядер).
+        text_cache_dir: Каталог кэша текста страниц; при повторном запуске с другими
+            chunk_size/chunk_overlap неизменённые PDF не разбираются заново.
     """
     # Создаем директорию для выходных данных, если она не существует
     os.makedirs(output_directory, exist_ok=True)
 
     # Инициализируем чанкер
-    chunker = PDFChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    text_cache = PageTextCache(text_cache_dir) if text_cache_dir else None
+    chunker = PDFChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap, workers=workers, text_cache=text_cache)
 
     # Находим все PDF файлы в директории
-    pdf_files = [f for f in os.listdir(directory_path) if f.lower().endswith('.pdf')]
+    pdf_files = sorted(f for f in os.listdir(directory_path) if f.lower().endswith('.pdf'))
+    pdf_paths = [os.path.join(directory_path, pdf_file) for pdf_file in pdf_files]
 
-    for pdf_file in tqdm(pdf_files, desc="Processing PDF files"):
-        pdf_path = os.path.join(directory_path, pdf_file)
+    try:
+        results = chunker.process_pdfs(pdf_paths, return_exceptions=True)
+    finally:
+        chunker.close()
+
+    for pdf_file, chunks in tqdm(zip(pdf_files, results), total=len(pdf_files), desc="Processing PDF files"):
         output_file = os.path.join(output_directory, f"{os.path.splitext(pdf_file)[0]}_chunks.json")
 
+        if isinstance(chunks, Exception):
+            print(f"Error processing {pdf_file}: {str(chunks)}")
+            continue
         try:
-            # Обрабатываем PDF и сохраняем чанки
-            chunks = chunker.process_pdf(pdf_path)
+            # Сохраняем чанки
             chunker.save_chunks_to_qdrant(chunks, output_file)
             print(f"Processed {pdf_file}: Created {len(chunks)} chunks")
         except Exception as e:
             print(f"Error processing {pdf_file}: {str(e)}")
 
+    if text_cache is not None:
+        stats = text_cache.stats()
+        print(f"Text cache: {stats['hits']} hits, {stats['misses']} misses")
+
 
 # Пример обработки директории с PDF файлами
 # process_pdf_directory("pdf_directory", "output_directory", chunk_size=800, chunk_overlap=150)
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""Персистентный кэш извлечённого текста страниц PDF с адресацией по содержимому файла."""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+
+logger = logging.getLogger(__name__)
+
+# Текст, извлечённый другой версией PyMuPDF, может отличаться, поэтому версия входит в запись
+EXTRACTOR = f"pymupdf-{fitz.VersionBind}-text"
+
+MAGIC = b"PDFTXT01"
+# Хвост файла: позиция таблицы смещений, длина заголовка JSON, MAGIC
+FOOTER = struct.Struct("<QQ8s")
+
+
+class CachedPages:
+    """
+    Страницы документа из кэша, отображённые в память: текст страницы декодируется
+    из mmap только при обращении к ней.
+
+    Формат файла: MAGIC | тексты страниц UTF-8 подряд | смещения страниц (page_count + 1) x uint64 |
+    заголовок JSON (extractor, page_count, metadata) | FOOTER.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: путь к файлу записи кэша
+        """
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mmap) < len(MAGIC) + FOOTER.size or self._mmap[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a page text cache file")
+            offsets_pos, header_len, magic = FOOTER.unpack_from(self._mmap, len(self._mmap) - FOOTER.size)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is truncated")
+            header_pos = len(self._mmap) - FOOTER.size - header_len
+            header = json.loads(self._mmap[header_pos:header_pos + header_len].decode("utf-8"))
+            self.extractor: str = header["extractor"]
+            self.page_count: int = header["page_count"]
+            self.metadata: Dict[str, Any] = header["metadata"]
+            self._offsets = struct.unpack_from(f"<{self.page_count + 1}Q", self._mmap, offsets_pos)
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def page_text(self, page_num: int) -> str:
+        return self._mmap[self._offsets[page_num]:self._offsets[page_num + 1]].decode("utf-8")
+
+    def iter_pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """Итератор (номер_страницы, текст), как у PDFReader.iter_pages."""
+        stop = self.page_count if stop is None else stop
+        for page_num in range(start, stop):
+            yield page_num, self.page_text(page_num)
+
+    def close(self):
+        self._mmap.close()
+
+
+class PageTextWriter:
+    """
+    Потоковая запись текста страниц документа во временный файл. Запись появляется в кэше
+    атомарно при commit; незафиксированный файл удаляется при close.
+    """
+
+    def __init__(self, cache: "PageTextCache", digest: str, metadata: Dict[str, Any]):
+        self.cache = cache
+        self.digest = digest
+        self.metadata = metadata
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache.directory, prefix=f".{digest}.", suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(MAGIC)
+        self._offsets: List[int] = [len(MAGIC)]
+
+    def add(self, page_text: str):
+        """Добавляет текст следующей страницы (страницы записываются по порядку)."""
+        data = page_text.encode("utf-8")
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def commit(self):
+        header = json.dumps({"extractor": self.cache.extractor, "page_count": len(self._offsets) - 1,
+                             "metadata": self.metadata}, ensure_ascii=False).encode("utf-8")
+        offsets_pos = self._offsets[-1]
+        self._file.write(struct.pack(f"<{len(self._offsets)}Q", *self._offsets))
+        self._file.write(header)
+        self._file.write(FOOTER.pack(offsets_pos, len(header), MAGIC))
+        self._file.close()
+        os.replace(self._tmp_path, self.cache.path_for(self.digest))
+        self._tmp_path = None
+        self.cache._on_commit()
+
+    def close(self):
+        if self._tmp_path is not None:
+            self._file.close()
+            os.remove(self._tmp_path)
+            self._tmp_path = None
+
+    def __enter__(self) -> "PageTextWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PageTextCache:
+    """
+    Кэш текста страниц PDF в каталоге: sha256(содержимое файла) -> файл с текстом всех страниц
+    и результатом extract_metadata. Повторное разбиение неизменённого документа с другими
+    chunk_size/chunk_overlap читает текст из отображённого в память файла и не открывает PDF.
+    При превышении max_bytes удаляются записи, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024, extractor: str = EXTRACTOR):
+        """
+        :param directory: каталог записей кэша
+        :param max_bytes: предельный суммарный размер записей в байтах
+        :param extractor: версия извлечения текста; записи другой версии считаются промахами
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extractor = extractor
+        self._lock = threading.Lock()
+        # Хэш файла по (размер, mtime): неизменённый файл не перечитывается для хэширования
+        self._digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.pages")
+
+    def file_digest(self, pdf_path: str) -> str:
+        """sha256 содержимого файла."""
+        stat = os.stat(pdf_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known = self._digests.get(pdf_path)
+        if known is not None and known[0] == signature:
+            return known[1]
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        with self._lock:
+            self._digests[pdf_path] = (signature, digest.hexdigest())
+        return digest.hexdigest()
+
+    def get(self, digest: str) -> Optional[CachedPages]:
+        """
+        Ищет запись документа.
+        :return: страницы документа или None, если записи нет, она повреждена или другой версии
+        """
+        path = self.path_for(digest)
+        cached = None
+        try:
+            cached = CachedPages(path)
+            if cached.extractor != self.extractor:
+                cached.close()
+                cached = None
+            else:
+                # Время изменения файла служит временем последнего обращения при вытеснении
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.warning("Ignoring unreadable page text cache entry %s", path, exc_info=True)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return cached
+
+    def writer(self, digest: str, metadata: Dict[str, Any]) -> PageTextWriter:
+        """Начинает запись документа; сохраняется после PageTextWriter.commit."""
+        return PageTextWriter(self, digest, metadata)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pages"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _on_commit(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        # Освобождаем с запасом, чтобы не вытеснять на каждой записи
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Отчёт о заполненности и эффективности кэша (попадания и промахи — по документам)."""
+        entries = self._entries()
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        total = hits + misses
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": hits / total if total else 0.0,
+        }
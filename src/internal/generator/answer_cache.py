@@ -0,0 +1,189 @@
+"""Семантический кэш ответов LLM: перефразированные вопросы получают готовый ответ."""
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов с ключом по вектору запроса. Вектора хранятся нормированными в матрице
+    фиксированной ёмкости, поиск ближайшего — одно матричное умножение. Попадание —
+    косинусная близость не ниже threshold. Записи живут ttl секунд, при переполнении
+    вытесняется давно не использованная (LRU). Для каждого ответа запоминаются источники
+    контекста, чтобы сбросить ответы при переиндексации документа. Новые чанки могут изменить
+    ответ на любой вопрос, поэтому их добавление начинает новое поколение корпуса и сбрасывает весь кэш.
+    Ответ сохраняется, только если поколение не сменилось с момента промаха (см. lookup): ответ,
+    построенный на прежнем корпусе, не попадает в кэш нового поколения.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_size: int = 1024, ttl: Optional[float] = 86400.0,
+                 corpus_generation: Optional[Callable[[], int]] = None):
+        """
+        :param threshold: минимальная косинусная близость запросов для попадания
+        :param max_size: максимальное количество ответов (0 — кэш выключен)
+        :param ttl: время жизни ответа в секундах (None — без ограничения)
+        :param corpus_generation: номер поколения корпуса, общий для процессов (CorpusGeneration.current);
+            при его смене кэш сбрасывается — так до воркера доходят изменения, проиндексированные другим процессом
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._alive = np.zeros(max_size, dtype=bool)
+        self._created_at = np.zeros(max_size, dtype=np.float64)
+        self._used_at = np.zeros(max_size, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * max_size
+        self._sources: List[frozenset] = [frozenset()] * max_size
+        # Растёт при каждом сбросе: ответы, начатые до него, не сохраняются (см. put)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.corpus_generation = corpus_generation
+        self._corpus_generation = corpus_generation() if corpus_generation else None
+
+    def _sync_corpus_generation(self):
+        if self.corpus_generation is None:
+            return
+        # Опрос может перечитывать файлы (см. BM25Index.sync_corpus_generation), поэтому вне блокировки
+        generation = self.corpus_generation()
+        with self._lock:
+            if generation != self._corpus_generation:
+                self._corpus_generation = generation
+                self._invalidate_all()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query_embedding) -> Optional[str]:
+        """Возвращает ответ на самый похожий закэшированный вопрос или None."""
+        return self.lookup(query_embedding)[0]
+
+    def lookup(self, query_embedding) -> Tuple[Optional[str], int]:
+        """
+        Ищет ответ, как get.
+        :return: ответ или None и поколение кэша на момент поиска — его нужно передать в put
+            вместе с ответом, построенным после промаха
+        """
+        if self.max_size <= 0:
+            return None, self.generation
+        self._sync_corpus_generation()
+        query = self._normalize(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            return self._find(query, now), self.generation
+
+    def _find(self, query: np.ndarray, now: float) -> Optional[str]:
+        if self._vectors is not None and self._vectors.shape[1] == len(query):
+            if self.ttl is not None:
+                expired = self._alive & (now - self._created_at >= self.ttl)
+                self._drop(np.flatnonzero(expired))
+            if self._alive.any():
+                scores = np.where(self._alive, self._vectors @ query, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._used_at[best] = now
+                    self.hits += 1
+                    return self._answers[best]
+        self.misses += 1
+        return None
+
+    def put(self, query_embedding, answer: str, sources: Iterable[str] = (), generation: Optional[int] = None):
+        """
+        Сохраняет ответ.
+        :param sources: документы, из которых был взят контекст ответа
+        :param generation: поколение из lookup, после которого строился ответ; если с тех пор кэш
+            сброшен, ответ мог быть построен на прежнем корпусе и не сохраняется
+        """
+        if self.max_size <= 0:
+            return
+        self._sync_corpus_generation()
+        query = self._normalize(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._vectors is None or self._vectors.shape[1] != len(query):
+                self._vectors = np.zeros((self.max_size, len(query)), dtype=np.float32)
+                self._alive[:] = False
+            free = np.flatnonzero(~self._alive)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._used_at))
+                self.evictions += 1
+            self._vectors[slot] = query
+            self._alive[slot] = True
+            self._created_at[slot] = now
+            self._used_at[slot] = now
+            self._answers[slot] = answer
+            self._sources[slot] = frozenset(sources)
+
+    def _drop(self, slots):
+        for slot in slots:
+            self._alive[slot] = False
+            self._answers[slot] = None
+            self._sources[slot] = frozenset()
+
+    def invalidate_source(self, source: str) -> int:
+        """Сбрасывает ответы, построенные на контексте из документа source; возвращает их число."""
+        with self._lock:
+            slots = [slot for slot in np.flatnonzero(self._alive) if source in self._sources[slot]]
+            self._drop(slots)
+            # Ответы, которые строятся сейчас, могут опираться на прежние чанки документа
+            self.generation += 1
+            self.invalidations += len(slots)
+            return len(slots)
+
+    def invalidate_all(self) -> int:
+        """Начинает новое поколение корпуса: сбрасывает все ответы и возвращает их число."""
+        with self._lock:
+            return self._invalidate_all()
+
+    def _invalidate_all(self) -> int:
+        slots = np.flatnonzero(self._alive)
+        self._drop(slots)
+        self.generation += 1
+        self.invalidations += len(slots)
+        return len(slots)
+
+    def invalidate_indexed(self, source: str, added: int) -> int:
+        """
+        Сбрасывает ответы после индексации документа source.
+        :param added: сколько новых или изменённых чанков сохранено; если они есть, любой закэшированный
+            ответ мог бы измениться (новые фрагменты ранжируются выше прежних), и сбрасывается весь кэш;
+            если чанки только удалены, сбрасываются ответы, построенные на этом документе
+        :return: количество сброшенных ответов
+        """
+        if added:
+            return self.invalidate_all()
+        return self.invalidate_source(source)
+
+    def clear(self):
+        with self._lock:
+            self._drop(np.flatnonzero(self._alive))
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики попаданий/промахов для подбора порога и размера кэша."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,130 @@
+"""Сборка контекста для промпта: склейка соседних чанков, удаление перекрытий, бюджет токенов."""
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Приблизительное число символов на токен YandexGPT для русского текста
+CHARS_PER_TOKEN = 3.0
+
+
+def approx_tokens(text: str) -> int:
+    """Оценка длины текста в токенах без обращения к токенизатору модели."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class Passage:
+    """Фрагмент контекста: один или несколько соседних чанков одного документа."""
+    text: str
+    source: str
+    page: Optional[int]
+    rank: int  # позиция самого релевантного чанка фрагмента в выдаче ретривера
+    page_end: Optional[int] = None
+
+
+def merge_overlap(left: str, right: str, min_overlap: int = 20) -> Optional[str]:
+    """
+    Склеивает соседние чанки, убирая общий участок: конец left совпадает с началом right.
+    :return: склеенный текст или None, если перекрытие короче min_overlap
+    """
+    if right in left:
+        return left
+    probe = right[:min_overlap]
+    if len(probe) < min_overlap:
+        return None
+    start = max(0, len(left) - len(right))
+    position = left.find(probe, start)
+    while position != -1:
+        if right.startswith(left[position:]):
+            return left[:position] + right
+        position = left.find(probe, position + 1)
+    return None
+
+
+def _hit_fields(hit) -> Tuple[str, str, Optional[int], Optional[int], Optional[int]]:
+    if isinstance(hit, dict):
+        source = hit.get("source") or hit.get("metadata", {}).get("source", "unknown")
+        page = hit.get("page")
+        return hit.get("text", ""), source, page, hit.get("page_end", page), hit.get("chunk_index")
+    text, source = hit[0], hit[1]
+    return text, source, None, None, None
+
+
+def _passage(source: str, current: dict) -> Passage:
+    return Passage(current["text"], source, current["page"], current["rank"], current["page_end"])
+
+
+def pack_context(hits: Sequence, max_tokens: int = 1500,
+                 count_tokens: Callable[[str], int] = approx_tokens) -> List[Passage]:
+    """
+    Собирает контекст из результатов поиска, упорядоченных по релевантности.
+    Соседние по chunk_index чанки одного документа склеиваются в один фрагмент без повторов
+    перекрытия (для чанков без page_end, пронумерованных по странице, — только в пределах
+    страницы), дословные дубли отбрасываются. Фрагменты добавляются по убыванию релевантности,
+    пока укладываются в max_tokens; первый фрагмент при необходимости обрезается.
+    :param hits: payload'ы из Retriever.search или пары (текст, источник)
+    :param max_tokens: бюджет токенов на контекст
+    :param count_tokens: функция длины текста в токенах
+    """
+    groups: Dict[tuple, List[tuple]] = {}
+    seen_texts = set()
+    for rank, hit in enumerate(hits):
+        text, source, page, page_end, chunk_index = _hit_fields(hit)
+        if not text or text in seen_texts:
+            continue
+        seen_texts.add(text)
+        if page is None or chunk_index is None:
+            key = (source, None, rank)
+        elif isinstance(hit, dict) and "page_end" in hit:
+            key = (source,)  # chunk_index сквозной по документу
+        else:
+            key = (source, page)
+        groups.setdefault(key, []).append((chunk_index, rank, text, page, page_end))
+
+    passages: List[Passage] = []
+    for key, chunks in groups.items():
+        chunks.sort(key=lambda chunk: (chunk[0] is None, chunk[0] or 0))
+        current = None
+        for chunk_index, rank, text, page, page_end in chunks:
+            if current is not None and chunk_index is not None and chunk_index == current["last"] + 1:
+                merged = merge_overlap(current["text"], text)
+                current["text"] = merged if merged is not None else current["text"] + "\n" + text
+                current["rank"] = min(current["rank"], rank)
+                current["page_end"] = page_end
+                current["last"] = chunk_index
+                continue
+            if current is not None:
+                passages.append(_passage(key[0], current))
+            current = {"text": text, "rank": rank, "last": chunk_index, "page": page, "page_end": page_end}
+        passages.append(_passage(key[0], current))
+
+    passages.sort(key=lambda passage: passage.rank)
+    packed: List[Passage] = []
+    used = 0
+    for passage in passages:
+        tokens = count_tokens(passage.text)
+        if used + tokens <= max_tokens:
+            packed.append(passage)
+            used += tokens
+        elif not packed:
+            # Даже самый релевантный фрагмент не помещается — берём его начало
+            ratio = max_tokens / tokens
+            packed.append(Passage(passage.text[:int(len(passage.text) * ratio)], passage.source,
+                                  passage.page, passage.rank, passage.page_end))
+            break
+    return packed
+
+
+def format_context(passages: Sequence[Passage]) -> str:
+    """Текст контекста для промпта: пронумерованные фрагменты с источником и страницей."""
+    blocks = []
+    for number, passage in enumerate(passages, start=1):
+        if passage.page is None:
+            location = passage.source
+        elif passage.page_end is not None and passage.page_end > passage.page:
+            location = f"{passage.source}, стр. {passage.page}–{passage.page_end}"
+        else:
+            location = f"{passage.source}, стр. {passage.page}"
+        blocks.append(f"[{number}] {location}\n{passage.text}")
+    return "\n\n".join(blocks)
@@ -1,45 +1,359 @@
-from src.interfaces.interfaces import IGenerator
-from src.internal.retriever.retriever import Retriever
-from openai import OpenAI
+from src.interfaces.interfaces import IAsyncGenerator, IGenerator
+from src.internal.generator.answer_cache import SemanticAnswerCache
+from src.internal.generator.context import Passage, approx_tokens, format_context, pack_context
+from src.internal.retriever.retriever import AsyncRetriever, Retriever
+from src.internal.metrics.metrics import REGISTRY, TIME_TO_FIRST_TOKEN, stage_histogram
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from typing import AsyncIterator, Iterator, List, Optional, Tuple, Union
+import asyncio
 import os
+import time
+
+
+MODEL_URI = "gpt://b1gc5shtig6flos837c8/yandexgpt"
+
+NO_CONTEXT_ANSWER = "Нет релевантных контекстов."
+
+SYSTEM_PROMPT = ("Вы технический специалист службы поддержки корпоративных систем. Ваша задача - предоставить точный и понятный ответ на основе предоставленной документации." +
+                 "Требования к ответу: 1. Используйте ТОЛЬКО информацию из предоставленного контекста" +
+                 "2. Если вопрос требует пошаговых инструкций, структурируйте ответ в виде нумерованного списка" +
+                 "3. Если информации недостаточно или её нет в контексте, сообщите об этом: В предоставленной документации информация по данному вопросу отсутствует" +
+                 "4. Ответ должен быть конкретным и относиться только к заданному вопросу" +
+                 "5. Избегайте предположений и догадок")
+
+
+# Бюджет токенов на контекст в промпте по умолчанию
+CONTEXT_MAX_TOKENS = 1500
+
+# Одновременные запросы к LLM при пакетной генерации ответов по умолчанию
+BATCH_CONCURRENCY = 8
+
+CONTEXT_PACK_SECONDS = stage_histogram("context_pack")
+LLM_SECONDS = stage_histogram("llm_completion")
+LLM_REQUESTS = REGISTRY.counter("rag_llm_requests_total", "Запросы к LLM")
+PROMPT_TOKENS = REGISTRY.counter("rag_llm_prompt_tokens_total", "Токены промптов LLM (из usage или оценка)")
+COMPLETION_TOKENS = REGISTRY.counter("rag_llm_completion_tokens_total", "Токены ответов LLM (из usage или оценка)")
+CONTEXT_PASSAGES = REGISTRY.counter("rag_context_passages_total", "Фрагменты контекста, переданные в промпт")
+
+
+def create_llm_client(asynchronous: bool = False, max_connections: int = 100,
+                      max_keepalive_connections: int = 20):
+    """
+    Клиент OpenAI-совместимого API из переменных окружения. Соединения переиспользуются
+    из пула httpx: запросы к LLM не открывают новое TLS-соединение каждый раз.
+    :param asynchronous: AsyncOpenAI вместо OpenAI
+    :param max_connections: максимум одновременных соединений к API
+    :param max_keepalive_connections: сколько простаивающих соединений держать открытыми
+    """
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+    if asynchronous:
+        return AsyncOpenAI(base_url=os.getenv("url"), api_key=os.getenv("api"),
+                           http_client=DefaultAsyncHttpxClient(limits=limits))
+    return OpenAI(base_url=os.getenv("url"), api_key=os.getenv("api"), http_client=DefaultHttpxClient(limits=limits))
+
+
+def build_messages(query: str, context_list: List[Passage]) -> list[dict]:
+    """Собирает сообщения чата для LLM из запроса и упакованного контекста."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Запрос пользователя: {query}\n\nКонтекст:\n{format_context(context_list)}"}
+    ]
+
+
+def build_context(hits: list, context_tokens: int) -> List[Passage]:
+    """Упаковывает результаты поиска в контекст промпта с замером стадии context_pack."""
+    with CONTEXT_PACK_SECONDS.time():
+        context_list = pack_context(hits, context_tokens)
+    CONTEXT_PASSAGES.inc(len(context_list))
+    return context_list
+
+
+def record_llm_usage(messages: list[dict], answer: str, usage=None):
+    """Учитывает запрос к LLM: токены берутся из usage ответа, если сервер их вернул, иначе оцениваются."""
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    LLM_REQUESTS.inc()
+    PROMPT_TOKENS.inc(prompt_tokens if isinstance(prompt_tokens, int)
+                      else sum(approx_tokens(message["content"]) for message in messages))
+    COMPLETION_TOKENS.inc(completion_tokens if isinstance(completion_tokens, int) else approx_tokens(answer))
+
+
+def chunk_token(chunk) -> str:
+    """Достаёт фрагмент текста из чанка потокового ответа chat completions."""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def context_sources(context_list: List[Passage]) -> set[str]:
+    """Документы, из которых взят контекст ответа: по ним кэш ответов сбрасывается при переиндексации."""
+    return {passage.source for passage in context_list}
+
 
 class Generator(IGenerator):
-    def __init__(self, retriever: Retriever):
+    def __init__(self, retriever: Retriever, answer_cache: Optional[SemanticAnswerCache] = None,
+                 context_tokens: int = CONTEXT_MAX_TOKENS, client: Optional[OpenAI] = None):
+        """
+        :param retriever: ретривер контекста
+        :param answer_cache: семантический кэш ответов; None — каждый запрос идёт в LLM
+        :param context_tokens: бюджет токенов на контекст в промпте
+        :param client: клиент OpenAI; по умолчанию создаётся из переменных окружения
+        """
         self.retriever = retriever
-        self.client = OpenAI(base_url=os.getenv("url"), api_key=os.getenv("api"))
+        self.answer_cache = answer_cache
+        self.context_tokens = context_tokens
+        self.client = client if client is not None else create_llm_client()
 
-    def generate_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600) -> str:
+    def _cached_answer(self, query: str, filters: Optional[dict]):
+        """
+        Вектор запроса, ответ из кэша (или None) и поколение кэша для put. Вектор попадает в кэш ретривера
+        и не считается повторно. Ответы на запросы с фильтром не кэшируются: они зависят от выбранного
+        набора документов.
+        """
+        if self.answer_cache is None or filters:
+            return None, None, None
+        query_embedding = self.retriever.embed_query(query)
+        return (query_embedding, *self.answer_cache.lookup(query_embedding))
+
+    def generate_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                        filters: Optional[dict] = None) -> str:
         """
         Генерирует ответ на запрос с учётом контекста, полученного от ретривера.
         :param query: Запрос, для которого нужно сгенерировать ответ
         :param temperature: Температура для генерации (по умолчанию 0.2)
         :param max_tokens: Максимальное количество токенов для генерации (по умолчанию 600)
+        :param filters: Ограничение поиска контекста по полям payload, например {"source": [...]}
         :return: Сгенерированный ответ
         """
 
-        # 1. Получаем контекст с использованием retriever
-        context_list = self.retriever.find_similar_context(query)
+        # 0. Перефразированный вопрос, на который уже отвечали, обслуживается из кэша
+        query_embedding, cached, generation = self._cached_answer(query, filters)
+        if cached is not None:
+            return cached
+
+        # 1. Получаем контекст с использованием retriever (один поиск на запрос) и укладываем его в бюджет токенов
+        context_list = build_context(self.retriever.search(query, filters=filters), self.context_tokens)
 
         if not context_list:
-            return "Нет релевантных контекстов."
-
-        # 2. Получаем лучший контекст, используя лучший матч
-        best_context = self.retriever.find_similar_context(query)
-
-        # 3. Отправляем запрос в OpenAI, чтобы получить сгенерированный ответ
-        response = self.client.chat.completions.create(
-            model="gpt://b1gc5shtig6flos837c8/yandexgpt",
-            messages=[
-                {"role": "system", "content": "Вы технический специалист службы поддержки корпоративных систем. Ваша задача - предоставить точный и понятный ответ на основе предоставленной документации." +
-                                              "Требования к ответу: 1. Используйте ТОЛЬКО информацию из предоставленного контекста" +
-                                            "2. Если вопрос требует пошаговых инструкций, структурируйте ответ в виде нумерованного списка" +
-                                              "3. Если информации недостаточно или её нет в контексте, сообщите об этом: В предоставленной документации информация по данному вопросу отсутствует" +
-                                              "4. Ответ должен быть конкретным и относиться только к заданному вопросу" +
-                                              "5. Избегайте предположений и догадок"},
-                {"role": "user", "content": f"Запрос пользователя: {query}\n\nКонтекст:\n{best_context}"}
-            ],
+            return NO_CONTEXT_ANSWER
+
+        # 2. Отправляем запрос в OpenAI, чтобы получить сгенерированный ответ
+        messages = build_messages(query, context_list)
+        with LLM_SECONDS.time():
+            response = self.client.chat.completions.create(
+                model=MODEL_URI,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+
+        answer = response.choices[0].message.content.strip()
+        record_llm_usage(messages, answer, getattr(response, "usage", None))
+        if query_embedding is not None:
+            self.answer_cache.put(query_embedding, answer, context_sources(context_list), generation)
+        return answer
+
+    def stream_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                      filters: Optional[dict] = None) -> Iterator[str]:
+        """
+        Потоковая генерация ответа через stream=True.
+        Время до первого токена (включая поиск контекста) пишется в TIME_TO_FIRST_TOKEN.
+        Ответ из семантического кэша отдаётся одним фрагментом.
+        """
+        started = time.perf_counter()
+        query_embedding, cached, generation = self._cached_answer(query, filters)
+        if cached is not None:
+            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+            yield cached
+            return
+
+        context_list = build_context(self.retriever.search(query, filters=filters), self.context_tokens)
+
+        if not context_list:
+            yield NO_CONTEXT_ANSWER
+            return
+
+        messages = build_messages(query, context_list)
+        llm_started = time.perf_counter()
+        stream = self.client.chat.completions.create(
+            model=MODEL_URI,
+            messages=messages,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            stream=True
         )
+        first_token = True
+        tokens = []
+        for chunk in stream:
+            token = chunk_token(chunk)
+            if not token:
+                continue
+            if first_token:
+                TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+                first_token = False
+            tokens.append(token)
+            yield token
+        LLM_SECONDS.observe(time.perf_counter() - llm_started)
+        record_llm_usage(messages, "".join(tokens))
+        if query_embedding is not None and tokens:
+            self.answer_cache.put(query_embedding, "".join(tokens).strip(), context_sources(context_list),
+                                  generation)
+
+
+class AsyncGenerator(IAsyncGenerator):
+    """Генератор для обработки запросов в event loop FastAPI без блокирующих вызовов."""
+
+    def __init__(self, retriever: AsyncRetriever, answer_cache: Optional[SemanticAnswerCache] = None,
+                 context_tokens: int = CONTEXT_MAX_TOKENS, client: Optional[AsyncOpenAI] = None,
+                 batch_concurrency: int = BATCH_CONCURRENCY):
+        """
+        :param batch_concurrency: максимум одновременных запросов к LLM в answer_batch
+        """
+        self.retriever = retriever
+        self.answer_cache = answer_cache
+        self.context_tokens = context_tokens
+        self.client = client if client is not None else create_llm_client(asynchronous=True)
+        self.batch_concurrency = batch_concurrency
+
+    async def _cached_answer(self, query: str, filters: Optional[dict]):
+        if self.answer_cache is None or filters:
+            return None, None, None
+        query_embedding = await self.retriever.embed_query(query)
+        return (query_embedding, *self.answer_cache.lookup(query_embedding))
+
+    async def generate_answer(self, query: str, temperature: float = 0.2, max_tokens: int = 600,
+                              filters: Optional[dict] = None) -> str:
+        query_embedding, cached, generation = await self._cached_answer(query, filters)
+        if cached is not None:
+            return cached
+        hits = await self.retriever.search(query, filters=filters)
+        return await self._answer_from_hits(query, hits, temperature, max_tokens, query_embedding, generation)
+
+    async def _answer_from_hits(self, query: str, hits: List[dict], temperature: float, max_tokens: int,
+                                query_embedding=None, generation: Optional[int] = None) -> str:
+        context_list = build_context(hits, self.context_tokens)
+
+        if not context_list:
+            return NO_CONTEXT_ANSWER
+
+        messages = build_messages(query, context_list)
+        with LLM_SECONDS.time():
+            response = await self.client.chat.completions.create(
+                model=MODEL_URI,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+
+        answer = response.choices[0].message.content.strip()
+        record_llm_usage(messages, answer, getattr(response, "usage", None))
+        if query_embedding is not None:
+            self.answer_cache.put(query_embedding, answer, context_sources(context_list), generation)
+        return answer
+
+    async def answer_batch(self, queries: List[str], temperature: float = 0.2, max_tokens: int = 600,
+                           filters: Optional[dict] = None, concurrency: Optional[int] = None,
+                           search_batch_size: int = 64) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+        """
+        Ответы на пакет вопросов в порядке готовности. Вопросы обрабатываются частями по
+        search_batch_size: вектора и поиск контекста — одним пакетом на часть, запросы к LLM —
+        не больше concurrency одновременно. Генерация следующей части не ждёт ответов предыдущей.
+        :param concurrency: максимум одновременных запросов к LLM; по умолчанию batch_concurrency
+        :return: пары (номер вопроса, ответ); ошибка генерации отдаётся вместо ответа и не прерывает пакет
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+        # Готовые ответы попадают в очередь сразу: пока ищется контекст следующей части,
+        # ответы предыдущих уже отдаются клиенту
+        results: asyncio.Queue = asyncio.Queue()
+        tasks = set()
+
+        async def answer(index: int, hits: List[dict], query_embedding, generation: Optional[int]):
+            async with semaphore:
+                try:
+                    result = await self._answer_from_hits(queries[index], hits, temperature, max_tokens,
+                                                          query_embedding, generation)
+                except Exception as e:
+                    result = e
+            results.put_nowait((index, result))
+
+        async def produce():
+            try:
+                for start in range(0, len(queries), search_batch_size):
+                    indices = list(range(start, min(start + search_batch_size, len(queries))))
+                    embeddings = [None] * len(indices)
+                    generations = [None] * len(indices)
+                    if self.answer_cache is not None and not filters:
+                        embeddings = await self.retriever.embed_queries([queries[i] for i in indices])
+                        cached, generations = zip(*(self.answer_cache.lookup(embedding) for embedding in embeddings))
+                        for index, answer_text in zip(indices, cached):
+                            if answer_text is not None:
+                                results.put_nowait((index, answer_text))
+                        misses = [k for k, answer_text in enumerate(cached) if answer_text is None]
+                        indices = [indices[k] for k in misses]
+                        embeddings = [embeddings[k] for k in misses]
+                        generations = [generations[k] for k in misses]
+                    if not indices:
+                        continue
+                    hits = await self.retriever.search_batch([queries[i] for i in indices], filters=filters)
+                    for i, h, e, g in zip(indices, hits, embeddings, generations):
+                        task = asyncio.ensure_future(answer(i, h, e, g))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+            except Exception as e:
+                # Ошибка поиска прерывает весь пакет: передаём её потребителю
+                results.put_nowait((None, e))
 
-        return response.choices[0].message.content.strip()
\ No newline at end of file
+        producer = asyncio.ensure_future(produce())
+        try:
+            for _ in range(len(queries)):
+                index, result = await results.get()
+                if index is None:
+                    raise result
+                yield index, result
+        finally:
+            # Клиент отключился или поиск упал: незавершённые поиск и запросы к LLM больше не нужны
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    async def stream_answer(self, query: str, temperature: float = 0.2,
+                            max_tokens: int = 600, filters: Optional[dict] = None) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        query_embedding, cached, generation = await self._cached_answer(query, filters)
+        if cached is not None:
+            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+            yield cached
+            return
+
+        context_list = build_context(await self.retriever.search(query, filters=filters), self.context_tokens)
+
+        if not context_list:
+            yield NO_CONTEXT_ANSWER
+            return
+
+        messages = build_messages(query, context_list)
+        llm_started = time.perf_counter()
+        stream = await self.client.chat.completions.create(
+            model=MODEL_URI,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        first_token = True
+        tokens = []
+        async for chunk in stream:
+            token = chunk_token(chunk)
+            if not token:
+                continue
+            if first_token:
+                TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+                first_token = False
+            tokens.append(token)
+            yield token
+        LLM_SECONDS.observe(time.perf_counter() - llm_started)
+        record_llm_usage(messages, "".join(tokens))
+        if query_embedding is not None and tokens:
+            self.answer_cache.put(query_embedding, "".join(tokens).strip(), context_sources(context_list),
+                                  generation)
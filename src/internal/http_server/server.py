@@ -1,15 +1,52 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import Optional, Literal
-from src.internal.storage.qdrant import QdrantStorage
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Literal
+import json
+import logging
+from src.internal.storage.qdrant import QdrantStorage, collection_params
 from src.internal.retriever.retriever import Retriever
-from src.internal.generator.generator import Generator
-from src.internal.file_processor.processor import PDFChunker
+from src.internal.generator.generator import AsyncGenerator, Generator
+from src.internal.ingestion.jobs import JobManager, PathOutsideRootError, resolve_pdf_paths
+from src.internal.metrics.metrics import REGISTRY
+from src.internal.storage.filters import FilterValue, normalize_filters
 
 
+logger = logging.getLogger(__name__)
+
 class AskRequest(BaseModel):
     query: str
     token: Optional[str] = None  # Опциональное поле для токена
+    # Ограничение поиска по полям payload, например {"source": ["/app/docs/экзамены.pdf"]}
+    filters: Optional[Dict[str, FilterValue]] = None
+
+    @field_validator("filters")
+    @classmethod
+    def check_filters(cls, filters):
+        return normalize_filters(filters) or None
+
+
+# Верхняя граница числа вопросов в одном запросе /ask/batch
+MAX_BATCH_QUERIES = 1000
+
+
+class AskBatchRequest(BaseModel):
+    queries: list[str] = Field(min_length=1, max_length=MAX_BATCH_QUERIES)
+    filters: Optional[Dict[str, FilterValue]] = None
+    # Одновременные запросы к LLM; не больше лимита генератора
+    concurrency: Optional[int] = Field(default=None, ge=1)
+
+    @field_validator("filters")
+    @classmethod
+    def check_filters(cls, filters):
+        return normalize_filters(filters) or None
+
+
+class IngestRequest(BaseModel):
+    files: Optional[list[str]] = None  # Пути к PDF файлам внутри каталога документов (DOCUMENTS_DIR)
+    directory: Optional[str] = None  # Директория внутри каталога документов, из которой берутся все PDF файлы
 
 
 class FeedbackRequest(BaseModel):
@@ -17,11 +54,35 @@ class FeedbackRequest(BaseModel):
     feedback_type: Literal['like', 'dislike']
 
 
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Форматирует событие Server-Sent Events с JSON-данными."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+DEFAULT_PDF_PATHS = [
+    "/app/src/internal/file_processor/приложение о курсовых.pdf",
+    "/app/src/internal/file_processor/проход.pdf",
+    "/app/src/internal/file_processor/экзамены.pdf",
+]
+
+
 class Server:
-    def __init__(self, storage: QdrantStorage, retriever: Retriever = None, generator: Generator = None):
-        self.storage = storage
-        self.retriever = retriever
-        self.generator = generator
+    def __init__(self, storage: QdrantStorage = None, retriever: Retriever = None, generator: Generator = None,
+                 async_generator: AsyncGenerator = None, job_manager: JobManager = None,
+                 services: Optional[Callable[[], Any]] = None):
+        """
+        :param services: возвращает сервисы воркера (объект с полями storage, retriever, generator,
+            async_generator, job_manager); они берутся при каждом запросе, поэтому роутер можно
+            подключить к приложению до того, как lifespan их создаст. Без него используются
+            переданные напрямую объекты
+        :param job_manager: None — индексация в этом процессе отключена, /jobs отвечает 503
+        """
+        if services is None:
+            fixed = SimpleNamespace(storage=storage, retriever=retriever, generator=generator,
+                                    async_generator=async_generator, job_manager=job_manager)
+            services = lambda: fixed
+        self._services = services
         # Создаём роутер с префиксом /api
         self.router = APIRouter(
             prefix="/api",
@@ -30,6 +91,38 @@ class Server:
         # Регистрируем маршруты
         self._register_routes()
 
+    @property
+    def storage(self) -> QdrantStorage:
+        return self._services().storage
+
+    @property
+    def retriever(self) -> Optional[Retriever]:
+        return self._services().retriever
+
+    @property
+    def generator(self) -> Optional[Generator]:
+        return self._services().generator
+
+    @property
+    def async_generator(self) -> Optional[AsyncGenerator]:
+        return self._services().async_generator
+
+    @property
+    def job_manager(self) -> JobManager:
+        job_manager = self._services().job_manager
+        if job_manager is None:
+            raise HTTPException(status_code=503, detail="Индексация в этом экземпляре отключена: "
+                                                        "документы загружает экземпляр с WORKERS=1")
+        return job_manager
+
+    async def _answer_batch_in_threadpool(self, queries: list[str], filters: Optional[dict]):
+        """Пакет вопросов через синхронный генератор: по одному вопросу в пуле потоков."""
+        for index, query in enumerate(queries):
+            try:
+                yield index, await run_in_threadpool(self.generator.generate_answer, query, filters=filters)
+            except Exception as e:
+                yield index, e
+
     def _register_routes(self):
         # Эндпоинт для проверки состояния сервера
         @self.router.get("/status")
@@ -40,7 +133,73 @@ class Server:
         @self.router.post("/ask")
         async def ask(request: AskRequest):
             query = request.query
-            return self.generator.generate_answer(query)
+            if self.async_generator:
+                return await self.async_generator.generate_answer(query, filters=request.filters)
+            # Синхронный генератор выполняем в пуле потоков, чтобы не блокировать event loop
+            return await run_in_threadpool(self.generator.generate_answer, query, filters=request.filters)
+
+        @self.router.post("/ask/batch")
+        async def ask_batch(request: AskBatchRequest):
+            """
+            Ответы на пакет вопросов в формате NDJSON: строка {"index", "query", "answer"} на каждый
+            вопрос в порядке готовности; при ошибке генерации вместо "answer" приходит "error".
+            """
+            queries = request.queries
+            if self.async_generator:
+                concurrency = min(request.concurrency or self.async_generator.batch_concurrency,
+                                  self.async_generator.batch_concurrency)
+                results = self.async_generator.answer_batch(queries, filters=request.filters, concurrency=concurrency)
+            else:
+                results = self._answer_batch_in_threadpool(queries, request.filters)
+
+            async def lines() -> AsyncIterator[str]:
+                try:
+                    async for index, answer in results:
+                        line = {"index": index, "query": queries[index]}
+                        if isinstance(answer, Exception):
+                            logger.error("Ошибка при генерации ответа на вопрос %d: %s", index, answer)
+                            line["error"] = "Не удалось сгенерировать ответ"
+                        else:
+                            line["answer"] = answer
+                        yield json.dumps(line, ensure_ascii=False) + "\n"
+                except Exception as e:
+                    logger.exception("Ошибка при пакетной генерации: %s", e)
+                    yield json.dumps({"error": "Не удалось обработать пакет"}, ensure_ascii=False) + "\n"
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson",
+                                     headers={"X-Accel-Buffering": "no"})
+
+        @self.router.post("/ask/stream")
+        async def ask_stream(request: AskRequest):
+            """
+            Потоковый ответ через Server-Sent Events: каждое событие содержит фрагмент ответа,
+            завершающее событие done отправляется после последнего токена.
+            """
+            if self.async_generator:
+                tokens = self.async_generator.stream_answer(request.query, filters=request.filters)
+            else:
+                tokens = iterate_in_threadpool(self.generator.stream_answer(request.query, filters=request.filters))
+
+            async def events() -> AsyncIterator[str]:
+                try:
+                    async for token in tokens:
+                        yield sse_event({"token": token})
+                except Exception as e:
+                    logger.exception("Ошибка при потоковой генерации: %s", e)
+                    yield sse_event({"message": "Не удалось сгенерировать ответ"}, event="error")
+                    return
+                yield sse_event({}, event="done")
+
+            return StreamingResponse(
+                events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        @self.router.get("/metrics")
+        async def metrics():
+            """Снимок метрик процесса (в т.ч. время до первого токена)."""
+            return REGISTRY.snapshot()
 
         @self.router.post("/feedback")
         async def feedback(request: FeedbackRequest):
@@ -50,7 +209,7 @@ class Server:
             try:
                 # Здесь можно добавить логику сохранения фидбека
                 # Например, в базу данных или файл
-                print(f"Получен фидбек: {request.feedback_type} для сообщения {request.message_id}")
+                logger.info("Получен фидбек: %s для сообщения %s", request.feedback_type, request.message_id)
                 
                 # Если используете генератор, можно передать фидбек ему
                 if self.generator:
@@ -58,40 +217,53 @@ class Server:
                 
                 return {"status": "success", "message": "Спасибо за обратную связь!"}
             except Exception as e:
-                print(f"Ошибка при обработке фидбека: {e}")
+                logger.exception("Ошибка при обработке фидбека: %s", e)
                 return {"status": "error", "message": "Не удалось обработать обратную связь"}
 
         @self.router.post("/debug/create-collection")
         async def create_collection():
-            from qdrant_client.http.models import Distance, VectorParams
-
             if self.storage.client.collection_exists(self.storage.collection_name):
                 return {"message": f"Коллекция '{self.storage.collection_name}' уже существует"}
 
             self.storage.client.create_collection(
                 collection_name=self.storage.collection_name,
-                vectors_config=VectorParams(
-                    size=self.storage.vector_size,
-                    distance=Distance.COSINE
-                )
+                **collection_params(self.storage.config)
             )
             return {"message": f"Коллекция '{self.storage.collection_name}' успешно создана"}
 
-        @self.router.get("/load-documents")
-        async def load_documents():
+        @self.router.post("/jobs", status_code=202)
+        async def create_job(request: IngestRequest):
             """
-            Эндпоинт для загрузки и обработки документов в Qdrant.
+            Ставит файлы или директорию с PDF в очередь на индексацию и сразу возвращает задание.
             """
-            pdf_paths = ["/app/src/internal/file_processor/приложение о курсовых.pdf", "/app/src/internal/file_processor/проход.pdf", "/app/src/internal/file_processor/экзамены.pdf"]
-            for pdf_path in pdf_paths:
-                chunker = PDFChunker(chunk_size=800, chunk_overlap=150)
-
-                chunks = chunker.process_pdf(pdf_path)
-                print(f"Created {len(chunks)} chunks from {pdf_path}")
-                metadata = [{"source": "тест"}] * len(chunks)
-                self.retriever.generate_embeddings(chunks, metadata)
-
-
+            job_manager = self.job_manager
+            try:
+                files = resolve_pdf_paths(request.files, request.directory, root=job_manager.documents_root)
+            except PathOutsideRootError as e:
+                raise HTTPException(status_code=400, detail=f"Путь вне каталога документов: {e}")
+            except FileNotFoundError as e:
+                raise HTTPException(status_code=400, detail=f"Путь не найден: {e}")
+            if not files:
+                raise HTTPException(status_code=400, detail="Не найдено ни одного PDF файла")
+            return job_manager.submit(files).to_dict()
 
+        @self.router.get("/jobs")
+        async def list_jobs():
+            return [job.to_dict() for job in self.job_manager.list()]
 
+        @self.router.get("/jobs/{job_id}")
+        async def get_job(job_id: str):
+            """
+            Прогресс задания: страницы, чанки и вектора, скорость обработки и ошибки.
+            """
+            job = self.job_manager.get(job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Задание не найдено")
+            return job.to_dict()
 
+        @self.router.get("/load-documents")
+        async def load_documents():
+            """
+            Ставит в очередь загрузку стандартного набора документов в Qdrant.
+            """
+            return self.job_manager.submit(DEFAULT_PDF_PATHS).to_dict()
@@ -0,0 +1,53 @@
+"""Поколение корпуса в общем файле: сигнал воркерам сервера, что проиндексированные документы изменились."""
+import os
+import threading
+import time
+
+
+class CorpusGeneration:
+    """
+    Целое число в файле. Индексирующий процесс увеличивает его после каждого изменения корпуса,
+    остальные процессы опрашивают файл не чаще poll_interval и по смене номера сбрасывают
+    производные кэши (семантический кэш ответов).
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        """
+        :param path: общий для процессов файл с номером поколения
+        :param poll_interval: как часто перечитывать файл, секунды
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._value = self._read()
+        self._checked_at = time.monotonic()
+
+    def _read(self) -> int:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def current(self) -> int:
+        """Номер поколения; файл перечитывается не чаще poll_interval."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.poll_interval:
+            value = self._read()
+            with self._lock:
+                self._value, self._checked_at = value, now
+        return self._value
+
+    def bump(self) -> int:
+        """Начинает новое поколение и возвращает его номер (файл заменяется атомарно)."""
+        with self._lock:
+            value = self._read() + 1
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(value))
+            os.replace(tmp_path, self.path)
+            self._value, self._checked_at = value, time.monotonic()
+            return value
@@ -0,0 +1,196 @@
+"""Фоновые задания индексации документов с отчётом о прогрессе."""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from src.internal.file_processor.processor import PDFChunker
+from src.internal.file_processor.text_cache import PageTextCache
+from src.internal.ingestion.pipeline import IngestionPipeline
+from src.internal.retriever.retriever import Retriever
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestionJob:
+    """Состояние одного задания индексации."""
+    id: str
+    files: List[str]
+    status: str = "queued"
+    files_done: int = 0
+    pages_done: int = 0
+    chunks_done: int = 0
+    embeddings_done: int = 0
+    added: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    text_cache_hits: int = 0
+    text_cache_misses: int = 0
+    errors: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "status": self.status,
+            "files": self.files,
+            "files_done": self.files_done,
+            "pages_done": self.pages_done,
+            "chunks_done": self.chunks_done,
+            "embeddings_done": self.embeddings_done,
+            "added": self.added,
+            "unchanged": self.unchanged,
+            "deleted": self.deleted,
+            "text_cache_hits": self.text_cache_hits,
+            "text_cache_misses": self.text_cache_misses,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks_done / elapsed, 2) if elapsed else 0.0,
+            "embeddings_per_second": round(self.embeddings_done / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+# Каталог с PDF, поставляемыми вместе с сервисом
+DEFAULT_DOCUMENTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "file_processor"))
+
+
+class PathOutsideRootError(ValueError):
+    """Путь указывает за пределы каталога документов (в том числе через .. или символическую ссылку)."""
+
+
+def _inside_root(path: str, root: Optional[str]) -> str:
+    """Путь относительно root (абсолютный — как есть), проверенный по реальному расположению файла."""
+    if root is None:
+        return path
+    path = os.path.join(root, path)
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([real_root, os.path.realpath(path)]) != real_root:
+        raise PathOutsideRootError(path)
+    return path
+
+
+def resolve_pdf_paths(files: Optional[List[str]] = None, directory: Optional[str] = None,
+                      root: Optional[str] = None) -> List[str]:
+    """
+    Собирает список PDF файлов из явного списка и/или директории.
+    :param root: каталог документов: относительные пути считаются от него, а пути, которые после
+        раскрытия .. и символических ссылок ведут за его пределы, отклоняются; None — без ограничения
+    :raises PathOutsideRootError: если файл или директория вне root
+    :raises FileNotFoundError: если файл или директория не существуют
+    """
+    paths = []
+    for path in files or []:
+        path = _inside_root(path, root)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        paths.append(path)
+    if directory:
+        directory = _inside_root(directory, root)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(directory)
+        # Ссылки внутри каталога тоже не должны выводить за пределы root
+        paths.extend(
+            _inside_root(os.path.join(directory, name), root)
+            for name in sorted(os.listdir(directory))
+            if name.lower().endswith(".pdf")
+        )
+    return paths
+
+
+class JobManager:
+    """
+    Очередь заданий индексации с пулом рабочих потоков: каждый файл проходит потоковый
+    IngestionPipeline (PDFChunker -> векторизация -> сохранение) вне обработчика HTTP-запроса.
+    """
+
+    def __init__(self, retriever: Retriever, workers: int = 2, chunk_size: int = 800,
+                 chunk_overlap: int = 150, max_jobs: int = 100, parse_workers: Optional[int] = 1,
+                 batch_size: int = 64, on_indexed: Optional[Callable[[str, dict], None]] = None,
+                 length_function: Callable[[str], int] = len, text_cache: Optional[PageTextCache] = None,
+                 documents_root: Optional[str] = DEFAULT_DOCUMENTS_DIR):
+        """
+        :param retriever: ретривер, выполняющий векторизацию и сохранение
+        :param workers: количество одновременно выполняемых заданий
+        :param chunk_size: размер чанка
+        :param chunk_overlap: перекрытие чанков
+        :param max_jobs: сколько последних заданий хранить для отчёта
+        :param parse_workers: количество процессов для разбора PDF (None — по числу ядер)
+        :param batch_size: размер пакета векторизации и записи
+        :param on_indexed: вызывается с путём документа и статистикой индексации (added, unchanged, deleted),
+            если его чанки изменились (например, сброс кэша ответов)
+        :param length_function: единица chunk_size и chunk_overlap (len — символы, TokenLength — токены)
+        :param text_cache: кэш текста страниц PDF; неизменённые документы не разбираются заново
+        :param documents_root: каталог, за пределами которого задания не принимают файлы (см. resolve_pdf_paths)
+        """
+        self.retriever = retriever
+        self.chunker = PDFChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap, workers=parse_workers,
+                                  length_function=length_function, text_cache=text_cache)
+        self.pipeline = IngestionPipeline(retriever, self.chunker, batch_size=batch_size)
+        self.max_jobs = max_jobs
+        self.on_indexed = on_indexed
+        self.documents_root = documents_root
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    def submit(self, files: List[str]) -> IngestionJob:
+        """Ставит файлы в очередь на индексацию и сразу возвращает задание."""
+        job = IngestionJob(id=uuid.uuid4().hex, files=list(files))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+
+        counters = {"pages": "pages_done", "chunks": "chunks_done", "embeddings": "embeddings_done",
+                    "text_cache_hits": "text_cache_hits", "text_cache_misses": "text_cache_misses"}
+
+        def on_progress(event: str, count: int):
+            with self._lock:
+                setattr(job, counters[event], getattr(job, counters[event]) + count)
+
+        for pdf_path in job.files:
+            try:
+                stats = self.pipeline.run(pdf_path, progress=on_progress)
+                with self._lock:
+                    job.added += stats["added"]
+                    job.unchanged += stats["unchanged"]
+                    job.deleted += stats["deleted"]
+                if self.on_indexed and (stats["added"] or stats["deleted"]):
+                    self.on_indexed(pdf_path, stats)
+            except Exception as e:
+                logger.exception("Ingestion of %s failed", pdf_path)
+                job.errors.append(f"{pdf_path}: {e}")
+            job.files_done += 1
+
+        job.finished_at = time.time()
+        job.status = "failed" if job.errors and len(job.errors) == len(job.files) else "completed"
+        logger.info("Ingestion job %s finished: %s", job.id, job.to_dict())
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self.chunker.close()
@@ -0,0 +1,196 @@
+"""Потоковый конвейер индексации PDF с постоянным потреблением памяти."""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+from src.internal.file_processor.processor import PDFChunk, PDFChunker
+from src.internal.metrics.metrics import REGISTRY, stage_histogram
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.ids import make_point_id
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+DOCUMENT_SECONDS = stage_histogram("ingest_document")
+EVENT_COUNTERS = {
+    "pages": REGISTRY.counter("rag_ingest_pages_total", "Страницы PDF, разобранные при индексации"),
+    "chunks": REGISTRY.counter("rag_ingest_chunks_total", "Чанки, полученные при индексации"),
+    "embeddings": REGISTRY.counter("rag_ingest_stored_chunks_total",
+                                   "Новые и изменённые чанки, векторизованные и сохранённые"),
+    "text_cache_hits": REGISTRY.counter("rag_ingest_text_cache_hits_total",
+                                        "Документы, текст страниц которых взят из кэша без разбора PDF"),
+    "text_cache_misses": REGISTRY.counter("rag_ingest_text_cache_misses_total",
+                                          "Документы, разобранные из PDF из-за промаха кэша текста"),
+}
+RUNNING_DOCUMENTS = REGISTRY.gauge("rag_ingest_running_documents", "Документы, индексируемые в данный момент")
+CHUNKS_PER_SECOND = REGISTRY.gauge("rag_ingest_chunks_per_second",
+                                   "Скорость индексации последнего документа, чанков в секунду")
+
+
+class _StageFailed(Exception):
+    """Сигнал о том, что другая стадия конвейера завершилась ошибкой."""
+
+
+class IngestionPipeline:
+    """
+    Конвейер страница -> чанк -> пакетная векторизация -> пакетный upsert.
+    Стадии работают в отдельных потоках и связаны очередями ограниченного размера:
+    если векторизация или запись отстают, разбор PDF ждёт (back-pressure).
+    Пиковая память ограничена batch_size * (queue_size + 2) чанками, а не размером файла,
+    и первые пакеты доступны для поиска сразу после записи.
+    """
+
+    def __init__(self, retriever: Retriever, chunker: PDFChunker, batch_size: int = 64, queue_size: int = 2):
+        """
+        :param retriever: ретривер для векторизации; запись идёт в retriever.storage
+        :param chunker: разбиение PDF на чанки
+        :param batch_size: количество чанков в пакете векторизации и записи
+        :param queue_size: сколько готовых пакетов может ждать следующую стадию
+        """
+        self.retriever = retriever
+        self.chunker = chunker
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    @staticmethod
+    def _put(q: queue.Queue, item, failed: threading.Event):
+        while True:
+            if failed.is_set():
+                raise _StageFailed()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    @staticmethod
+    def _get(q: queue.Queue, failed: threading.Event):
+        while True:
+            if failed.is_set():
+                raise _StageFailed()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _iter_new_batches(self, chunks: Iterator[PDFChunk], existing: set, seen: set,
+                          stats: dict) -> Iterator[List[PDFChunk]]:
+        batch = []
+        for chunk in chunks:
+            point_id = make_point_id(chunk.text, chunk.metadata)
+            if point_id in seen:
+                continue
+            seen.add(point_id)
+            if point_id in existing:
+                stats["unchanged"] += 1
+                continue
+            batch.append(chunk)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self, pdf_path: str, progress: Optional[Callable[[str, int], None]] = None) -> dict:
+        """
+        Индексирует PDF файл инкрементально: новые и изменённые чанки векторизуются и сохраняются
+        пакетами, устаревшие удаляются по завершении.
+        :param pdf_path: путь к PDF файлу
+        :param progress: колбэк (событие, количество) для событий "pages", "chunks", "embeddings",
+            "text_cache_hits", "text_cache_misses"
+        :return: количество добавленных, неизменённых и удалённых чанков
+        """
+        RUNNING_DOCUMENTS.inc()
+        started = time.perf_counter()
+        chunk_count = 0
+
+        def report(event: str, count: int):
+            nonlocal chunk_count
+            EVENT_COUNTERS[event].inc(count)
+            if event == "chunks":
+                chunk_count += count
+            if progress:
+                progress(event, count)
+
+        try:
+            stats = self._run(pdf_path, report)
+        finally:
+            RUNNING_DOCUMENTS.dec()
+        elapsed = time.perf_counter() - started
+        DOCUMENT_SECONDS.observe(elapsed)
+        if elapsed > 0:
+            CHUNKS_PER_SECOND.set(chunk_count / elapsed)
+        return stats
+
+    def _run(self, pdf_path: str, report: Callable[[str, int], None]) -> dict:
+        storage = self.retriever.storage
+        existing = storage.get_ids_by_source(pdf_path)
+        seen: set = set()
+        stats = {"added": 0, "unchanged": 0, "deleted": 0}
+
+        to_embed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        to_store: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        failed = threading.Event()
+        errors: List[BaseException] = []
+
+        def counted(chunks: Iterator[PDFChunk]) -> Iterator[PDFChunk]:
+            for chunk in chunks:
+                report("chunks", 1)
+                yield chunk
+
+        def produce():
+            try:
+                chunks = counted(self.chunker.iter_chunks(
+                    pdf_path, on_pages=lambda n: report("pages", n),
+                    on_text_cache=lambda hit: report("text_cache_hits" if hit else "text_cache_misses", 1)))
+                for batch in self._iter_new_batches(chunks, existing, seen, stats):
+                    self._put(to_embed, batch, failed)
+                self._put(to_embed, _DONE, failed)
+            except _StageFailed:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+
+        def embed():
+            try:
+                while (batch := self._get(to_embed, failed)) is not _DONE:
+                    embeddings = self.retriever.embed_chunks([chunk.text for chunk in batch])
+                    self._put(to_store, (batch, embeddings), failed)
+                self._put(to_store, _DONE, failed)
+            except _StageFailed:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+
+        stages = [threading.Thread(target=produce, name="ingest-parse", daemon=True),
+                  threading.Thread(target=embed, name="ingest-embed", daemon=True)]
+        for stage in stages:
+            stage.start()
+        try:
+            while (item := self._get(to_store, failed)) is not _DONE:
+                batch, embeddings = item
+                storage.save_data(embeddings, [chunk.text for chunk in batch], [chunk.metadata for chunk in batch])
+                stats["added"] += len(batch)
+                report("embeddings", len(batch))
+        except _StageFailed:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            for stage in stages:
+                stage.join()
+        if errors:
+            raise errors[0]
+
+        stale = existing - seen
+        if stale:
+            storage.delete_by_ids(sorted(stale))
+        stats["deleted"] = len(stale)
+        return stats
@@ -0,0 +1,294 @@
+"""
+Лёгкие метрики процесса: гистограммы задержек с фиксированными корзинами, счётчики и
+датчики с метками. Наблюдение стоит порядка микросекунды (perf_counter, bisect, lock),
+поэтому метрики можно не отключать в продакшене. Снапшот отдаётся в JSON,
+render_prometheus — в текстовом формате Prometheus.
+"""
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Стадии поиска (BM25, MMR, локальный поиск) укладываются в доли миллисекунды
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025) + DEFAULT_LATENCY_BUCKETS
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Labels, extra: Optional[Dict[str, str]] = None) -> str:
+    """Метки в виде {name="value",...} или пустая строка."""
+    pairs = list(labels) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram:
+    """Гистограмма наблюдений с кумулятивными корзинами в духе Prometheus."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        """Контекстный менеджер: наблюдает длительность блока в секундах (в том числе при исключении)."""
+        return _Timer(self)
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + [float("inf")], counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            count, total = self._count, self._sum
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            counts, count, total = list(self._counts), self._count, self._sum
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+            cumulative += bucket_count
+            yield "_bucket", format_labels(self.labels, {"le": _format_value(bound)}), cumulative
+        yield "_sum", format_labels(self.labels), total
+        yield "_count", format_labels(self.labels), count
+
+
+class Counter:
+    """Монотонно растущий счётчик (токены, чанки, запросы)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"value": self._value}
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        yield "", format_labels(self.labels), self._value
+
+
+class Gauge(Counter):
+    """Значение, которое может как расти, так и уменьшаться (задания в работе, пропускная способность)."""
+
+    kind = "gauge"
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса."""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, description: str, labels: Optional[Dict[str, str]], **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                for (other_name, _), other in self._metrics.items():
+                    if other_name == name and type(other) is not cls:
+                        raise ValueError(f"Metric {name} is already registered as {other.kind}")
+                metric = self._metrics[key] = cls(name, description, labels=key[1], **kwargs)
+            return metric
+
+    def histogram(self, name: str, description: str,
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                  labels: Optional[Dict[str, str]] = None) -> Histogram:
+        """Возвращает зарегистрированную гистограмму или создаёт новую."""
+        return self._get(Histogram, name, description, labels, buckets=buckets)
+
+    def counter(self, name: str, description: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        """Возвращает зарегистрированный счётчик или создаёт новый."""
+        return self._get(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        """Возвращает зарегистрированный датчик или создаёт новый."""
+        return self._get(Gauge, name, description, labels)
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]]):
+        """Регистрирует функцию, значения которой попадают в снапшот (например, stats() кэша)."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        snapshot = {metric.name + format_labels(metric.labels): metric.snapshot() for metric in metrics}
+        snapshot.update({name: collect() for name, collect in collectors})
+        return snapshot
+
+    def families(self, extra_labels: Optional[Dict[str, str]] = None) -> Dict[str, dict]:
+        """
+        Метрики по семействам Prometheus: имя -> {"kind", "help", "samples"}, где samples — готовые строки.
+        :param extra_labels: метки, добавляемые к каждому значению (например, {"worker": pid})
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        families: Dict[str, dict] = {}
+        for metric in metrics:
+            family = families.setdefault(metric.name, {"kind": metric.kind, "help": metric.description,
+                                                       "samples": []})
+            for suffix, labels, value in metric.samples():
+                family["samples"].append(f"{metric.name}{suffix}{_with_labels(labels, extra_labels)} "
+                                         f"{_format_value(value)}")
+
+        for collector_name, collect in collectors:
+            for key, value in collect().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{collector_name}_{key}"
+                families[name] = {"kind": "gauge", "help": None,
+                                  "samples": [f"{name}{format_labels((), extra_labels)} {_format_value(value)}"]}
+        return families
+
+    def render_prometheus(self) -> str:
+        """Все метрики в текстовом формате Prometheus; числовые значения коллекторов — как gauge."""
+        return render_families([self.families()])
+
+
+def _with_labels(labels: str, extra: Optional[Dict[str, str]]) -> str:
+    """Дописывает метки extra к уже отформатированным меткам {name="value",...}."""
+    if not extra:
+        return labels
+    added = format_labels((), extra)
+    return added if not labels else labels[:-1] + "," + added[1:]
+
+
+def render_families(sources: Sequence[Dict[str, dict]]) -> str:
+    """Текст Prometheus из одного или нескольких наборов families() (например, по воркерам)."""
+    merged: Dict[str, dict] = {}
+    for families in sources:
+        for name, family in families.items():
+            target = merged.setdefault(name, {"kind": family["kind"], "help": family["help"], "samples": []})
+            target["samples"].extend(family["samples"])
+
+    lines = []
+    for name, family in merged.items():
+        if family["help"] is not None:
+            lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram):
+    """Декоратор: длительность вызова функции или корутины наблюдается в histogram."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time():
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def stage_histogram(stage: str) -> Histogram:
+    """Гистограмма длительности стадии обработки запроса или индексации."""
+    return REGISTRY.histogram("rag_stage_duration_seconds", "Длительность стадий поиска, генерации и индексации",
+                              STAGE_BUCKETS, labels={"stage": stage})
+
+
+REGISTRY = MetricsRegistry()
+
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "rag_llm_time_to_first_token_seconds",
+    "Время от начала обработки запроса до первого токена ответа LLM",
+)
@@ -0,0 +1,93 @@
+"""
+Метрики нескольких воркеров сервера: каждый процесс периодически записывает свои метрики
+в общий каталог, /metrics любого воркера отдаёт их все с меткой worker, поэтому скрейп
+не зависит от того, какой процесс принял запрос. Суммирование по воркерам — на стороне
+Prometheus (sum without (worker)).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.internal.metrics.metrics import REGISTRY, MetricsRegistry, render_families
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerMetricsExporter:
+    """Фоновая запись метрик процесса в файл <directory>/<pid>.json и сборка метрик всех воркеров."""
+
+    def __init__(self, directory: str, interval: float = 5.0, registry: MetricsRegistry = REGISTRY,
+                 worker: Optional[str] = None):
+        """
+        :param directory: общий для воркеров каталог
+        :param interval: как часто процесс обновляет свой файл, секунды; файлы, не обновлявшиеся
+            дольше трёх интервалов, считаются оставшимися от завершившихся воркеров и не учитываются
+        :param registry: реестр метрик процесса
+        :param worker: значение метки worker; по умолчанию pid процесса
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = interval
+        self.registry = registry
+        self.worker = worker or str(os.getpid())
+        self.path = os.path.join(directory, f"{self.worker}.json")
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self):
+        """Атомарно записывает текущие метрики процесса."""
+        families = self.registry.families({"worker": self.worker})
+        tmp_path = f"{self.path}.tmp"
+        # Файл пишут и фоновый поток, и обработчик /metrics
+        with self._write_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(families, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception:
+                logger.exception("Failed to export worker metrics to %s", self.path)
+
+    def start(self):
+        self.write()
+        self._thread = threading.Thread(target=self._loop, name="metrics-export", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def collect(self) -> List[Dict[str, dict]]:
+        """Метрики всех живых воркеров; свои — на момент вызова."""
+        self.write()
+        now = time.time()
+        sources = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime > 3 * self.interval:
+                        continue
+                    with open(entry.path, encoding="utf-8") as f:
+                        sources.append(json.load(f))
+                except (OSError, ValueError):
+                    # Файл удалён или перезаписывается завершающимся воркером
+                    continue
+        return sources
+
+    def render_prometheus(self) -> str:
+        return render_families(self.collect())
@@ -0,0 +1,92 @@
+"""Идентификаторы запросов (trace id) в логах и метрики HTTP-запросов."""
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+
+from src.internal.metrics.metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "x-request-id"
+
+# Наследуется задачами asyncio и потоками run_in_threadpool / asyncio.to_thread
+TRACE_ID: ContextVar[str] = ContextVar("trace_id", default="-")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"
+
+REQUEST_SECONDS_NAME = "rag_http_request_duration_seconds"
+REQUESTS_TOTAL_NAME = "rag_http_requests_total"
+
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет в запись лога поле trace_id текущего запроса ("-" вне запроса)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = TRACE_ID.get()
+        return True
+
+
+def configure_logging(level: int = logging.INFO, trace_ids: bool = False):
+    """
+    Настраивает корневой логгер. С trace_ids=True в каждую строку лога пишется trace id запроса.
+    :param level: уровень логирования
+    :param trace_ids: добавлять trace id в формат логов
+    """
+    if trace_ids:
+        logging.basicConfig(level=level, format=LOG_FORMAT)
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(TraceIdFilter())
+    else:
+        logging.basicConfig(level=level)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: длительность и число HTTP-запросов по шаблону маршрута и trace id запроса.
+    Trace id берётся из заголовка X-Request-ID или генерируется, возвращается в ответе
+    и доступен коду обработки через TRACE_ID. Потоковые ответы учитываются целиком.
+    """
+
+    def __init__(self, app, log_requests: bool = False):
+        """
+        :param app: ASGI-приложение
+        :param log_requests: писать строку лога на каждый запрос (метод, путь, статус, длительность)
+        """
+        self.app = app
+        self.log_requests = log_requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = headers.get(TRACE_HEADER.encode(), b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        token = TRACE_ID.set(trace_id)
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", []))
+                           + [(TRACE_HEADER.encode(), trace_id.encode("latin-1"))]}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Шаблон маршрута вместо пути, чтобы /api/jobs/{job_id} не порождал метку на каждое задание
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope.get("method", "")
+            REGISTRY.histogram(REQUEST_SECONDS_NAME, "Длительность обработки HTTP-запросов",
+                               labels={"method": method, "route": route}).observe(elapsed)
+            REGISTRY.counter(REQUESTS_TOTAL_NAME, "Число HTTP-запросов",
+                             labels={"method": method, "route": route, "status": str(status)}).inc()
+            if self.log_requests:
+                logger.info("%s %s %d %.1f ms", method, scope.get("path", ""), status, elapsed * 1000)
+            TRACE_ID.reset(token)
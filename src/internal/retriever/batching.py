@@ -0,0 +1,188 @@
+"""
+Микропакетирование поисковых запросов: запросы, пришедшие в пределах короткого окна,
+векторизуются вместе и уходят в хранилище одним пакетным поиском (get_data_batch).
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.internal.metrics.metrics import REGISTRY
+from src.internal.storage.filters import normalize_filters
+
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+BATCH_SIZE = REGISTRY.histogram("rag_query_batch_size", "Число запросов в пакете поиска", BATCH_SIZE_BUCKETS)
+BATCH_WAIT_SECONDS = REGISTRY.histogram("rag_query_batch_wait_seconds",
+                                        "Задержка запроса в ожидании формирования пакета",
+                                        (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+
+@dataclass
+class PendingQuery:
+    """Запрос, ожидающий отправки в составе пакета."""
+    query: str
+    top_k: int
+    filters: Optional[dict]
+    future: Any
+    enqueued: float = field(init=False)
+    key: Tuple[int, str] = field(init=False)
+
+    def __post_init__(self):
+        # Некорректный фильтр отклоняется до постановки в пакет и не роняет чужие запросы
+        self.key = (self.top_k, json.dumps(normalize_filters(self.filters), sort_keys=True, ensure_ascii=False))
+        self.enqueued = time.perf_counter()
+
+
+def group_batch(batch: List[PendingQuery]) -> Dict[Tuple[int, str], List[PendingQuery]]:
+    """Запросы с одинаковыми top_k и фильтром ищутся одним вызовом get_data_batch."""
+    groups: Dict[Tuple[int, str], List[PendingQuery]] = {}
+    for pending in batch:
+        groups.setdefault(pending.key, []).append(pending)
+    return groups
+
+
+def _record_batch(batch: List[PendingQuery]):
+    started = time.perf_counter()
+    BATCH_SIZE.observe(len(batch))
+    for pending in batch:
+        BATCH_WAIT_SECONDS.observe(started - pending.enqueued)
+
+
+def _check_batching(window: float, max_batch_size: int):
+    if window < 0:
+        raise ValueError("window must be non-negative")
+    if max_batch_size <= 0:
+        raise ValueError("max_batch_size must be positive")
+
+
+class QueryBatcher:
+    """
+    Пакетирование для синхронного Retriever, который вызывается из пула потоков.
+    Первый запрос пакета ждёт window секунд или заполнения пакета, после чего пакет
+    обрабатывает поток, закрывший его; остальные потоки ждут свои результаты.
+    """
+
+    def __init__(self, embed_queries: Callable[[List[str]], List[np.ndarray]], storage,
+                 window: float = 0.005, max_batch_size: int = 16):
+        """
+        :param embed_queries: векторизует список запросов, вектора в порядке запросов
+        :param storage: IStorage с методом get_data_batch
+        :param window: сколько секунд первый запрос пакета ждёт остальные
+        :param max_batch_size: пакет отправляется сразу, как только наберёт столько запросов
+        """
+        _check_batching(window, max_batch_size)
+        self.embed_queries = embed_queries
+        self.storage = storage
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._cond = threading.Condition()
+        self._pending: List[PendingQuery] = []
+
+    def search(self, query: str, top_k: int, filters: Optional[dict] = None) -> List[dict]:
+        """Векторный поиск с сохранёнными векторами; результат как у get_data(..., with_vectors=True)."""
+        pending = PendingQuery(query, top_k, filters, Future())
+        with self._cond:
+            batch = self._pending
+            batch.append(pending)
+            full = len(batch) >= self.max_batch_size
+            leader = len(batch) == 1 and not full
+            if full:
+                self._pending = []
+                self._cond.notify_all()
+
+        if leader:
+            deadline = time.monotonic() + self.window
+            with self._cond:
+                while self._pending is batch and (remaining := deadline - time.monotonic()) > 0:
+                    self._cond.wait(remaining)
+                # Пакет мог закрыть другой поток, набравший max_batch_size: тогда он его и обработает
+                full = self._pending is batch
+                if full:
+                    self._pending = []
+        if full:
+            self._run(batch)
+        return pending.future.result()
+
+    def _run(self, batch: List[PendingQuery]):
+        _record_batch(batch)
+        try:
+            embeddings = dict(zip((p.query for p in batch), self.embed_queries([p.query for p in batch])))
+            for (top_k, _), group in group_batch(batch).items():
+                results = self.storage.get_data_batch([embeddings[p.query] for p in group], top_k=top_k,
+                                                      with_vectors=True, filters=group[0].filters)
+                for pending, hits in zip(group, results):
+                    pending.future.set_result(hits)
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+
+
+class AsyncQueryBatcher:
+    """
+    Пакетирование для AsyncRetriever: запросы копятся в event loop, пакет отправляется
+    по таймеру окна или сразу при заполнении и обрабатывается отдельной задачей.
+    """
+
+    def __init__(self, embed_queries: Callable[[List[str]], Awaitable[List[np.ndarray]]], storage,
+                 window: float = 0.005, max_batch_size: int = 16):
+        """
+        :param embed_queries: корутина, векторизующая список запросов
+        :param storage: IAsyncStorage с методом get_data_batch
+        :param window: сколько секунд первый запрос пакета ждёт остальные
+        :param max_batch_size: пакет отправляется сразу, как только наберёт столько запросов
+        """
+        _check_batching(window, max_batch_size)
+        self.embed_queries = embed_queries
+        self.storage = storage
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: List[PendingQuery] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def search(self, query: str, top_k: int, filters: Optional[dict] = None) -> List[dict]:
+        """Векторный поиск с сохранёнными векторами; результат как у get_data(..., with_vectors=True)."""
+        loop = asyncio.get_running_loop()
+        pending = PendingQuery(query, top_k, filters, loop.create_future())
+        self._pending.append(pending)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await pending.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[PendingQuery]):
+        _record_batch(batch)
+        try:
+            embeddings = dict(zip((p.query for p in batch), await self.embed_queries([p.query for p in batch])))
+            groups = list(group_batch(batch).items())
+            results = await asyncio.gather(*(
+                self.storage.get_data_batch([embeddings[p.query] for p in group], top_k=top_k,
+                                            with_vectors=True, filters=group[0].filters)
+                for (top_k, _), group in groups
+            ))
+            for (_, group), group_results in zip(groups, results):
+                for pending, hits in zip(group, group_results):
+                    if not pending.future.done():
+                        pending.future.set_result(hits)
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
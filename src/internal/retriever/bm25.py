@@ -0,0 +1,304 @@
+"""Лексический поиск BM25 с учётом русской морфологии и слияние рангов (RRF)."""
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from src.internal.storage.filters import matches, normalize_filters
+
+
+_TOKEN_RE = re.compile(r"\d+(?:[.,/:-]\d+)*|[a-zа-я]+")
+
+_STOPWORDS = frozenset(
+    "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее "
+    "мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был "
+    "него до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней "
+    "для мы тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того "
+    "потому этого какой совсем ним здесь этом один почти мой тем чтобы нее были куда зачем всех "
+    "никогда можно при наконец два об другой хоть после над больше тот через эти нас про всего них "
+    "какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой "
+    "им более всегда конечно всю между".split()
+)
+
+# Окончания по убыванию длины: лёгкий стеммер вместо полноценной морфологии
+_SUFFIXES = sorted(
+    "иями ями ами ого его ому ему ыми ими ость ости остью ать ять ить еть ться тся ешь ишь ете ите "
+    "ает яет ует ают яют уют ует ала ила ела ыла али или ели ыли ая яя ое ее ие ые ой ей ий ый ую юю "
+    "ам ям ах ях ом ем ов ев ия ья ье ию ью ии ьи ть ет ют ут ит ат ят ла ло ли а я о е ы и у ю ь й".split(),
+    key=len, reverse=True,
+)
+_MIN_STEM = 3
+
+
+def stem(token: str) -> str:
+    """Отсекает типичное русское окончание, оставляя основу не короче _MIN_STEM символов."""
+    if token[0].isdigit() or not ("а" <= token[0] <= "я"):
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            token = token[:-len(suffix)]
+            break
+    # "стипенди-ях" и "стипенд-ии" должны давать одну основу
+    if token[-1] in "иь" and len(token) > _MIN_STEM:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Токенизация для русских нормативных документов: нижний регистр, ё -> е,
+    числа с разделителями ("2023", "3.1", "01.09.2024") сохраняются как один токен.
+    """
+    tokens = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [stem(token) for token in tokens if token not in _STOPWORDS]
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[dict]], key: Callable[[dict], str],
+                           top_k: int, k: int = 60, with_scores: bool = False) -> List:
+    """
+    Сливает ранжированные списки методом Reciprocal Rank Fusion: score = sum(1 / (k + rank)).
+    :param result_lists: списки результатов разных поисков
+    :param key: идентификатор результата для совпадения между списками
+    :param top_k: сколько результатов вернуть
+    :param k: сглаживающая константа RRF
+    :param with_scores: вернуть пары (результат, score) вместо результатов
+    """
+    scores: Dict[str, float] = {}
+    items: Dict[str, dict] = {}
+    for results in result_lists:
+        for rank, item in enumerate(results):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank + 1)
+            items.setdefault(item_key, item)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    if with_scores:
+        return [(items[item_key], scores[item_key]) for item_key in ranked]
+    return [items[item_key] for item_key in ranked]
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25. Списки вхождений хранятся компактно в array:
+    номера документов (uint32) и частоты термина (uint16). Удаление помечает документ,
+    индекс перестраивается, когда удалённых становится больше четверти.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 autosave_interval: float = 30.0, reload_interval: Optional[float] = None,
+                 corpus_generation: Optional[Callable[[], int]] = None):
+        """
+        :param path: файл для сохранения индекса; None — только в памяти
+        :param k1: насыщение частоты термина
+        :param b: нормализация по длине документа
+        :param autosave_interval: минимальный интервал между автосохранениями, секунды
+        :param reload_interval: как часто поиск проверяет, не сохранил ли файл индекса другой процесс
+            (несколько воркеров сервера), секунды; None — не проверять
+        :param corpus_generation: номер поколения корпуса, общий для процессов (CorpusGeneration.current);
+            при его смене индекс перечитывается из файла — его сохраняет индексирующий процесс до смены поколения
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.autosave_interval = autosave_interval
+        self._lock = threading.RLock()
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[dict]] = []
+        self._lengths = array("I")
+        self._postings: Dict[str, tuple] = {}
+        self._rows: Dict[str, int] = {}
+        self._total_length = 0
+        self._deleted = 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.reload_interval = reload_interval
+        self._file_mtime: Optional[float] = None
+        self._checked_at = time.monotonic()
+        self.corpus_generation = corpus_generation
+        # Поколение читается до файла: загруженный индекс не старше него
+        self._corpus_generation = corpus_generation() if corpus_generation else None
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self._rows
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], payloads: Sequence[dict]):
+        """Добавляет документы; документ с уже известным id заменяется."""
+        with self._lock:
+            self._remove(ids)
+            for point_id, text, payload in zip(ids, texts, payloads):
+                row = len(self._ids)
+                terms = Counter(tokenize(text))
+                for term, tf in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("I"), array("H"))
+                    postings[0].append(row)
+                    postings[1].append(min(tf, 65535))
+                length = sum(terms.values())
+                self._ids.append(point_id)
+                self._payloads.append(payload)
+                self._lengths.append(length)
+                self._rows[point_id] = row
+                self._total_length += length
+            self._dirty = True
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            self._remove(ids)
+            self._dirty = True
+
+    def remove_where(self, field: str, value) -> List[str]:
+        """Удаляет документы, у которых payload[field] == value, и возвращает их id."""
+        with self._lock:
+            ids = [point_id for point_id, row in self._rows.items()
+                   if self._payloads[row].get(field) == value]
+            self._remove(ids)
+            self._dirty = True
+            return ids
+
+    def _remove(self, ids: Iterable[str]):
+        for point_id in ids:
+            row = self._rows.pop(point_id, None)
+            if row is None:
+                continue
+            self._total_length -= self._lengths[row]
+            self._ids[row] = None
+            self._payloads[row] = None
+            self._deleted += 1
+        if self._deleted > max(len(self._ids) // 4, 64):
+            self._compact()
+
+    def _compact(self):
+        ids, payloads = self._ids, self._payloads
+        texts = [payload.get("text", "") for payload in payloads if payload is not None]
+        alive = [(point_id, payload) for point_id, payload in zip(ids, payloads) if point_id is not None]
+        self._ids, self._payloads, self._lengths = [], [], array("I")
+        self._postings, self._rows = {}, {}
+        self._total_length = 0
+        self._deleted = 0
+        self.add([point_id for point_id, _ in alive], texts, [payload for _, payload in alive])
+
+    def search(self, query: str, top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[dict]:
+        """
+        Возвращает payload'ы top_k документов по BM25 (с полем "score").
+        :param filters: ограничение по полям payload, как в IStorage.get_data
+        """
+        self.sync_corpus_generation()
+        if self.reload_interval is not None:
+            self.maybe_reload()
+        terms = set(tokenize(query))
+        filters = normalize_filters(filters)
+        allowed: Dict[int, bool] = {}
+        with self._lock:
+            live = len(self._rows)
+            if not live or not terms:
+                return []
+            avg_length = self._total_length / live
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                rows, freqs = postings
+                df = sum(1 for row in rows if self._ids[row] is not None)
+                if not df:
+                    continue
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                for row, tf in zip(rows, freqs):
+                    if self._ids[row] is None:
+                        continue
+                    if filters:
+                        if row not in allowed:
+                            allowed[row] = matches(self._payloads[row], filters)
+                        if not allowed[row]:
+                            continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[row] / avg_length)
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+            return [{**self._payloads[row], "score": scores[row]} for row in best]
+
+    def save(self):
+        """Сохраняет индекс на диск атомарной заменой файла."""
+        if not self.path:
+            return
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            state = {
+                "ids": self._ids, "payloads": self._payloads, "lengths": self._lengths,
+                "postings": self._postings, "total_length": self._total_length, "deleted": self._deleted,
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._file_mtime = os.stat(self.path).st_mtime
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def maybe_save(self):
+        """Сохраняет индекс, если он изменился и с прошлого сохранения прошло autosave_interval."""
+        if self._dirty and time.monotonic() - self._saved_at >= self.autosave_interval:
+            self.save()
+
+    def sync_corpus_generation(self) -> Optional[int]:
+        """
+        Перечитывает индекс, если сменилось поколение корпуса. Кэш ответов опрашивает поколение
+        через этот метод, поэтому индекс обновляется раньше, чем сбрасывается кэш.
+        :return: текущее поколение корпуса или None, если оно не отслеживается
+        """
+        if self.corpus_generation is None:
+            return None
+        generation = self.corpus_generation()
+        if generation != self._corpus_generation:
+            with self._lock:
+                if generation != self._corpus_generation:
+                    self.reload()
+                    self._corpus_generation = generation
+        return generation
+
+    def reload(self):
+        """Перечитывает индекс из файла; индекс с несохранёнными изменениями не перечитывается."""
+        with self._lock:
+            if self.path and not self._dirty and os.path.exists(self.path):
+                self._load()
+
+    def maybe_reload(self):
+        """
+        Перечитывает индекс, если файл сохранил другой процесс. Индекс с несохранёнными
+        изменениями не перечитывается: его сохранение само обновит файл для остальных.
+        """
+        now = time.monotonic()
+        if not self.path or self._dirty or now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._file_mtime:
+            with self._lock:
+                if not self._dirty:
+                    self._load()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            self._file_mtime = os.fstat(f.fileno()).st_mtime
+            state = pickle.load(f)
+        self._ids = state["ids"]
+        self._payloads = state["payloads"]
+        self._lengths = state["lengths"]
+        self._postings = state["postings"]
+        self._total_length = state["total_length"]
+        self._deleted = state["deleted"]
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids) if point_id is not None}
@@ -0,0 +1,82 @@
+"""LRU/TTL кэш векторов запросов для Retriever."""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class QueryEmbeddingCache:
+    """
+    Ограниченный кэш векторов запросов с вытеснением по LRU и сроком жизни записей.
+    Ключ — нормализованный текст запроса.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 3600.0):
+        """
+        :param max_size: максимальное количество записей (0 — кэш выключен)
+        :param ttl: время жизни записи в секундах (None — без ограничения)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Приводит запрос к каноническому виду: нижний регистр, схлопнутые пробелы."""
+        return _WHITESPACE_RE.sub(" ", query).strip().lower()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Возвращает вектор запроса из кэша или None."""
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, embedding = entry
+                if self.ttl is None or time.monotonic() - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: np.ndarray):
+        """Сохраняет вектор запроса, вытесняя самые старые записи при переполнении."""
+        if self.max_size <= 0:
+            return
+        key = self.normalize(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики попаданий/промахов для подбора размера кэша."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,112 @@
+"""Пакетная конкурентная векторизация документов."""
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Iterator, List, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+_RATE_LIMIT_MARKERS = ("RESOURCE_EXHAUSTED", "429", "rate limit", "too many requests")
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Проверяет, что ошибка облачной модели вызвана превышением лимита запросов."""
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if code is not None and getattr(code, "name", str(code)) == "RESOURCE_EXHAUSTED":
+        return True
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker.lower() in message for marker in _RATE_LIMIT_MARKERS)
+
+
+class BatchEmbedder:
+    """
+    Векторизует тексты пакетами в пуле потоков с ограниченной конкурентностью.
+    Порядок векторов совпадает с порядком входных текстов.
+    """
+
+    def __init__(self, model: Any, batch_size: int = 32, max_workers: int = 8,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0):
+        """
+        :param model: модель с методом run(text) -> вектор
+        :param batch_size: количество текстов в одном пакете
+        :param max_workers: максимальное число одновременных пакетов
+        :param max_retries: число повторов при превышении лимита запросов
+        :param backoff: начальная задержка перед повтором, секунды
+        :param max_backoff: верхняя граница задержки, секунды
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                return np.asarray(self.model.run(text), dtype=np.float32)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limited(e):
+                    raise
+                sleep_for = min(delay, self.max_backoff) * (1 + random.random())
+                logger.warning("Embedding rate limited, retry %d/%d in %.2fs",
+                               attempt + 1, self.max_retries, sleep_for)
+                time.sleep(sleep_for)
+                delay *= 2
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self._embed_one(text) for text in texts])
+
+    def iter_batches(self, texts: List[str]) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Векторизует тексты и отдаёт пакеты по мере готовности.
+        :param texts: тексты для векторизации
+        :return: итератор пар (смещение пакета во входном списке, вектора пакета)
+        """
+        starts = iter(range(0, len(texts), self.batch_size))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = {}
+
+            def submit_next() -> bool:
+                start = next(starts, None)
+                if start is None:
+                    return False
+                batch = texts[start:start + self.batch_size]
+                in_flight[executor.submit(self._embed_batch, batch)] = start
+                return True
+
+            # Держим в работе не больше пакетов, чем потоков, чтобы не копить результаты в памяти
+            for _ in range(self.max_workers):
+                if not submit_next():
+                    break
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start = in_flight.pop(future)
+                    yield start, future.result()
+                    submit_next()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Векторизует все тексты и возвращает матрицу в исходном порядке."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        result = None
+        for start, embeddings in self.iter_batches(texts):
+            if result is None:
+                result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            result[start:start + len(embeddings)] = embeddings
+        return result
@@ -0,0 +1,157 @@
+"""Персистентный кэш векторов документов с адресацией по содержимому."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Кэш векторов в SQLite: sha256(модель, текст чанка) -> вектор float32.
+    При превышении max_bytes вытесняются записи, к которым дольше всего не обращались.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key BLOB PRIMARY KEY,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        :param path: путь к файлу базы SQLite
+        :param max_bytes: предельный суммарный размер векторов в байтах
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(self._SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        # Суммарный размер векторов считается один раз при открытии и дальше поддерживается
+        # при вставке и вытеснении, чтобы не сканировать таблицу на каждой записи
+        self._bytes: int = self._conn.execute(
+            "SELECT COALESCE(SUM(length(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(text: str, model_name: str) -> bytes:
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def get_many(self, texts: Sequence[str], model_name: str) -> Dict[int, np.ndarray]:
+        """
+        Ищет вектора для текстов.
+        :return: словарь индекс текста -> вектор, только для найденных записей
+        """
+        keys = [self.make_key(text, model_name) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            # SQLite ограничивает число параметров запроса, поэтому ищем порциями
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            result = {i: found[key] for i, key in enumerate(keys) if key in found}
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+        return result
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray, model_name: str):
+        """Сохраняет вектора текстов и при необходимости вытесняет старые записи."""
+        now = time.time()
+        # Повторы текста в одной порции сохраняются один раз
+        rows: Dict[bytes, tuple] = {}
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32)
+            key = self.make_key(text, model_name)
+            rows[key] = (key, vector.shape[0], vector.tobytes(), now)
+        if not rows:
+            return
+        with self._lock:
+            replaced = self._stored_sizes(list(rows))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, last_access) VALUES (?, ?, ?, ?)",
+                list(rows.values()),
+            )
+            self._bytes += sum(len(row[2]) for row in rows.values()) - sum(replaced.values())
+            self._evict()
+            self._conn.commit()
+
+    def _stored_sizes(self, keys: List[bytes]) -> Dict[bytes, int]:
+        """Размеры уже сохранённых векторов для ключей."""
+        sizes: Dict[bytes, int] = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            sizes.update(self._conn.execute(
+                f"SELECT key, length(vector) FROM embeddings WHERE key IN ({placeholders})", part
+            ).fetchall())
+        return sizes
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # Освобождаем с запасом, чтобы не вытеснять на каждой вставке
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, length(vector) FROM embeddings ORDER BY last_access"
+        )
+        stale: List[bytes] = []
+        freed = 0
+        for key, size in rows:
+            if self._bytes - freed <= target:
+                break
+            stale.append(key)
+            freed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key in stale])
+        self._bytes -= freed
+        self.evictions += len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        """Отчёт о заполненности и эффективности кэша."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            size = self._bytes
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
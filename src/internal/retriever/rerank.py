@@ -0,0 +1,64 @@
+"""Локальное переранжирование кандидатов по сохранённым векторам: косинус и MMR."""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Нормирует строки матрицы; нулевые строки остаются нулевыми."""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def cosine_scores(query, vectors) -> np.ndarray:
+    """Косинусная близость запроса к каждой строке vectors."""
+    return normalize_rows(vectors) @ normalize_rows(query)[0]
+
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, top_k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Maximal Marginal Relevance: жадно выбирает кандидата с максимальным
+    lambda * relevance - (1 - lambda) * max_sim(кандидат, уже выбранные),
+    отсекая почти одинаковые чанки из перекрывающихся окон.
+    :param relevance: релевантность кандидатов запросу
+    :param vectors: нормированные вектора кандидатов (нулевая строка — вектора нет, штрафа нет)
+    :param top_k: сколько кандидатов выбрать
+    :param lambda_mult: 1.0 — только релевантность, 0.0 — только разнообразие
+    :return: индексы выбранных кандидатов в порядке выбора
+    """
+    count = len(relevance)
+    top_k = min(top_k, count)
+    if top_k <= 0:
+        return []
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    selected: List[int] = []
+    for _ in range(top_k):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def rerank_hits(hits: Sequence[dict], top_k: int, query_embedding=None,
+                relevance: Optional[Sequence[float]] = None, lambda_mult: float = 0.7) -> List[dict]:
+    """
+    Переранжирует результаты поиска с полем "vector" методом MMR.
+    Релевантность берётся из relevance или считается как косинус к query_embedding;
+    у результатов без вектора нет штрафа за похожесть.
+    """
+    if not hits:
+        return []
+    vectors = [hit.get("vector") for hit in hits]
+    dim = next((len(vector) for vector in vectors if vector is not None), 0)
+    if not dim:
+        return list(hits[:top_k])
+    matrix = normalize_rows([vector if vector is not None else np.zeros(dim) for vector in vectors])
+    if relevance is None:
+        relevance = matrix @ normalize_rows(query_embedding)[0]
+    order = mmr(np.asarray(relevance, dtype=np.float32), matrix, top_k, lambda_mult)
+    return [hits[i] for i in order]
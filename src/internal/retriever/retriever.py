@@ -1,60 +1,423 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from sentence_transformers import util
-
-from typing import List, Tuple
-from src.interfaces.interfaces import IRetriever, IStorage
+from typing import Callable, List, Optional, Tuple
+from src.interfaces.interfaces import IAsyncRetriever, IAsyncStorage, IRetriever, IStorage
+from src.internal.retriever.batching import AsyncQueryBatcher, QueryBatcher
+from src.internal.retriever.bm25 import BM25Index, reciprocal_rank_fusion
+from src.internal.retriever.cache import QueryEmbeddingCache
+from src.internal.retriever.embedder import BatchEmbedder
+from src.internal.retriever.embedding_cache import EmbeddingCache
+from src.internal.retriever.rerank import cosine_scores, rerank_hits
+from src.internal.metrics.metrics import REGISTRY, stage_histogram
+from src.internal.storage.ids import make_point_id
 import numpy as np
-from yandex_cloud_ml_sdk import YCloudML
 
-sdk = YCloudML(
+
+EMBED_QUERY_SECONDS = stage_histogram("embed_query")
+EMBED_QUERY_BATCH_SECONDS = stage_histogram("embed_query_batch")
+EMBED_CHUNKS_SECONDS = stage_histogram("embed_chunks")
+LEXICAL_SEARCH_SECONDS = stage_histogram("lexical_search")
+RERANK_SECONDS = stage_histogram("rerank")
+SEARCH_SECONDS = stage_histogram("retriever_search")
+SEARCH_BATCH_SECONDS = stage_histogram("retriever_search_batch")
+RETRIEVED_CHUNKS = REGISTRY.counter("rag_retrieved_chunks_total", "Чанки контекста, возвращённые поиском")
+EMBEDDED_CHUNKS = REGISTRY.counter("rag_embedded_chunks_total",
+                                   "Чанки, векторизованные моделью (без попаданий в кэш эмбеддингов)")
+
+
+def create_sdk():
+    """Клиент YCloudML из переменных окружения. Создаётся в конструкторе ретривера, а не при импорте."""
+    from yandex_cloud_ml_sdk import YCloudML
+
+    return YCloudML(
+        folder_id=os.getenv("folder_id"),
+        auth=os.getenv("api"),
+    )
+
+
+def create_async_sdk():
+    """Асинхронный клиент AsyncYCloudML из переменных окружения."""
+    from yandex_cloud_ml_sdk import AsyncYCloudML
+
+    return AsyncYCloudML(
         folder_id=os.getenv("folder_id"),
         auth=os.getenv("api"),
     )
 
 
+def to_context_pairs(results: List[dict]) -> List[Tuple[str, str]]:
+    """Переводит payload'ы из стораджа в пары (текст, источник)."""
+    context_pairs = []
+    for r in results:
+        text = r.get("text", "")
+        source = r.get("source") or r.get("metadata", {}).get("source", "unknown")
+        context_pairs.append((text, source))
+    return context_pairs
+
+
+SEARCH_MODES = ("vector", "hybrid")
+
+
+def fuse_results(vector_results: List[dict], lexical_results: List[dict], top_k: int,
+                 rrf_k: int = 60) -> List[Tuple[dict, float]]:
+    """
+    Объединяет результаты векторного и BM25 поиска через RRF. Один и тот же чанк
+    в обоих списках узнаётся по детерминированному id точки.
+    :return: пары (результат, RRF score) по убыванию score
+    """
+    return reciprocal_rank_fusion(
+        [vector_results, lexical_results],
+        key=lambda payload: make_point_id(payload.get("text", ""), payload),
+        top_k=top_k,
+        k=rrf_k,
+        with_scores=True,
+    )
+
+
+def select_hits(vector_hits: List[dict], lexical_hits: Optional[List[dict]], top_k: int,
+                mmr_lambda: Optional[float]) -> List[dict]:
+    """
+    Финальный отбор контекста по кандидатам поиска без обращений к модели эмбеддингов.
+    :param vector_hits: результаты get_data(..., with_vectors=True)
+    :param lexical_hits: результаты BM25 или None в векторном режиме
+    :param top_k: сколько чанков вернуть
+    :param mmr_lambda: вес релевантности в MMR; None — без переранжирования
+    """
+    with RERANK_SECONDS.time():
+        if lexical_hits is None:
+            candidates = list(vector_hits)
+            relevance = [hit.get("score", 0.0) for hit in candidates]
+        else:
+            fused = fuse_results(vector_hits, lexical_hits, len(vector_hits) + len(lexical_hits))
+            candidates = [hit for hit, _ in fused]
+            best = fused[0][1] if fused else 1.0
+            relevance = [score / best for _, score in fused]
+        if mmr_lambda is None:
+            hits = candidates[:top_k]
+        else:
+            hits = rerank_hits(candidates, top_k, relevance=relevance, lambda_mult=mmr_lambda)
+    RETRIEVED_CHUNKS.inc(len(hits))
+    return hits
+
+
+def lexical_search(index: BM25Index, query: str, top_k: int, filters: Optional[dict]) -> List[dict]:
+    """BM25 поиск с замером длительности стадии lexical_search."""
+    with LEXICAL_SEARCH_SECONDS.time():
+        return index.search(query, top_k, filters)
+
+
+def _resolve_mode(mode: Optional[str], default: str, lexical_index: Optional[BM25Index]) -> str:
+    mode = mode or default
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+    # Без лексического индекса гибридный поиск вырождается в векторный
+    return mode if lexical_index is not None else "vector"
+
+
 class Retriever(IRetriever):
-    def __init__(self, storage: IStorage):
+    def __init__(self, storage: IStorage, query_cache_size: int = 1024,
+                 query_cache_ttl: Optional[float] = 3600.0,
+                 embed_batch_size: int = 32, embed_workers: int = 8,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 lexical_index: Optional[BM25Index] = None, search_mode: str = "vector",
+                 top_k: int = 5, candidate_k: int = 20, mmr_lambda: Optional[float] = 0.7, sdk=None,
+                 batch_window: Optional[float] = None, max_batch_size: int = 16):
+        """
+        :param lexical_index: BM25 индекс для гибридного поиска
+        :param search_mode: режим поиска по умолчанию: "vector" или "hybrid"
+        :param top_k: сколько чанков контекста возвращает find_similar_context
+        :param candidate_k: сколько кандидатов берётся из поиска перед слиянием и переранжированием
+        :param mmr_lambda: вес релевантности в MMR переранжировании; None — отключить переранжирование
+        :param sdk: клиент YCloudML; по умолчанию создаётся из переменных окружения
+        :param batch_window: окно пакетирования одновременных запросов, секунды; None — без пакетирования
+        :param max_batch_size: максимальное число запросов в пакете
+        """
+        self.sdk = sdk if sdk is not None else create_sdk()
         self.storage = storage
+        self.embed_batch_size = embed_batch_size
+        self.embed_workers = embed_workers
+        self.embedding_cache = embedding_cache
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size, ttl=query_cache_ttl)
+        self.lexical_index = lexical_index
+        self.search_mode = _resolve_mode(search_mode, search_mode, lexical_index)
+        self.top_k = top_k
+        self.candidate_k = max(candidate_k, top_k)
+        self.mmr_lambda = mmr_lambda
+        self._lexical_pool: Optional[ThreadPoolExecutor] = None
+        self.batcher = None
+        if batch_window is not None:
+            self.batcher = QueryBatcher(self.embed_queries, storage, window=batch_window,
+                                        max_batch_size=max_batch_size)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Векторизует запрос моделью "query", повторные запросы берутся из кэша.
+        """
+        query_embedding = self.query_cache.get(query)
+        if query_embedding is None:
+            query_model = self.sdk.models.text_embeddings("query")
+            with EMBED_QUERY_SECONDS.time():
+                query_embedding = np.array(query_model.run(query))
+            self.query_cache.put(query, query_embedding)
+        return query_embedding
+
+    def embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """
+        Векторизует несколько запросов: промахи кэша запрашиваются у модели параллельно,
+        повторяющиеся в списке запросы — один раз.
+        :return: вектора в порядке запросов
+        """
+        embeddings = {query: self.query_cache.get(query) for query in queries}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        if missing:
+            embedder = BatchEmbedder(self.sdk.models.text_embeddings("query"), batch_size=1,
+                                     max_workers=self.embed_workers)
+            with EMBED_QUERY_BATCH_SECONDS.time():
+                computed = embedder.embed(missing)
+            for query, embedding in zip(missing, computed):
+                embeddings[query] = embedding
+                self.query_cache.put(query, embedding)
+        return [embeddings[query] for query in queries]
+
+    def generate_embeddings(self, chunks: List[str], metadata: List[dict],
+                            progress: Optional[Callable[[int], None]] = None) -> np.ndarray:
+        """
+        Векторизует чанки пакетами и сохраняет каждый готовый пакет в хранилище.
+        Вектора, найденные в embedding_cache, повторно не запрашиваются у модели.
+        :param progress: вызывается с числом сохранённых векторов после каждого пакета
+        :return: матрица векторов в порядке чанков
+        """
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        doc_model = self.sdk.models.text_embeddings("doc")
+        model_name = str(getattr(doc_model, "uri", "doc"))
 
-    def generate_embeddings(self, chunks: List[str], metadata: List[dict]):
-        doc_model = sdk.models.text_embeddings("doc")
-        doc_embeddings = [doc_model.run(text) for text in chunks]
-        self.storage.save_data(doc_embeddings, chunks, metadata)
+        cached = self.embedding_cache.get_many(chunks, model_name) if self.embedding_cache else {}
+        missing = [i for i in range(len(chunks)) if i not in cached]
+        doc_embeddings = None
+
+        def store(indices: List[int], embeddings: np.ndarray):
+            nonlocal doc_embeddings
+            if doc_embeddings is None:
+                doc_embeddings = np.empty((len(chunks), embeddings.shape[1]), dtype=np.float32)
+            doc_embeddings[indices] = embeddings
+            self.storage.save_data(embeddings, [chunks[i] for i in indices],
+                                   [metadata[i] for i in indices])
+            if progress:
+                progress(len(indices))
+
+        hits = sorted(cached)
+        for start in range(0, len(hits), self.embed_batch_size):
+            indices = hits[start:start + self.embed_batch_size]
+            store(indices, np.stack([cached[i] for i in indices]))
+
+        if missing:
+            embedder = BatchEmbedder(doc_model, batch_size=self.embed_batch_size,
+                                     max_workers=self.embed_workers)
+            missing_texts = [chunks[i] for i in missing]
+            EMBEDDED_CHUNKS.inc(len(missing))
+            for start, embeddings in embedder.iter_batches(missing_texts):
+                end = start + len(embeddings)
+                if self.embedding_cache:
+                    self.embedding_cache.put_many(missing_texts[start:end], embeddings, model_name)
+                store(missing[start:end], embeddings)
         return doc_embeddings
 
-    def find_similar_context(self, query: str) -> List[Tuple[str, str]]:
-        query_model = sdk.models.text_embeddings("query")
-        query_embedding = np.array(query_model.run(query))
-        results = self.storage.get_data(query_embedding, top_k=5)
+    def embed_chunks(self, chunks: List[str]) -> np.ndarray:
+        """
+        Векторизует чанки моделью "doc" без сохранения в хранилище.
+        Вектора, найденные в embedding_cache, повторно не запрашиваются у модели.
+        """
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        doc_model = self.sdk.models.text_embeddings("doc")
+        model_name = str(getattr(doc_model, "uri", "doc"))
 
-        # results — список чанков (или словарей) из стораджа
-        context_pairs = []
-        for r in results:
-            text = r.get("text", "")
-            source = r.get("metadata", {}).get("source", "unknown")
-            context_pairs.append((text, source))
+        cached = self.embedding_cache.get_many(chunks, model_name) if self.embedding_cache else {}
+        missing = [i for i in range(len(chunks)) if i not in cached]
+        computed = None
+        if missing:
+            missing_texts = [chunks[i] for i in missing]
+            embedder = BatchEmbedder(doc_model, batch_size=self.embed_batch_size,
+                                     max_workers=self.embed_workers)
+            with EMBED_CHUNKS_SECONDS.time():
+                computed = embedder.embed(missing_texts)
+            EMBEDDED_CHUNKS.inc(len(missing))
+            if self.embedding_cache:
+                self.embedding_cache.put_many(missing_texts, computed, model_name)
+
+        dim = computed.shape[1] if computed is not None else next(iter(cached.values())).shape[0]
+        doc_embeddings = np.empty((len(chunks), dim), dtype=np.float32)
+        if computed is not None:
+            doc_embeddings[missing] = computed
+        for i, embedding in cached.items():
+            doc_embeddings[i] = embedding
+        return doc_embeddings
+
+    def sync_document(self, source: str, chunks: List[str], metadata: List[dict],
+                      progress: Optional[Callable[[int], None]] = None) -> dict:
+        """
+        Инкрементальная загрузка документа: сравнивает новый набор чанков с сохранённым,
+        векторизует только новые/изменённые чанки и пакетно удаляет устаревшие.
+        """
+        metadata = [{**meta, "source": source} for meta in metadata]
+        ids = [make_point_id(chunk, meta) for chunk, meta in zip(chunks, metadata)]
+        existing = self.storage.get_ids_by_source(source)
+
+        seen = set()
+        new_indices = []
+        for i, point_id in enumerate(ids):
+            if point_id not in existing and point_id not in seen:
+                new_indices.append(i)
+            seen.add(point_id)
+        stale = existing - seen
+
+        if new_indices:
+            self.generate_embeddings([chunks[i] for i in new_indices], [metadata[i] for i in new_indices],
+                                     progress=progress)
+        if stale:
+            self.storage.delete_by_ids(sorted(stale))
+        return {"added": len(new_indices), "unchanged": len(seen) - len(new_indices), "deleted": len(stale)}
+
+    def search(self, query: str, filters: Optional[dict] = None, mode: Optional[str] = None) -> List[dict]:
+        """
+        Поиск контекста: кандидаты возвращаются хранилищем вместе с сохранёнными векторами
+        и переранжируются локально (MMR), без повторной векторизации.
+        :param filters: ограничение по полям payload, например {"source": ["a.pdf"]}
+        :param mode: "vector" или "hybrid"; по умолчанию search_mode ретривера
+        :return: top_k результатов с полями payload, "score" и "vector"
+        """
+        with SEARCH_SECONDS.time():
+            return self._search(query, filters, mode)
+
+    def _search(self, query: str, filters: Optional[dict], mode: Optional[str]) -> List[dict]:
+        if _resolve_mode(mode, self.search_mode, self.lexical_index) == "hybrid":
+            # BM25 считается в отдельном потоке, пока векторизуется запрос и идёт векторный поиск
+            if self._lexical_pool is None:
+                self._lexical_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bm25")
+            lexical = self._lexical_pool.submit(lexical_search, self.lexical_index, query, self.candidate_k, filters)
+            vector_hits = self._vector_search(query, self.candidate_k, filters)
+            return select_hits(vector_hits, lexical.result(), self.top_k, self.mmr_lambda)
 
-        return context_pairs
+        limit = self.top_k if self.mmr_lambda is None else self.candidate_k
+        return select_hits(self._vector_search(query, limit, filters), None, self.top_k, self.mmr_lambda)
+
+    def _vector_search(self, query: str, top_k: int, filters: Optional[dict]) -> List[dict]:
+        if self.batcher is not None:
+            return self.batcher.search(query, top_k, filters)
+        return self.storage.get_data(self.embed_query(query), top_k=top_k, with_vectors=True, filters=filters)
+
+    def find_similar_context(self, query: str, filters: Optional[dict] = None,
+                             mode: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        :param filters: ограничение по полям payload, например {"source": ["a.pdf"]}
+        :param mode: "vector" или "hybrid"; по умолчанию search_mode ретривера
+        """
+        # results — список чанков (или словарей) из стораджа
+        return to_context_pairs(self.search(query, filters, mode))
 
     def best_match(self, query, context_list: List[Tuple[str, str]], top_k: int) -> str:
         """
-        Простейшая реализация: берём контексты, ранжируем по косинусной близости и возвращаем топ-1.
+        Возвращает самый близкий к запросу контекст. Вектора контекстов берутся из кэша
+        эмбеддингов, заполненного при индексации; модель вызывается только для промахов.
         """
         if not context_list:
             return ""
         context_texts = [ctx[0] for ctx in context_list]
+        if isinstance(query, (list, tuple)):
+            query = query[0]
 
-        doc_model = sdk.models.text_embeddings("doc")
-        context_embeddings = [doc_model.run(str(text)) for text in context_list]
-        query_model = sdk.models.text_embeddings("query")
-        query_embedding = np.array(query_model.run(query))
+        scores = cosine_scores(self.embed_query(query), self.embed_chunks(context_texts))
+        return context_texts[int(np.argmax(scores))]
 
-        context_embeddings = np.array(context_embeddings)
 
-        scores = util.cos_sim(query_embedding, context_embeddings)
-        best_score_idx = scores.argmax().item()
-        return context_texts[best_score_idx]
+class AsyncRetriever(IAsyncRetriever):
+    """Ретривер для пути обработки запросов: векторизация и поиск не блокируют event loop."""
+
+    def __init__(self, storage: IAsyncStorage, query_cache_size: int = 1024,
+                 query_cache_ttl: Optional[float] = 3600.0,
+                 lexical_index: Optional[BM25Index] = None, search_mode: str = "vector",
+                 top_k: int = 5, candidate_k: int = 20, mmr_lambda: Optional[float] = 0.7, sdk=None,
+                 batch_window: Optional[float] = None, max_batch_size: int = 16):
+        """
+        :param batch_window: окно пакетирования одновременных запросов, секунды; None — без пакетирования
+        :param max_batch_size: максимальное число запросов в пакете
+        """
+        self.sdk = sdk if sdk is not None else create_async_sdk()
+        self.storage = storage
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size, ttl=query_cache_ttl)
+        self.lexical_index = lexical_index
+        self.search_mode = _resolve_mode(search_mode, search_mode, lexical_index)
+        self.top_k = top_k
+        self.candidate_k = max(candidate_k, top_k)
+        self.mmr_lambda = mmr_lambda
+        self.batcher = None
+        if batch_window is not None:
+            self.batcher = AsyncQueryBatcher(self.embed_queries, storage, window=batch_window,
+                                             max_batch_size=max_batch_size)
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        query_embedding = self.query_cache.get(query)
+        if query_embedding is None:
+            query_model = self.sdk.models.text_embeddings("query")
+            with EMBED_QUERY_SECONDS.time():
+                query_embedding = np.array(await query_model.run(query))
+            self.query_cache.put(query, query_embedding)
+        return query_embedding
+
+    async def embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Векторизует несколько запросов конкурентно, повторяющиеся в списке запросы — один раз."""
+        unique = list(dict.fromkeys(queries))
+        embeddings = dict(zip(unique, await asyncio.gather(*(self.embed_query(query) for query in unique))))
+        return [embeddings[query] for query in queries]
+
+    async def _vector_search(self, query: str, top_k: int, filters: Optional[dict]) -> List[dict]:
+        if self.batcher is not None:
+            return await self.batcher.search(query, top_k, filters)
+        query_embedding = await self.embed_query(query)
+        return await self.storage.get_data(query_embedding, top_k=top_k, with_vectors=True, filters=filters)
+
+    async def search(self, query: str, filters: Optional[dict] = None, mode: Optional[str] = None) -> List[dict]:
+        with SEARCH_SECONDS.time():
+            return await self._search(query, filters, mode)
+
+    async def _search(self, query: str, filters: Optional[dict], mode: Optional[str]) -> List[dict]:
+        if _resolve_mode(mode, self.search_mode, self.lexical_index) == "hybrid":
+            vector_hits, lexical_hits = await asyncio.gather(
+                self._vector_search(query, self.candidate_k, filters),
+                asyncio.to_thread(lexical_search, self.lexical_index, query, self.candidate_k, filters),
+            )
+            return select_hits(vector_hits, lexical_hits, self.top_k, self.mmr_lambda)
+        limit = self.top_k if self.mmr_lambda is None else self.candidate_k
+        return select_hits(await self._vector_search(query, limit, filters), None, self.top_k, self.mmr_lambda)
+
+    async def search_batch(self, queries: List[str], filters: Optional[dict] = None,
+                           mode: Optional[str] = None) -> List[List[dict]]:
+        """
+        Поиск контекста для нескольких запросов сразу: запросы векторизуются одним конкурентным
+        пакетом, векторный поиск — один вызов get_data_batch, BM25 — в одном фоновом потоке.
+        :return: результаты search в порядке запросов
+        """
+        if not queries:
+            return []
+        with SEARCH_BATCH_SECONDS.time():
+            hybrid = _resolve_mode(mode, self.search_mode, self.lexical_index) == "hybrid"
+            limit = self.candidate_k if hybrid or self.mmr_lambda is not None else self.top_k
 
+            async def vector_search() -> List[List[dict]]:
+                embeddings = await self.embed_queries(queries)
+                return await self.storage.get_data_batch(embeddings, top_k=limit, with_vectors=True, filters=filters)
 
+            if not hybrid:
+                return [select_hits(hits, None, self.top_k, self.mmr_lambda) for hits in await vector_search()]
+            vector_hits, lexical_hits = await asyncio.gather(vector_search(), asyncio.to_thread(
+                lambda: [lexical_search(self.lexical_index, query, self.candidate_k, filters) for query in queries]
+            ))
+            return [select_hits(vector, lexical, self.top_k, self.mmr_lambda)
+                    for vector, lexical in zip(vector_hits, lexical_hits)]
 
+    async def find_similar_context(self, query: str, filters: Optional[dict] = None,
+                                   mode: Optional[str] = None) -> List[Tuple[str, str]]:
+        return to_context_pairs(await self.search(query, filters, mode))
@@ -0,0 +1,56 @@
+"""Фильтры поиска по полям payload, общие для всех хранилищ."""
+from typing import Any, Dict, List, Optional, Union
+
+
+# Поле payload -> тип значения. По этим полям хранилища строят индексы
+FILTERABLE_FIELDS: Dict[str, type] = {
+    "source": str,
+    "page": int,
+    "page_id": int,
+}
+
+# Поле -> поле конца диапазона: чанк, перешедший на следующие страницы, подходит под фильтр
+# по любой странице от page до page_end (у точек без page_end — только по page)
+SPAN_FIELDS: Dict[str, str] = {"page": "page_end"}
+
+# Поля, по которым хранилища строят индексы payload: фильтруемые и концы диапазонов
+INDEXED_FIELDS: Dict[str, type] = {
+    **FILTERABLE_FIELDS,
+    **{end: FILTERABLE_FIELDS[field] for field, end in SPAN_FIELDS.items()},
+}
+
+FilterValue = Union[str, int, List[Union[str, int]]]
+
+
+def normalize_filters(filters: Optional[Dict[str, FilterValue]]) -> Dict[str, List[Any]]:
+    """
+    Приводит фильтр к виду {поле: [допустимые значения]}: условия по разным полям
+    объединяются через AND, значения одного поля — через OR.
+    :raises ValueError: поле не индексируется или значение не того типа
+    """
+    normalized = {}
+    for field, value in (filters or {}).items():
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Field {field!r} is not filterable, expected one of {sorted(FILTERABLE_FIELDS)}")
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        expected = FILTERABLE_FIELDS[field]
+        if not values or not all(isinstance(item, expected) and not isinstance(item, bool) for item in values):
+            raise ValueError(f"Filter {field!r} expects non-empty {expected.__name__} value(s)")
+        normalized[field] = list(values)
+    return normalized
+
+
+def payload_values(payload: dict, field: str) -> List[Any]:
+    """Значения фильтруемого поля, под которые подходит точка: для диапазона — все страницы от page до page_end."""
+    value = payload.get(field)
+    if value is None:
+        return []
+    end = SPAN_FIELDS.get(field)
+    if end is None:
+        return [value]
+    return list(range(value, max(value, payload.get(end) or value) + 1))
+
+
+def matches(payload: dict, filters: Dict[str, List[Any]]) -> bool:
+    """Проверяет payload по нормализованному фильтру."""
+    return all(not set(values).isdisjoint(payload_values(payload, field)) for field, values in filters.items())
@@ -0,0 +1,24 @@
+"""Детерминированные идентификаторы точек векторного хранилища."""
+import hashlib
+import uuid
+
+
+# Фиксированное пространство имён: один и тот же чанк всегда получает один и тот же id
+POINT_NAMESPACE = uuid.UUID("5b0f6c1e-7d2a-4d8e-9a53-3f1c2e4b8a71")
+
+
+def make_point_id(text: str, metadata: dict) -> str:
+    """
+    Строит id точки из (source, page, chunk_index, хэш содержимого).
+    :param text: текст чанка
+    :param metadata: метаданные чанка
+    :return: строковое представление UUIDv5
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    name = "|".join((
+        str(metadata.get("source", "")),
+        str(metadata.get("page", "")),
+        str(metadata.get("chunk_index", "")),
+        content_hash,
+    ))
+    return str(uuid.uuid5(POINT_NAMESPACE, name))
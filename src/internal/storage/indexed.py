@@ -0,0 +1,53 @@
+"""Векторное хранилище с параллельно поддерживаемым лексическим индексом BM25."""
+from typing import Any, Dict, List, Optional
+
+from src.interfaces.interfaces import IStorage
+from src.internal.retriever.bm25 import BM25Index
+from src.internal.storage.ids import make_point_id
+
+
+class LexicalIndexedStorage(IStorage):
+    """
+    Обёртка над IStorage: каждая запись и удаление зеркалируются в BM25Index,
+    поэтому лексический индекс строится во время индексации без отдельного прохода.
+    Остальные атрибуты (client, collection_name, ...) берутся у обёрнутого хранилища.
+    """
+
+    def __init__(self, storage: IStorage, index: BM25Index):
+        self.storage = storage
+        self.index = index
+
+    def __getattr__(self, name: str):
+        return getattr(self.storage, name)
+
+    def get_data(self, query_embedding, top_k: int, with_vectors: bool = False,
+                 filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        return self.storage.get_data(query_embedding, top_k, with_vectors, filters)
+
+    def get_data_batch(self, query_embeddings, top_k: int, with_vectors: bool = False,
+                       filters: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        return self.storage.get_data_batch(query_embeddings, top_k, with_vectors, filters)
+
+    def save_data(self, embeddings, chunks: List[str], metadata):
+        self.storage.save_data(embeddings, chunks, metadata)
+        self.index.add(
+            [make_point_id(chunk, meta) for chunk, meta in zip(chunks, metadata)],
+            chunks,
+            [{**meta, "text": chunk} for chunk, meta in zip(chunks, metadata)],
+        )
+        self.index.maybe_save()
+
+    def delete_by_page_id(self, page_id: int):
+        self.storage.delete_by_page_id(page_id)
+        self.index.remove_where("page_id", page_id)
+        self.index.maybe_save()
+
+    def get_ids_by_source(self, source: str) -> set[str]:
+        # Точки, которых нет в лексическом индексе (например, индекс был удалён), считаются
+        # отсутствующими: инкрементальная загрузка сохранит их заново и тем самым переиндексирует
+        return {point_id for point_id in self.storage.get_ids_by_source(source) if point_id in self.index}
+
+    def delete_by_ids(self, ids: list[str]):
+        self.storage.delete_by_ids(ids)
+        self.index.remove(ids)
+        self.index.maybe_save()
@@ -0,0 +1,391 @@
+"""Встроенное векторное хранилище на NumPy для разработки, тестов и небольших инсталляций."""
+import asyncio
+import base64
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from src.interfaces.interfaces import IAsyncStorage, IStorage
+from src.internal.metrics.metrics import stage_histogram, timed
+from src.internal.storage.filters import FILTERABLE_FIELDS, normalize_filters, payload_values
+from src.internal.storage.ids import make_point_id
+
+
+SEARCH_SECONDS = stage_histogram("numpy_search")
+SEARCH_BATCH_SECONDS = stage_histogram("numpy_search_batch")
+UPSERT_SECONDS = stage_histogram("numpy_upsert")
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+class NumpyStorage(IStorage):
+    """
+    Хранит нормированные вектора float32 в непрерывной матрице (опционально memory-mapped файл),
+    payload'ы — рядом в списке. Поиск — точный косинусный top-k одним матричным
+    умножением и argpartition. Для фильтрующих полей ведётся индекс значение -> id точек.
+
+    На диске payload'ы хранятся снимком (meta.json) и журналом упреждающей записи (ops.jsonl):
+    операция вместе с векторами точек дописывается в журнал до изменения матрицы, поэтому стоимость
+    индексации не растёт с размером коллекции, а после аварийной остановки журнал повторяется
+    поверх файла векторов. Удаление только помечает строку; строки переставляются при сворачивании
+    журнала в снимок, которое пишет новый файл векторов и переключается на него заменой снимка.
+    """
+
+    INDEXED_FIELDS = tuple(FILTERABLE_FIELDS)
+    # Журнал не сворачивается, пока в нём меньше стольких точек
+    MIN_COMPACT_ENTRIES = 1024
+
+    def __init__(self, config, path: Optional[str] = None, initial_capacity: int = 1024):
+        """
+        :param config: StorageConfig (используются vector_size, collection_name и numpy_path)
+        :param path: директория для memory-mapped файлов; None — только в памяти
+        :param initial_capacity: начальная ёмкость матрицы
+        """
+        self.collection_name = config.collection_name
+        self.vector_size = config.vector_size
+        self.path = path if path is not None else getattr(config, "numpy_path", None)
+        self._lock = threading.RLock()
+        # Удалённые строки до сворачивания остаются в матрице с id и payload None
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._deleted = 0
+        self._index: Dict[str, Dict[Any, set]] = {field: {} for field in self.INDEXED_FIELDS}
+        # Номер последней операции журнала и число точек в журнале с последнего снимка
+        self._seq = 0
+        self._log_entries = 0
+        self._log = None
+        self._vectors_file = f"{self.collection_name}.vectors.npy"
+        if self.path and (os.path.exists(self._meta_path) or os.path.exists(self._vectors_path)):
+            self._load()
+        else:
+            self._vectors = self._allocate(initial_capacity)
+        if self.path:
+            self._log = open(self._log_path, "a", encoding="utf-8")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, self._vectors_file)
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.meta.json")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.ops.jsonl")
+
+    def _allocate(self, capacity: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Новая матрица ёмкости capacity с векторами строк rows (по умолчанию — всех) в начале.
+        На диске пишется во временный файл и заменяет файл векторов атомарно.
+        """
+        shape = (capacity, self.vector_size)
+        count = len(self._ids) if rows is None else len(rows)
+        if not self.path:
+            vectors = np.zeros(shape, dtype=np.float32)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = self._vectors_path + ".tmp"
+            vectors = open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=shape)
+        if count:
+            vectors[:count] = self._vectors[:count] if rows is None else self._vectors[rows]
+        if not self.path:
+            return vectors
+        vectors.flush()
+        os.replace(tmp_path, self._vectors_path)
+        return open_memmap(self._vectors_path, mode="r+")
+
+    def _load(self):
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self._ids = meta["ids"]
+            self._payloads = meta["payloads"]
+            self._seq = meta.get("seq", 0)
+            self._vectors_file = meta.get("vectors", self._vectors_file)
+            self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+            for point_id, payload in zip(self._ids, self._payloads):
+                self._index_add(point_id, payload)
+        self._vectors = open_memmap(self._vectors_path, mode="r+")
+        self._remove_stale_vector_files()
+        self._replay_log()
+
+    def _remove_stale_vector_files(self):
+        """Удаляет файлы векторов, оставшиеся от сворачивания, прерванного до или после замены снимка."""
+        prefix = f"{self.collection_name}.vectors"
+        for name in os.listdir(self.path):
+            if name.startswith(prefix) and name != self._vectors_file:
+                os.remove(os.path.join(self.path, name))
+
+    def _replay_log(self):
+        """
+        Повторяет операции журнала, записанные после снимка. Журнал пишется до изменения матрицы
+        и содержит вектора точек, поэтому повтор уже применённой операции ничего не меняет.
+        """
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, "rb+") as f:
+            valid_end = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = None
+                if entry is None or not line.endswith(b"\n"):
+                    # Недописанная строка после аварийной остановки: её операция не подтверждена
+                    # и к матрице не применялась, хвост отрезается, чтобы новые записи не оказались после него
+                    f.truncate(valid_end)
+                    break
+                valid_end += len(line)
+                if entry["seq"] <= self._seq:
+                    continue
+                self._seq = entry["seq"]
+                put = [(point_id, payload, decode_vector(vector)) for point_id, payload, vector in entry["put"]]
+                self._apply(put, entry["delete"])
+                self._log_entries += len(put) + len(entry["delete"])
+        self._vectors.flush()
+
+    def _write_ahead(self, put: List[tuple], delete: List[str]):
+        """Записывает операцию в журнал и сбрасывает его на диск до изменения матрицы."""
+        if not self.path:
+            return
+        self._seq += 1
+        entry = {"seq": self._seq, "put": [[point_id, payload, encode_vector(vector)]
+                                           for point_id, payload, vector in put],
+                 "delete": delete}
+        self._log.write(json.dumps(entry, ensure_ascii=False))
+        self._log.write("\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._log_entries += len(put) + len(delete)
+
+    def _apply(self, put: List[tuple], delete: List[str]):
+        for point_id, payload, vector in put:
+            if point_id not in self._rows and len(self._ids) >= len(self._vectors):
+                self._vectors = self._allocate(max(2 * len(self._vectors), 1))
+            self._vectors[self._put(point_id, payload)] = vector
+        for point_id in delete:
+            self._delete(point_id)
+
+    def _commit(self, put: List[tuple] = (), delete: List[str] = ()):
+        """Выполняет операцию: журнал, затем матрица; при необходимости сворачивает журнал."""
+        put, delete = list(put), list(delete)
+        if not put and not delete:
+            return
+        self._write_ahead(put, delete)
+        self._apply(put, delete)
+        if max(self._log_entries, self._deleted) > max(self.MIN_COMPACT_ENTRIES, len(self)):
+            self._compact()
+
+    def _compact(self):
+        """
+        Убирает удалённые строки и сворачивает журнал в снимок. Снимок пишется редко (журнал
+        длиннее коллекции), поэтому на точку приходится O(1) работы.
+        """
+        live = np.array([row for row, point_id in enumerate(self._ids) if point_id is not None], dtype=np.int64)
+        capacity = max(len(self._vectors) if not self._deleted else 2 * len(live), 1)
+        if self.path:
+            self._vectors.flush()
+            # Сжатая матрица пишется в новый файл: до замены снимка действуют прежние файл и журнал
+            previous = self._vectors_path
+            self._vectors_file = f"{self.collection_name}.vectors.{self._seq}.npy"
+        self._vectors = self._allocate(capacity, live)
+        self._ids = [self._ids[row] for row in live]
+        self._payloads = [self._payloads[row] for row in live]
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+        self._deleted = 0
+        if not self.path:
+            return
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": self._seq, "vectors": self._vectors_file, "ids": self._ids,
+                       "payloads": self._payloads}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path)
+        # Операции до seq снимка при загрузке пропускаются, поэтому остановка между заменой снимка
+        # и очисткой журнала ничего не теряет
+        os.remove(previous)
+        self._log.close()
+        self._log = open(self._log_path, "w", encoding="utf-8")
+        self._log_entries = 0
+
+    def _index_add(self, point_id: str, payload: dict):
+        # Чанк на нескольких страницах попадает в индекс page по каждой из них
+        for field in self.INDEXED_FIELDS:
+            for value in payload_values(payload, field):
+                self._index[field].setdefault(value, set()).add(point_id)
+
+    def _index_remove(self, point_id: str, payload: dict):
+        for field in self.INDEXED_FIELDS:
+            for value in payload_values(payload, field):
+                ids = self._index[field].get(value)
+                if ids is not None:
+                    ids.discard(point_id)
+                    if not ids:
+                        del self._index[field][value]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _live_rows(self) -> np.ndarray:
+        if not self._deleted:
+            return np.arange(len(self._ids))
+        return np.array([row for row, point_id in enumerate(self._ids) if point_id is not None], dtype=np.int64)
+
+    def _filtered_rows(self, filters: dict) -> np.ndarray:
+        """Строки, подходящие под фильтр, по индексу значение -> id без просмотра всей коллекции."""
+        allowed = None
+        for field, values in filters.items():
+            ids = set().union(*(self._index[field].get(value, ()) for value in values))
+            allowed = ids if allowed is None else allowed & ids
+        return np.array(sorted(self._rows[point_id] for point_id in allowed), dtype=np.int64)
+
+    @timed(SEARCH_SECONDS)
+    def get_data(self, query_embedding, top_k: int, with_vectors: bool = False,
+                 filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        if isinstance(query_embedding, list) and query_embedding and not np.isscalar(query_embedding[0]):
+            query_embedding = query_embedding[0]
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        filters = normalize_filters(filters)
+
+        with self._lock:
+            rows = self._filtered_rows(filters) if filters else self._live_rows()
+            if len(rows) == 0 or top_k <= 0:
+                return []
+            contiguous = not filters and not self._deleted
+            scores = self._vectors[:len(rows)] @ query if contiguous else self._vectors[rows] @ query
+            return self._top_hits(rows, scores, top_k, with_vectors)
+
+    @timed(SEARCH_BATCH_SECONDS)
+    def get_data_batch(self, query_embeddings, top_k: int, with_vectors: bool = False,
+                       filters: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        """Близости всех запросов считаются одним умножением матрицы коллекции на матрицу запросов."""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.vector_size)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        filters = normalize_filters(filters)
+
+        with self._lock:
+            rows = self._filtered_rows(filters) if filters else self._live_rows()
+            if len(rows) == 0 or top_k <= 0:
+                return [[] for _ in queries]
+            vectors = self._vectors[:len(rows)] if not filters and not self._deleted else self._vectors[rows]
+            scores = vectors @ queries.T
+            return [self._top_hits(rows, scores[:, i], top_k, with_vectors) for i in range(len(queries))]
+
+    def _top_hits(self, rows: np.ndarray, scores: np.ndarray, top_k: int, with_vectors: bool) -> List[Any]:
+        count = len(rows)
+        k = min(top_k, count)
+        top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if with_vectors:
+            return [{**self._payloads[rows[i]], "score": float(scores[i]), "vector": np.array(self._vectors[rows[i]])}
+                    for i in top]
+        return [dict(self._payloads[rows[i]]) for i in top]
+
+    @timed(UPSERT_SECONDS)
+    def save_data(self, embeddings: list, chunks: List[str], metadata: dict | None):
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.vector_size)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._commit(put=[(make_point_id(chunk, meta), {**meta, "text": chunk}, vector)
+                              for vector, chunk, meta in zip(vectors, chunks, metadata)])
+
+    def _put(self, point_id: str, payload: dict) -> int:
+        """Добавляет или заменяет payload точки; возвращает её строку в матрице."""
+        row = self._rows.get(point_id)
+        if row is None:
+            row = len(self._ids)
+            self._ids.append(point_id)
+            self._payloads.append(payload)
+            self._rows[point_id] = row
+        else:
+            self._index_remove(point_id, self._payloads[row])
+            self._payloads[row] = payload
+        self._index_add(point_id, payload)
+        return row
+
+    def _delete(self, point_id: str):
+        row = self._rows.pop(point_id, None)
+        if row is None:
+            return
+        self._index_remove(point_id, self._payloads[row])
+        self._ids[row] = None
+        self._payloads[row] = None
+        self._deleted += 1
+
+    def delete_by_page_id(self, page_id: int):
+        with self._lock:
+            self._commit(delete=list(self._index["page_id"].get(page_id, ())))
+
+    def get_ids_by_source(self, source: str) -> set[str]:
+        with self._lock:
+            return set(self._index["source"].get(source, ()))
+
+    def delete_by_ids(self, ids: list[str]):
+        if not ids:
+            return
+        with self._lock:
+            self._commit(delete=[point_id for point_id in ids if point_id in self._rows])
+
+    def close(self):
+        if self.path:
+            with self._lock:
+                self._vectors.flush()
+                self._log.close()
+
+
+class AsyncNumpyStorage(IAsyncStorage):
+    """
+    Асинхронный интерфейс к NumpyStorage. Поиск выполняется прямо в event loop, без пула
+    потоков, если хранилище свободно; если блокировку держит запись (индексация), поиск
+    уходит в поток, чтобы event loop не ждал окончания записи.
+    """
+
+    def __init__(self, storage: NumpyStorage):
+        self.storage = storage
+        self.collection_name = storage.collection_name
+        self.vector_size = storage.vector_size
+
+    async def _search(self, search, *args):
+        lock = self.storage._lock
+        if lock.acquire(blocking=False):
+            try:
+                return search(*args)
+            finally:
+                lock.release()
+        return await asyncio.to_thread(search, *args)
+
+    async def get_data(self, query_embedding, top_k: int, with_vectors: bool = False,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        return await self._search(self.storage.get_data, query_embedding, top_k, with_vectors, filters)
+
+    async def get_data_batch(self, query_embeddings, top_k: int, with_vectors: bool = False,
+                             filters: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        return await self._search(self.storage.get_data_batch, query_embeddings, top_k, with_vectors, filters)
+
+    async def save_data(self, embeddings: list, chunks: List[str], metadata: dict | None):
+        self.storage.save_data(embeddings, chunks, metadata)
+
+    async def delete_by_page_id(self, page_id: int):
+        self.storage.delete_by_page_id(page_id)
+
+    async def close(self):
+        pass
@@ -1,43 +1,185 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue, ScoredPoint
-from typing import Any, List
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue, ScoredPoint, \
+    PointIdsList, MatchAny, PayloadSchemaType, HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, \
+    ScalarType, BinaryQuantization, BinaryQuantizationConfig, SearchParams, QuantizationSearchParams, SearchRequest, \
+    Range, IsEmptyCondition, PayloadField
+import asyncio
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
 import time
-from src.interfaces.interfaces import IStorage
-import uuid
+import numpy as np
+from src.interfaces.interfaces import IAsyncStorage, IStorage
+from src.internal.metrics.metrics import stage_histogram, timed
+from src.internal.storage.filters import INDEXED_FIELDS, SPAN_FIELDS, normalize_filters
+from src.internal.storage.ids import make_point_id
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SECONDS = stage_histogram("qdrant_search")
+SEARCH_BATCH_SECONDS = stage_histogram("qdrant_search_batch")
+UPSERT_SECONDS = stage_histogram("qdrant_upsert")
+
+
+def iter_point_batches(embeddings, chunks: List[str], metadata, batch_size: int) -> Iterator[List[PointStruct]]:
+    """Лениво собирает точки Qdrant и отдаёт их пакетами по batch_size."""
+    points = (
+        PointStruct(
+            id=make_point_id(chunk, meta),  # детерминированный id: повторная загрузка не плодит дубли
+            vector=np.asarray(embedding, dtype=np.float32).tolist(),
+            payload={**meta, "text": chunk},  # добавляем текст к метаданным
+        )
+        for embedding, chunk, meta in zip(embeddings, chunks, metadata)
+    )
+    while batch := list(islice(points, batch_size)):
+        yield batch
+
+
+def to_hit(point: ScoredPoint, with_vectors: bool) -> dict:
+    """Payload найденной точки; с with_vectors — вместе с сохранённым вектором и близостью."""
+    if not with_vectors:
+        return point.payload
+    return {**point.payload, "score": point.score, "vector": np.asarray(point.vector, dtype=np.float32)}
+
+
+def search_requests(query_embeddings, top_k: int, with_vectors: bool, filters: Optional[Dict[str, Any]],
+                    params: Optional[SearchParams]) -> List[SearchRequest]:
+    """Запросы search_batch: по одному на вектор, с общими фильтром, лимитом и параметрами поиска."""
+    query_filter = search_filter(filters)
+    return [
+        SearchRequest(vector=np.asarray(embedding, dtype=np.float32).tolist(), filter=query_filter,
+                      params=params, limit=top_k, with_payload=True, with_vector=with_vectors)
+        for embedding in query_embeddings
+    ]
+
+
+def page_id_filter(page_id: int) -> Filter:
+    return Filter(
+        must=[
+            FieldCondition(
+                key="page_id",
+                match=MatchValue(value=page_id)
+            )
+        ]
+    )
+
+
+def collection_params(config) -> dict:
+    """Аргументы create_collection из StorageConfig: вектора, HNSW и квантование."""
+    params = {
+        "vectors_config": VectorParams(size=config.vector_size, distance=Distance.COSINE,
+                                       on_disk=config.on_disk or None),
+    }
+    if config.hnsw_m is not None or config.hnsw_ef_construct is not None:
+        params["hnsw_config"] = HnswConfigDiff(m=config.hnsw_m, ef_construct=config.hnsw_ef_construct)
+    if config.quantization == "scalar":
+        params["quantization_config"] = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99,
+                                            always_ram=config.quantization_always_ram)
+        )
+    elif config.quantization == "binary":
+        params["quantization_config"] = BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=config.quantization_always_ram)
+        )
+    return params
+
+
+def search_params(config) -> Optional[SearchParams]:
+    """Параметры поиска: ef графа и повторная оценка кандидатов после квантованного поиска."""
+    quantization = None
+    if config.quantization:
+        quantization = QuantizationSearchParams(rescore=config.rescore, oversampling=config.oversampling)
+    if config.search_ef is None and quantization is None:
+        return None
+    return SearchParams(hnsw_ef=config.search_ef, quantization=quantization)
+
+
+def match_condition(field: str, values: List[Any]) -> FieldCondition:
+    return FieldCondition(key=field, match=MatchValue(value=values[0]) if len(values) == 1 else MatchAny(any=values))
+
+
+def span_condition(field: str, end: str, values: List[Any]) -> Filter:
+    """Значение входит в диапазон [field, end] точки; у точек без end сравнивается только field."""
+    return Filter(should=[
+        *(Filter(must=[FieldCondition(key=field, range=Range(lte=value)),
+                       FieldCondition(key=end, range=Range(gte=value))]) for value in values),
+        Filter(must=[IsEmptyCondition(is_empty=PayloadField(key=end)), match_condition(field, values)]),
+    ])
+
+
+def search_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+    """Переводит фильтр вида {поле: значение или список значений} в Filter Qdrant."""
+    conditions = [
+        span_condition(field, SPAN_FIELDS[field], values) if field in SPAN_FIELDS else match_condition(field, values)
+        for field, values in normalize_filters(filters).items()
+    ]
+    return Filter(must=conditions) if conditions else None
 
 
 class QdrantStorage(IStorage):
-    def __init__(self, config):
-        self.client = QdrantClient(url=config.qdrant_url)
+    def __init__(self, config, client: Optional[QdrantClient] = None):
+        self.client = client or QdrantClient(
+            url=config.qdrant_url,
+            grpc_port=config.grpc_port,
+            prefer_grpc=config.prefer_grpc,
+        )
         self.collection_name = config.collection_name
         self.vector_size = config.vector_size
+        self.upsert_batch_size = config.upsert_batch_size
+        self.upsert_parallelism = max(1, config.upsert_parallelism)
+        self.upsert_wait = config.upsert_wait
+        self.config = config
+        self.search_params = search_params(config)
         self._init_collection()
 
     def _wait_for_qdrant(self):
         for i in range(10):
             try:
                 self.client.get_collections()
-                print("Qdrant is up and running.")
+                logger.info("Qdrant is up and running.")
                 return
             except Exception as e:
-                print(f"Waiting for Qdrant... ({i+1}/10)")
+                logger.info("Waiting for Qdrant... (%d/10)", i + 1)
                 time.sleep(1)
         raise RuntimeError("Qdrant did not become available in time.")
 
     def _init_collection(self):
         collections = self.client.get_collections().collections
         existing_names = [col.name for col in collections]
-        print(f"Existing collections: {existing_names}")
+        logger.info("Existing collections: %s", existing_names)
         if self.collection_name not in existing_names:
-            print(f"Creating collection '{self.collection_name}'")
-            self.client.create_collection(
+            logger.info("Creating collection '%s'", self.collection_name)
+            try:
+                self.client.create_collection(collection_name=self.collection_name, **collection_params(self.config))
+            except Exception:
+                # Несколько воркеров сервера стартуют одновременно: коллекцию мог создать соседний
+                if not self.client.collection_exists(self.collection_name):
+                    raise
+                logger.info("Collection '%s' was created concurrently.", self.collection_name)
+        else:
+            logger.info("Collection '%s' already exists.", self.collection_name)
+        self._init_payload_indexes()
+
+    def _init_payload_indexes(self):
+        """
+        Индексы по фильтруемым полям payload: без них фильтр по source или page_id
+        проверяет каждую точку коллекции, с ними Qdrant отсекает кандидатов до обхода графа.
+        """
+        schema = self.client.get_collection(self.collection_name).payload_schema
+        for field, value_type in INDEXED_FIELDS.items():
+            if field in schema:
+                continue
+            self.client.create_payload_index(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
+                field_name=field,
+                field_schema=PayloadSchemaType.KEYWORD if value_type is str else PayloadSchemaType.INTEGER,
             )
-        else:
-            print(f"Collection '{self.collection_name}' already exists.")
 
-    def get_data(self, query_embedding: str, top_k: int) -> List[Any]:
+    @timed(SEARCH_SECONDS)
+    def get_data(self, query_embedding: str, top_k: int, with_vectors: bool = False,
+                 filters: Optional[Dict[str, Any]] = None) -> List[Any]:
         if isinstance(query_embedding, list):
             query_embedding = query_embedding[0]
 
@@ -45,36 +187,174 @@ class QdrantStorage(IStorage):
         result: List[ScoredPoint] = self.client.search(
             collection_name=self.collection_name,
             query_vector=query_embedding,
-            limit=top_k
+            query_filter=search_filter(filters),
+            search_params=self.search_params,
+            limit=top_k,
+            with_vectors=with_vectors
         )
-        return [point.payload for point in result]
+        return [to_hit(point, with_vectors) for point in result]
 
-    def save_data(self, embeddings:  list, chunks: List[str], metadata: dict | None):
-        points = []
-        for embedding, chunk, meta in zip(embeddings, chunks, metadata):
-            payload = meta.copy()  # метаданные — это dict
-            payload['text'] = chunk  # добавляем текст к метаданным
-            point = PointStruct(
-                id=str(uuid.uuid4()),  # уникальный id
-                vector=embedding,
-                payload=payload,
-            )
-            points.append(point)
+    @timed(SEARCH_BATCH_SECONDS)
+    def get_data_batch(self, query_embeddings, top_k: int, with_vectors: bool = False,
+                       filters: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        """Все запросы уходят в Qdrant одним search_batch."""
+        if len(query_embeddings) == 0:
+            return []
+        results = self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=search_requests(query_embeddings, top_k, with_vectors, filters, self.search_params),
+        )
+        return [[to_hit(point, with_vectors) for point in result] for result in results]
 
+    def _upsert(self, points: List[PointStruct], wait_applied: bool):
         self.client.upsert(
             collection_name=self.collection_name,
             points=points,
+            wait=wait_applied,
         )
 
+    @timed(UPSERT_SECONDS)
+    def save_data(self, embeddings:  list, chunks: List[str], metadata: dict | None):
+        """
+        Сохраняет точки пакетами по upsert_batch_size, держа в полёте до upsert_parallelism пакетов.
+        При upsert_wait=False пакеты отправляются без ожидания индексации, а последний пакет
+        отправляется с wait=True после подтверждения всех остальных: Qdrant применяет
+        обновления по порядку, поэтому он служит барьером для всей загрузки.
+        """
+        batches = iter_point_batches(embeddings, chunks, metadata, self.upsert_batch_size)
+        last_batch = next(batches, None)
+        if last_batch is None:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.upsert_parallelism) as executor:
+            in_flight = set()
+            for batch in batches:
+                if len(in_flight) >= self.upsert_parallelism:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(executor.submit(self._upsert, last_batch, self.upsert_wait))
+                last_batch = batch
+            for future in in_flight:
+                future.result()
+
+        self._upsert(last_batch, wait_applied=True)
+
     def delete_by_page_id(self, page_id: int):
         self.client.delete(
             collection_name=self.collection_name,
-            points_selector=Filter(
-                must=[
-                    FieldCondition(
-                        key="page_id",
-                        match=MatchValue(value=page_id)
-                    )
-                ]
+            points_selector=page_id_filter(page_id)
+        )
+
+    def get_ids_by_source(self, source: str) -> set[str]:
+        ids = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="source", match=MatchValue(value=source))]
+                ),
+                limit=1024,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
             )
+            ids.update(str(point.id) for point in points)
+            if offset is None:
+                return ids
+
+    def delete_by_ids(self, ids: list[str]):
+        if not ids:
+            return
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=list(ids)),
+        )
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncQdrantStorage(IAsyncStorage):
+    """
+    Асинхронное хранилище для пути обработки запросов: поиск не блокирует event loop.
+    Коллекцию создаёт синхронный QdrantStorage при старте приложения.
+    """
+
+    def __init__(self, config, client: Optional[AsyncQdrantClient] = None):
+        self.client = client or AsyncQdrantClient(
+            url=config.qdrant_url,
+            grpc_port=config.grpc_port,
+            prefer_grpc=config.prefer_grpc,
         )
+        self.collection_name = config.collection_name
+        self.vector_size = config.vector_size
+        self.upsert_batch_size = config.upsert_batch_size
+        self.upsert_parallelism = max(1, config.upsert_parallelism)
+        self.search_params = search_params(config)
+
+    @timed(SEARCH_SECONDS)
+    async def get_data(self, query_embedding, top_k: int, with_vectors: bool = False,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        if isinstance(query_embedding, list):
+            query_embedding = query_embedding[0]
+
+        result: List[ScoredPoint] = await self.client.search(
+            collection_name=self.collection_name,
+            query_vector=query_embedding,
+            query_filter=search_filter(filters),
+            search_params=self.search_params,
+            limit=top_k,
+            with_vectors=with_vectors
+        )
+        return [to_hit(point, with_vectors) for point in result]
+
+    @timed(SEARCH_BATCH_SECONDS)
+    async def get_data_batch(self, query_embeddings, top_k: int, with_vectors: bool = False,
+                             filters: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        if len(query_embeddings) == 0:
+            return []
+        results = await self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=search_requests(query_embeddings, top_k, with_vectors, filters, self.search_params),
+        )
+        return [[to_hit(point, with_vectors) for point in result] for result in results]
+
+    @timed(UPSERT_SECONDS)
+    async def save_data(self, embeddings: list, chunks: List[str], metadata: dict | None):
+        """
+        Сохраняет точки, как QdrantStorage.save_data: пакеты собираются лениво, в полёте не больше
+        upsert_parallelism, последний пакет отправляется с wait=True после подтверждения остальных.
+        """
+        batches = iter_point_batches(embeddings, chunks, metadata, self.upsert_batch_size)
+        last_batch = next(batches, None)
+        if last_batch is None:
+            return
+
+        in_flight = set()
+        try:
+            for batch in batches:
+                if len(in_flight) >= self.upsert_parallelism:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                in_flight.add(asyncio.ensure_future(
+                    self.client.upsert(collection_name=self.collection_name, points=last_batch, wait=False)
+                ))
+                last_batch = batch
+            await asyncio.gather(*in_flight)
+        finally:
+            # Ошибка одного пакета: остальные незавершённые пакеты отменяются
+            for task in in_flight:
+                task.cancel()
+        await self.client.upsert(collection_name=self.collection_name, points=last_batch, wait=True)
+
+    async def delete_by_page_id(self, page_id: int):
+        await self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=page_id_filter(page_id)
+        )
+
+    async def close(self):
+        await self.client.close()
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -7,6 +8,26 @@ class StorageConfig:
     port: int
     vector_size: int = 256
     collection_name: str = "documents"
+    grpc_port: int = 6334
+    prefer_grpc: bool = False
+    upsert_batch_size: int = 256
+    upsert_parallelism: int = 4
+    upsert_wait: bool = False
+    backend: str = "qdrant"  # "qdrant" или "numpy"
+    numpy_path: Optional[str] = None  # директория memory-mapped файлов для backend="numpy"
+    # Параметры HNSW и квантования применяются при создании коллекции Qdrant; None — значение Qdrant по умолчанию
+    hnsw_m: Optional[int] = None  # число связей узла графа (по умолчанию 16)
+    hnsw_ef_construct: Optional[int] = None  # ширина поиска при построении графа (по умолчанию 100)
+    search_ef: Optional[int] = None  # ширина поиска при запросе: выше — точнее и медленнее
+    on_disk: bool = False  # исходные вектора хранятся на диске (mmap), в RAM остаются квантованные
+    quantization: Optional[str] = None  # None, "scalar" (int8, x4 меньше) или "binary" (1 бит, x32 меньше)
+    quantization_always_ram: bool = True  # держать квантованные вектора в RAM
+    rescore: bool = True  # пересчитать top кандидатов по исходным векторам
+    oversampling: Optional[float] = None  # во сколько раз больше кандидатов брать из квантованного индекса
+
+    def __post_init__(self):
+        if self.quantization not in (None, "scalar", "binary"):
+            raise ValueError(f"Unknown quantization {self.quantization!r}, expected None, 'scalar' or 'binary'")
 
     @property
     def qdrant_url(self) -> str:
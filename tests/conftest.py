@@ -0,0 +1,19 @@
+import pytest
+
+from src.internal.retriever import retriever as retriever_module
+from tests.fakes import FakeAsyncSDK, FakeSDK
+
+
+@pytest.fixture(autouse=True)
+def fake_sdk(monkeypatch):
+    """Подменяет облачный SDK локальной детерминированной моделью эмбеддингов."""
+    sdk = FakeSDK()
+    monkeypatch.setattr(retriever_module, "create_sdk", lambda: sdk)
+    return sdk
+
+
+@pytest.fixture(autouse=True)
+def fake_async_sdk(monkeypatch):
+    sdk = FakeAsyncSDK()
+    monkeypatch.setattr(retriever_module, "create_async_sdk", lambda: sdk)
+    return sdk
@@ -0,0 +1,156 @@
+"""Детерминированные локальные заменители внешних сервисов для тестов."""
+import asyncio
+import hashlib
+import re
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fake_vector(text: str, dim: int = 256) -> np.ndarray:
+    """Bag-of-words вектор на хэшах токенов: похожие тексты дают близкие вектора."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest, "little") % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
+
+
+class FakeEmbeddingModel:
+    """Заменитель модели text_embeddings из yandex_cloud_ml_sdk."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, text: str) -> list[float]:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            threading.Event().wait(self.latency)
+        return fake_vector(text, self.dim).tolist()
+
+
+class FakeModels:
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.embedding_models = {
+            "doc": FakeEmbeddingModel(dim, latency),
+            "query": FakeEmbeddingModel(dim, latency),
+        }
+
+    def text_embeddings(self, name: str) -> FakeEmbeddingModel:
+        return self.embedding_models[name]
+
+
+class FakeSDK:
+    """Заменитель YCloudML: sdk.models.text_embeddings(name).run(text)."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.models = FakeModels(dim, latency)
+
+
+class FakeAsyncEmbeddingModel(FakeEmbeddingModel):
+    """Заменитель AsyncTextEmbeddingsModel: задержка не блокирует event loop."""
+
+    async def run(self, text: str) -> list[float]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return fake_vector(text, self.dim).tolist()
+
+
+class FakeAsyncModels(FakeModels):
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.embedding_models = {
+            "doc": FakeAsyncEmbeddingModel(dim, latency),
+            "query": FakeAsyncEmbeddingModel(dim, latency),
+        }
+
+
+class FakeAsyncSDK:
+    """Заменитель AsyncYCloudML."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.models = FakeAsyncModels(dim, latency)
+
+
+def fake_answer(messages: list[dict], max_tokens: int = 600) -> str:
+    """Детерминированный «ответ» LLM: начало последнего сообщения пользователя."""
+    words = messages[-1]["content"].split()
+    return " ".join(words[:min(max_tokens, 40)])
+
+
+def _completion(content: str) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _stream_chunk(content: str) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeChatCompletions:
+    """
+    Заменитель client.chat.completions из openai.OpenAI.
+    latency — время до первого токена, token_latency — задержка между токенами потока.
+    """
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, model: str, messages: list[dict], temperature: float = 0.2, max_tokens: int = 600,
+               stream: bool = False):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            threading.Event().wait(self.latency)
+        answer = fake_answer(messages, max_tokens)
+        if not stream:
+            return _completion(answer)
+        return self._stream(answer)
+
+    def _stream(self, answer: str):
+        for word in answer.split():
+            if self.token_latency:
+                threading.Event().wait(self.token_latency)
+            yield _stream_chunk(word + " ")
+
+
+class FakeAsyncChatCompletions(FakeChatCompletions):
+    """Заменитель client.chat.completions из openai.AsyncOpenAI: задержки не блокируют event loop."""
+
+    async def create(self, model: str, messages: list[dict], temperature: float = 0.2, max_tokens: int = 600,
+                     stream: bool = False):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        answer = fake_answer(messages, max_tokens)
+        if not stream:
+            return _completion(answer)
+        return self._astream(answer)
+
+    async def _astream(self, answer: str):
+        for word in answer.split():
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield _stream_chunk(word + " ")
+
+
+class FakeLLMClient:
+    """Заменитель OpenAI / AsyncOpenAI клиента: client.chat.completions.create(...)."""
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, asynchronous: bool = False):
+        completions_class = FakeAsyncChatCompletions if asynchronous else FakeChatCompletions
+        self.chat = SimpleNamespace(completions=completions_class(latency, token_latency))
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from src.internal.generator import answer_cache as answer_cache_module
+from src.internal.generator.answer_cache import SemanticAnswerCache
+from src.internal.generator.generator import Generator
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_hit_above_threshold_only():
+    cache = SemanticAnswerCache(threshold=0.95, max_size=4)
+    cache.put(unit(1, 0, 0), "ответ", sources=["a.pdf"])
+
+    assert cache.get(unit(1, 0.1, 0)) == "ответ"
+    assert cache.get(unit(1, 1, 0)) is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(threshold=0.99, max_size=2, ttl=10.0)
+    cache.put(unit(1, 0, 0), "x")
+    now[0] += 1
+    cache.put(unit(0, 1, 0), "y")
+    now[0] += 1
+    assert cache.get(unit(1, 0, 0)) == "x"
+    now[0] += 1
+    cache.put(unit(0, 0, 1), "z")
+
+    assert cache.get(unit(0, 1, 0)) is None
+    assert cache.stats()["evictions"] == 1
+    now[0] += 10
+    assert cache.get(unit(0, 0, 1)) is None
+    assert len(cache) == 0
+
+
+def test_invalidate_source():
+    cache = SemanticAnswerCache(threshold=0.99)
+    cache.put(unit(1, 0), "x", sources=["a.pdf", "b.pdf"])
+    cache.put(unit(0, 1), "y", sources=["c.pdf"])
+
+    assert cache.invalidate_source("b.pdf") == 1
+    assert cache.get(unit(1, 0)) is None
+    assert cache.get(unit(0, 1)) == "y"
+
+
+def test_new_chunks_invalidate_answers_citing_other_sources():
+    cache = SemanticAnswerCache(threshold=0.99)
+    cache.put(unit(1, 0), "x", sources=["a.pdf"])
+    cache.put(unit(0, 1), "y", sources=["b.pdf"])
+
+    assert cache.invalidate_indexed("b.pdf", added=0) == 1
+    assert cache.get(unit(1, 0)) == "x"
+    # Новый документ, на который не ссылается ни один ответ, всё равно сбрасывает кэш
+    assert cache.invalidate_indexed("new.pdf", added=3) == 1
+    assert cache.get(unit(1, 0)) is None
+    assert cache.stats()["generation"] == 2
+
+
+def test_answer_started_before_invalidation_is_not_stored():
+    cache = SemanticAnswerCache(threshold=0.99)
+    answer, generation = cache.lookup(unit(1, 0))
+    assert answer is None
+
+    # Переиндексация, пока ответ генерируется по прежнему корпусу
+    cache.invalidate_all()
+    cache.put(unit(1, 0), "stale", sources=["a.pdf"], generation=generation)
+
+    assert cache.get(unit(1, 0)) is None
+    answer, generation = cache.lookup(unit(1, 0))
+    cache.put(unit(1, 0), "fresh", sources=["a.pdf"], generation=generation)
+    assert cache.get(unit(1, 0)) == "fresh"
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+    retriever = MagicMock()
+    retriever.embed_query.side_effect = lambda query: unit(1, 0) if "экзамен" in query else unit(0, 1)
+    retriever.search.return_value = [{"text": "Экзамен в пятницу", "source": "экзамены.pdf"}]
+    generator = Generator(retriever=retriever, answer_cache=SemanticAnswerCache(threshold=0.9))
+    generator.client = MagicMock()
+    generator.client.chat.completions.create.return_value.choices[0].message.content = "В пятницу."
+    return generator
+
+
+def test_paraphrase_served_from_cache(generator):
+    assert generator.generate_answer("Когда экзамен?") == "В пятницу."
+    assert generator.generate_answer("В какой день экзамен?") == "В пятницу."
+    assert list(generator.stream_answer("экзамен когда")) == ["В пятницу."]
+
+    generator.client.chat.completions.create.assert_called_once()
+    generator.retriever.search.assert_called_once()
+
+    generator.answer_cache.invalidate_source("экзамены.pdf")
+    generator.generate_answer("Когда экзамен?")
+    assert generator.client.chat.completions.create.call_count == 2
+
+
+def test_generator_drops_answer_if_corpus_changed_during_generation(generator):
+    def reindex_during_llm_call(**kwargs):
+        generator.answer_cache.invalidate_indexed("новый.pdf", added=1)
+        return response
+
+    response = generator.client.chat.completions.create.return_value
+    generator.client.chat.completions.create.side_effect = reindex_during_llm_call
+
+    generator.generate_answer("Когда экзамен?")
+    assert len(generator.answer_cache) == 0
+
+    generator.client.chat.completions.create.side_effect = None
+    generator.generate_answer("Когда экзамен?")
+    assert generator.answer_cache.get(unit(1, 0)) == "В пятницу."
@@ -0,0 +1,189 @@
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi import FastAPI
+
+import main
+from main import Services, build_services, create_app, ingestion_enabled
+from src.internal.generator.answer_cache import SemanticAnswerCache
+from src.internal.generator.generator import AsyncGenerator, Generator
+from src.internal.http_server.server import Server
+from src.internal.ingestion.generation import CorpusGeneration
+from src.internal.ingestion.jobs import JobManager
+from src.internal.metrics.metrics import MetricsRegistry
+from src.internal.metrics.multiprocess import WorkerMetricsExporter
+from src.internal.retriever.bm25 import BM25Index
+from src.internal.retriever.retriever import AsyncRetriever, Retriever
+from src.internal.storage.indexed import LexicalIndexedStorage
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import FakeLLMClient, fake_vector
+
+
+def test_create_app_builds_services_per_lifespan_and_closes_them():
+    closed = []
+
+    def services_factory():
+        index = BM25Index()
+        numpy_storage = NumpyStorage(StorageConfig(host="localhost", port=6333, vector_size=256))
+        storage = LexicalIndexedStorage(numpy_storage, index)
+        texts = ["Экзамен по истории проходит в июне", "Пропуск выдаёт деканат"]
+        storage.save_data(np.stack([fake_vector(text) for text in texts]), texts,
+                          [{"source": "a.pdf", "page": 1, "chunk_index": i} for i in range(2)])
+        retriever = Retriever(storage, lexical_index=index, search_mode="hybrid")
+        job_manager = JobManager(retriever, workers=1, parse_workers=1)
+
+        async def close_async():
+            closed.append("async")
+
+        return Services(
+            storage=storage, retriever=retriever,
+            generator=Generator(retriever, client=FakeLLMClient()),
+            async_generator=AsyncGenerator(AsyncRetriever(AsyncNumpyStorage(numpy_storage), lexical_index=index),
+                                           client=FakeLLMClient(asynchronous=True)),
+            job_manager=job_manager,
+            on_shutdown=[job_manager.shutdown, lambda: closed.append("sync"), close_async],
+        )
+
+    app = create_app(services_factory=services_factory)
+    # Маршруты подключены при сборке приложения, а не в lifespan
+    assert "/api/ask" in {route.path for route in app.routes}
+
+    with TestClient(app) as client:
+        assert client.get("/health").json() == {"status": "healthy"}
+        response = client.post("/api/ask", json={"query": "Когда экзамен?"})
+        assert response.status_code == 200 and "Экзамен" in response.text
+        assert isinstance(app.state.services, Services)
+        assert closed == []
+
+    assert closed == ["sync", "async"]
+
+
+def test_numpy_backend_rejects_multiple_workers(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "numpy")
+    with pytest.raises(ValueError):
+        build_services(workers=2)
+
+
+def test_bm25_index_reloads_file_saved_by_another_process(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    writer = BM25Index(path=path)
+    reader = BM25Index(path=path, reload_interval=0)
+    writer.add(["1"], ["пропуск выдаёт деканат"], [{"text": "пропуск выдаёт деканат", "source": "a.pdf"}])
+    writer.save()
+
+    assert [hit["source"] for hit in reader.search("пропуск", top_k=1)] == ["a.pdf"]
+
+
+def test_multiple_workers_do_not_ingest(monkeypatch):
+    monkeypatch.delenv("INGESTION_ENABLED", raising=False)
+    assert not ingestion_enabled(1) and not ingestion_enabled(2)
+    monkeypatch.setenv("INGESTION_ENABLED", "true")
+    assert ingestion_enabled(1)
+    with pytest.raises(ValueError):
+        ingestion_enabled(2)
+
+    app = FastAPI()
+    app.include_router(Server(storage=NumpyStorage(StorageConfig(host="localhost", port=6333, vector_size=256)),
+                              job_manager=None).router)
+    client = TestClient(app)
+    assert client.get("/api/jobs").status_code == 503
+    assert client.post("/api/jobs", json={"files": ["/etc/passwd"]}).status_code == 503
+
+
+def app_environment(monkeypatch, tmp_path):
+    """Окружение воркера без WORKERS и INGESTION_ENABLED, как у uvicorn --workers и gunicorn -w."""
+    for name in ("WORKERS", "WEB_CONCURRENCY", "INGESTION_ENABLED"):
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+    monkeypatch.setenv("api", "test-key")
+    monkeypatch.setenv("STORAGE_BACKEND", "numpy")
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setenv("BM25_INDEX_PATH", str(tmp_path / "bm25.pkl"))
+    monkeypatch.setenv("CORPUS_GENERATION_PATH", str(tmp_path / "corpus_generation"))
+    monkeypatch.setenv("PDF_TEXT_CACHE_DIR", str(tmp_path / "pdf_text"))
+
+
+def test_documented_factory_launch_does_not_ingest(monkeypatch, tmp_path):
+    # uvicorn main:create_app --factory --workers 4: каждый воркер видит только своё окружение
+    app_environment(monkeypatch, tmp_path)
+
+    with TestClient(create_app()) as client:
+        assert client.app.state.services.job_manager is None
+        assert client.post("/api/jobs", json={"files": ["a.pdf"]}).status_code == 503
+
+    monkeypatch.setenv("INGESTION_ENABLED", "true")
+    with TestClient(create_app()) as client:
+        assert isinstance(client.app.state.services.job_manager, JobManager)
+
+
+def test_main_passes_worker_count_to_workers(monkeypatch, tmp_path):
+    app_environment(monkeypatch, tmp_path)
+    launched = []
+    monkeypatch.setattr(main.uvicorn, "run", lambda *args, **kwargs: launched.append(
+        (kwargs["workers"], os.environ["WORKERS"], os.getenv("INGESTION_ENABLED"))))
+
+    monkeypatch.setenv("WORKERS", "4")
+    main.main()
+    monkeypatch.setenv("WORKERS", "1")
+    main.main()
+
+    assert launched == [(4, "4", None), (1, "1", "true")]
+
+
+def test_corpus_generation_resets_answer_cache_of_other_process(tmp_path):
+    path = str(tmp_path / "generation")
+    ingester = CorpusGeneration(path)
+    cache = SemanticAnswerCache(threshold=0.99, corpus_generation=CorpusGeneration(path, poll_interval=0).current)
+    cache.put(fake_vector("вопрос"), "ответ", sources=["a.pdf"])
+    assert cache.get(fake_vector("вопрос")) == "ответ"
+
+    ingester.bump()
+
+    assert cache.get(fake_vector("вопрос")) is None
+    assert cache.stats()["generation"] == 1
+
+
+def test_bm25_index_reloads_on_corpus_generation_before_answer_cache_reset(tmp_path):
+    generation_path, index_path = str(tmp_path / "generation"), str(tmp_path / "bm25.pkl")
+    ingester, writer = CorpusGeneration(generation_path), BM25Index(path=index_path)
+    reader = BM25Index(path=index_path, corpus_generation=CorpusGeneration(generation_path, poll_interval=0).current)
+    seen_by_cache = []
+
+    def cache_generation():
+        generation = reader.sync_corpus_generation()
+        seen_by_cache.append((generation, len(reader)))
+        return generation
+
+    cache = SemanticAnswerCache(threshold=0.99, corpus_generation=cache_generation)
+    cache.put(fake_vector("вопрос"), "ответ", sources=["a.pdf"])
+
+    writer.add(["1"], ["пропуск выдаёт деканат"], [{"text": "пропуск выдаёт деканат", "source": "b.pdf"}])
+    writer.save()
+    ingester.bump()
+
+    assert cache.get(fake_vector("вопрос")) is None
+    # К сбросу кэша индекс уже перечитан
+    assert seen_by_cache[-1] == (1, 1)
+    writer.add(["2"], ["экзамен в пятницу"], [{"text": "экзамен в пятницу", "source": "c.pdf"}])
+    writer.save()
+    ingester.bump()
+    # Поиск с фильтром не обращается к кэшу ответов, но тоже видит новое поколение
+    assert [hit["source"] for hit in reader.search("экзамен", top_k=1, filters={"source": "c.pdf"})] == ["c.pdf"]
+
+
+def test_metrics_of_all_workers_are_rendered(tmp_path):
+    exporters = []
+    for worker in ("1", "2"):
+        registry = MetricsRegistry()
+        registry.counter("rag_requests_total", "requests").inc(int(worker))
+        exporters.append(WorkerMetricsExporter(str(tmp_path), registry=registry, worker=worker))
+    exporters[1].write()
+
+    text = exporters[0].render_prometheus()
+
+    assert text.count("# TYPE rag_requests_total counter") == 1
+    assert 'rag_requests_total{worker="1"} 1' in text and 'rag_requests_total{worker="2"} 2' in text
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from src.internal.generator.generator import AsyncGenerator
+from src.internal.http_server.server import Server
+from src.internal.metrics.metrics import TIME_TO_FIRST_TOKEN
+from src.internal.retriever.retriever import AsyncRetriever
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.internal.storage.qdrant import AsyncQdrantStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+
+LLM_LATENCY = 0.2
+
+
+class SlowCompletions:
+    """Заменитель AsyncOpenAI: ответ приходит через LLM_LATENCY секунд."""
+
+    async def create(self, stream=False, **kwargs):
+        await asyncio.sleep(LLM_LATENCY)
+        if stream:
+            return self._stream(["От", "вет", "\nготов"])
+        message = SimpleNamespace(content=" ответ ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    @staticmethod
+    async def _stream(tokens):
+        for token in tokens:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+async def make_generator() -> AsyncGenerator:
+    config = StorageConfig(host="localhost", port=6333, vector_size=256)
+    client = AsyncQdrantClient(":memory:")
+    await client.create_collection(config.collection_name,
+                                   vectors_config=VectorParams(size=256, distance=Distance.COSINE))
+    storage = AsyncQdrantStorage(config, client=client)
+    chunks = ["Экзамен по физике в пятницу", "Пропуск выдаёт деканат"]
+    metadata = [{"source": "a.pdf", "page": 1, "chunk_index": i} for i in range(2)]
+    await storage.save_data(np.stack([fake_vector(c) for c in chunks]), chunks, metadata)
+
+    generator = AsyncGenerator(retriever=AsyncRetriever(storage=storage))
+    generator.client = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions()))
+    return generator
+
+
+def test_async_retriever_finds_context(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+
+    async def scenario():
+        generator = await make_generator()
+        return await generator.retriever.find_similar_context("когда экзамен по физике")
+
+    context = asyncio.run(scenario())
+
+    assert context[0] == ("Экзамен по физике в пятницу", "a.pdf")
+
+
+def test_concurrent_asks_are_not_serialized(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+
+    async def scenario():
+        generator = await make_generator()
+        app = FastAPI()
+        app.include_router(Server(storage=MagicMock(), async_generator=generator).router)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/api/ask", json={"query": f"экзамен {i}"}) for i in range(10)
+            ))
+            return responses, time.perf_counter() - started
+
+    responses, elapsed = asyncio.run(scenario())
+
+    assert all(response.json() == "ответ" for response in responses)
+    # 10 запросов по LLM_LATENCY каждый выполняются параллельно, а не друг за другом
+    assert elapsed < LLM_LATENCY * 3
+
+
+def test_ask_stream_emits_sse_tokens(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+    observed = TIME_TO_FIRST_TOKEN.snapshot()["count"]
+
+    async def scenario():
+        generator = await make_generator()
+        app = FastAPI()
+        app.include_router(Server(storage=MagicMock(), async_generator=generator).router)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/ask/stream", json={"query": "экзамен"})
+
+    response = asyncio.run(scenario())
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = response.text.strip().split("\n\n")
+    assert events[:3] == ['data: {"token": "От"}', 'data: {"token": "вет"}', 'data: {"token": "\\nготов"}']
+    assert events[-1] == "event: done\ndata: {}"
+    assert TIME_TO_FIRST_TOKEN.snapshot()["count"] == observed + 1
+
+
+class CountingCompletions:
+    """Заменитель AsyncOpenAI для пакетной генерации: считает одновременные запросы, падает на «сломай»."""
+
+    def __init__(self):
+        self.active = self.peak = 0
+
+    async def create(self, messages, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.02)
+            if "сломай" in messages[-1]["content"]:
+                raise RuntimeError("LLM недоступна")
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ответ"))])
+        finally:
+            self.active -= 1
+
+
+def test_ask_batch_streams_ndjson_with_single_batch_search(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+    storage = NumpyStorage(StorageConfig(host="localhost", port=6333, vector_size=256))
+    chunks = ["Экзамен по физике в пятницу", "Пропуск выдаёт деканат"]
+    storage.save_data(np.stack([fake_vector(c) for c in chunks]), chunks,
+                      [{"source": "a.pdf", "page": 1, "chunk_index": i} for i in range(2)])
+    batch_sizes = []
+    get_data_batch = storage.get_data_batch
+
+    def counting_get_data_batch(embeddings, *args, **kwargs):
+        batch_sizes.append(len(embeddings))
+        return get_data_batch(embeddings, *args, **kwargs)
+
+    monkeypatch.setattr(storage, "get_data_batch", counting_get_data_batch)
+    completions = CountingCompletions()
+    generator = AsyncGenerator(retriever=AsyncRetriever(storage=AsyncNumpyStorage(storage)), batch_concurrency=3,
+                               client=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    queries = [f"Когда экзамен {i}?" for i in range(9)] + ["сломай генерацию"]
+
+    async def scenario():
+        app = FastAPI()
+        app.include_router(Server(storage=MagicMock(), async_generator=generator).router)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/ask/batch", json={"queries": queries, "concurrency": 10})
+
+    response = asyncio.run(scenario())
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert sorted(line["index"] for line in lines) == list(range(len(queries)))
+    assert all(line["answer"] == "ответ" for line in lines if line["index"] < 9)
+    assert "error" in next(line for line in lines if line["index"] == 9)
+    assert batch_sizes == [len(queries)]
+    # Лимит генератора не превышается, даже если запрос просит больше
+    assert completions.peak == 3
+
+
+def test_answer_batch_yields_answers_while_next_chunk_is_searched(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+    storage = NumpyStorage(StorageConfig(host="localhost", port=6333, vector_size=256))
+    chunks = ["Экзамен по физике в пятницу"]
+    storage.save_data(np.stack([fake_vector(c) for c in chunks]), chunks, [{"source": "a.pdf", "page": 1}])
+    retriever = AsyncRetriever(storage=AsyncNumpyStorage(storage))
+    search_batch = retriever.search_batch
+    searches = []
+
+    async def slow_search_batch(queries, **kwargs):
+        searches.append("started")
+        if len(searches) > 1:
+            # Поиск второй части заметно дольше ответа LLM по первой
+            await asyncio.sleep(0.3)
+        hits = await search_batch(queries, **kwargs)
+        searches.append("finished")
+        return hits
+
+    monkeypatch.setattr(retriever, "search_batch", slow_search_batch)
+    generator = AsyncGenerator(retriever=retriever,
+                               client=SimpleNamespace(chat=SimpleNamespace(completions=CountingCompletions())))
+
+    async def scenario():
+        order = []
+        async for index, _ in generator.answer_batch([f"экзамен {i}" for i in range(4)], search_batch_size=2):
+            order.append((index, list(searches)))
+        return order
+
+    order = asyncio.run(scenario())
+
+    assert sorted(index for index, _ in order) == [0, 1, 2, 3]
+    # Ответы первой части отданы до завершения поиска второй
+    first_chunk = [seen for index, seen in order if index < 2]
+    assert all(seen.count("finished") == 1 for seen in first_chunk)
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from src.internal.retriever.retriever import AsyncRetriever, Retriever
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import FakeAsyncSDK, FakeSDK, fake_vector
+
+
+CONFIG = StorageConfig(host="localhost", port=6333, vector_size=256)
+
+TEXTS = ["Экзамен по истории проходит в июне", "Курсовая сдаётся до мая", "Пропуск выдаёт деканат",
+         "Стипендия начисляется в начале месяца", "Пересдача назначается комиссией"]
+
+QUESTIONS = ["Когда экзамен?", "Кто выдаёт пропуск?", "Когда стипендия?", "Когда сдавать курсовую?",
+             "Кто назначает пересдачу?", "Когда экзамен по истории?", "Где взять пропуск?", "Когда экзамен?"]
+
+
+class CountingStorage(NumpyStorage):
+    def __init__(self, config):
+        super().__init__(config)
+        self.batches = []
+
+    def get_data_batch(self, query_embeddings, top_k, with_vectors=False, filters=None):
+        self.batches.append(len(query_embeddings))
+        return super().get_data_batch(query_embeddings, top_k, with_vectors, filters)
+
+
+def fill(storage):
+    storage.save_data(np.stack([fake_vector(text) for text in TEXTS]), TEXTS,
+                      [{"source": f"{i % 2}.pdf", "page": 1, "chunk_index": i} for i in range(len(TEXTS))])
+    return storage
+
+
+@pytest.mark.parametrize("make_storage", [
+    lambda: NumpyStorage(CONFIG),
+    lambda: QdrantStorage(CONFIG, client=QdrantClient(":memory:")),
+], ids=["numpy", "qdrant"])
+def test_get_data_batch_matches_get_data(make_storage):
+    storage = fill(make_storage())
+    queries = [fake_vector(question) for question in QUESTIONS[:3]]
+
+    for filters in (None, {"source": "1.pdf"}):
+        batch = storage.get_data_batch(queries, top_k=3, with_vectors=True, filters=filters)
+        single = [storage.get_data(query, top_k=3, with_vectors=True, filters=filters) for query in queries]
+        assert [[hit["text"] for hit in hits] for hits in batch] == [[hit["text"] for hit in hits] for hits in single]
+        assert batch[0][0]["score"] == pytest.approx(single[0][0]["score"], abs=1e-5)
+
+
+def test_sync_batcher_coalesces_concurrent_queries():
+    storage = fill(CountingStorage(CONFIG))
+    sdk = FakeSDK(latency=0.01)
+    retriever = Retriever(storage, sdk=sdk, mmr_lambda=None, batch_window=0.2, max_batch_size=4)
+    plain = Retriever(storage, sdk=FakeSDK(), mmr_lambda=None)
+    expected = [[hit["text"] for hit in plain.search(question)] for question in QUESTIONS]
+    storage.batches.clear()
+
+    results = [None] * len(QUESTIONS)
+    barrier = threading.Barrier(len(QUESTIONS))
+
+    def ask(i):
+        barrier.wait()
+        results[i] = [hit["text"] for hit in retriever.search(QUESTIONS[i])]
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(QUESTIONS))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == expected
+    assert storage.batches == [4, 4]
+    # Повторяющийся в пакете вопрос векторизуется один раз
+    assert sdk.models.text_embeddings("query").calls == len(set(QUESTIONS))
+
+
+def test_async_batcher_single_search_call_and_bad_filter_isolated():
+    storage = fill(CountingStorage(CONFIG))
+    retriever = AsyncRetriever(AsyncNumpyStorage(storage), sdk=FakeAsyncSDK(), mmr_lambda=None,
+                               batch_window=0.01, max_batch_size=16)
+
+    async def scenario():
+        return await asyncio.gather(*(retriever.search(q) for q in QUESTIONS),
+                                    retriever.search("Когда экзамен?", filters={"source": "0.pdf"}),
+                                    retriever.search("Когда экзамен?", filters={"unknown": 1}),
+                                    return_exceptions=True)
+
+    *results, filtered, bad = asyncio.run(scenario())
+
+    assert all(isinstance(hits, list) and hits for hits in results)
+    assert results[0][0]["text"] == TEXTS[0]
+    assert {hit["source"] for hit in filtered} == {"0.pdf"}
+    assert isinstance(bad, ValueError)
+    # Вопросы без фильтра и с фильтром — две группы одного пакета
+    assert sorted(storage.batches) == [1, len(QUESTIONS)]
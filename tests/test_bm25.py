@@ -0,0 +1,108 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.internal.retriever.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+from src.internal.retriever.retriever import AsyncRetriever, Retriever
+from src.internal.storage.indexed import LexicalIndexedStorage
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+
+TEXTS = [
+    "Положение о назначении стипендии студентам",
+    "Приказ № 1234 от 01.09.2024 о переводе студентов",
+    "Правила внутреннего распорядка общежития",
+    "Порядок оплаты обучения и предоставления скидок",
+]
+
+
+def add(index, texts):
+    index.add([str(i) for i in range(len(texts))], texts,
+              [{"text": text, "source": "a.pdf", "page_id": i} for i, text in enumerate(texts)])
+
+
+def test_tokenize_keeps_numbers_and_stems_russian():
+    tokens = tokenize("Приказ № 1234 от 01.09.2024 о Стипендиях и стипендии")
+    assert "1234" in tokens and "01.09.2024" in tokens
+    assert tokens.count("стипенд") == 2
+    assert "от" not in tokens
+
+
+def test_exact_identifier_ranks_first():
+    index = BM25Index()
+    add(index, TEXTS)
+
+    result = index.search("приказ 1234", top_k=2)
+
+    assert result[0]["text"] == TEXTS[1]
+    assert result[0]["score"] > 0
+
+
+def test_remove_and_persistence(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    index = BM25Index(path=path)
+    add(index, TEXTS)
+    index.remove(["1"])
+    assert index.remove_where("page_id", 2) == ["2"]
+    index.save()
+
+    restored = BM25Index(path=path)
+
+    assert len(restored) == 2
+    assert restored.search("приказ 1234", top_k=5) == []
+    assert restored.search("стипендия", top_k=5)[0]["text"] == TEXTS[0]
+
+
+def test_compaction_preserves_results():
+    index = BM25Index()
+    add(index, TEXTS * 50)
+    index.remove([str(i) for i in range(4, 200)])
+
+    assert len(index) == 4
+    assert len(index._ids) == 4
+    assert index.search("общежитие", top_k=1)[0]["text"] == TEXTS[2]
+
+
+def test_rrf_boosts_items_found_by_both():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], key=lambda item: item, top_k=2)
+    assert fused == ["c", "a"]
+
+
+@pytest.fixture
+def hybrid_storage():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, backend="numpy")
+    storage = LexicalIndexedStorage(NumpyStorage(config), BM25Index())
+    metadata = [{"source": "a.pdf", "page": 1, "chunk_index": i} for i in range(len(TEXTS))]
+    # Вектора намеренно не связаны с текстом: найти приказ по номеру может только BM25
+    vectors = np.stack([fake_vector(f"шум {i}") for i in range(len(TEXTS))])
+    storage.save_data(vectors, TEXTS, metadata)
+    return storage
+
+
+def test_hybrid_search_finds_exact_match(hybrid_storage):
+    retriever = Retriever(hybrid_storage, lexical_index=hybrid_storage.index, search_mode="hybrid", top_k=2)
+
+    assert retriever.find_similar_context("приказ 1234")[0][0] == TEXTS[1]
+    assert len(retriever.find_similar_context("приказ 1234", mode="vector")) == 2
+
+
+def test_async_hybrid_search(hybrid_storage):
+    retriever = AsyncRetriever(AsyncNumpyStorage(hybrid_storage.storage), lexical_index=hybrid_storage.index,
+                               search_mode="hybrid", top_k=2)
+
+    context = asyncio.run(retriever.find_similar_context("приказ 1234"))
+
+    assert context[0] == (TEXTS[1], "a.pdf")
+
+
+def test_indexed_storage_mirrors_deletes(hybrid_storage):
+    ids = hybrid_storage.get_ids_by_source("a.pdf")
+    assert len(ids) == len(TEXTS)
+
+    hybrid_storage.delete_by_ids(sorted(ids)[:2])
+
+    assert len(hybrid_storage.index) == len(TEXTS) - 2
+    assert hybrid_storage.get_ids_by_source("a.pdf") == set(sorted(ids)[2:])
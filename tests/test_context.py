@@ -0,0 +1,56 @@
+from src.internal.generator.context import format_context, merge_overlap, pack_context
+
+
+PAGE = ("Курсовая работа выполняется под руководством преподавателя кафедры. "
+        "Тема согласуется до конца сентября. Работа сдаётся в печатном и электронном виде. "
+        "Защита проходит перед комиссией из двух преподавателей.")
+
+
+def windows(text, size=90, overlap=30):
+    return [text[start:start + size] for start in range(0, len(text) - overlap, size - overlap)]
+
+
+def test_merge_overlap_restores_original_text():
+    chunks = windows(PAGE)
+    merged = chunks[0]
+    for chunk in chunks[1:]:
+        merged = merge_overlap(merged, chunk)
+    assert merged == PAGE
+    assert merge_overlap("совсем другой", "текст без перекрытия с предыдущим") is None
+
+
+def test_adjacent_chunks_merged_and_ordered_by_relevance():
+    chunks = windows(PAGE)
+    hits = [{"text": chunks[1], "source": "к.pdf", "page": 2, "chunk_index": 1},
+            {"text": "Экзамен проводится в июне.", "source": "э.pdf", "page": 1, "chunk_index": 0}]
+    hits += [{"text": text, "source": "к.pdf", "page": 2, "chunk_index": i}
+             for i, text in enumerate(chunks) if i != 1]
+    hits.append(dict(hits[0]))
+
+    passages = pack_context(hits, max_tokens=1000)
+
+    assert [passage.source for passage in passages] == ["к.pdf", "э.pdf"]
+    assert passages[0].text == PAGE
+    assert "[1] к.pdf, стр. 2" in format_context(passages)
+
+
+def test_budget_drops_least_relevant_and_truncates_first():
+    hits = [("а" * 300, "1.pdf"), ("б" * 300, "2.pdf"), ("в" * 30, "3.pdf")]
+
+    packed = pack_context(hits, max_tokens=120)
+    assert [passage.source for passage in packed] == ["1.pdf", "3.pdf"]
+
+    truncated = pack_context(hits, max_tokens=50)
+    assert len(truncated) == 1 and len(truncated[0].text) == 150
+
+
+def test_document_wide_chunks_merged_across_pages():
+    chunks = windows(PAGE)
+    hits = [{"text": text, "source": "к.pdf", "page": 3 + i // 2, "page_end": 3 + (i + 1) // 2, "chunk_index": 10 + i}
+            for i, text in enumerate(chunks)]
+
+    passages = pack_context(hits[::-1], max_tokens=1000)
+
+    assert len(passages) == 1 and passages[0].text == PAGE
+    assert (passages[0].page, passages[0].page_end) == (3, 3 + len(chunks) // 2)
+    assert format_context(passages).startswith(f"[1] к.pdf, стр. 3–{3 + len(chunks) // 2}")
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from src.internal.retriever.embedder import BatchEmbedder, is_rate_limited
+from src.internal.retriever.retriever import Retriever
+from tests.fakes import FakeEmbeddingModel, fake_vector
+
+
+class FlakyModel(FakeEmbeddingModel):
+    """Модель, отвечающая ошибкой лимита на первые несколько вызовов."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def run(self, text):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("StatusCode.RESOURCE_EXHAUSTED: quota exceeded")
+        return super().run(text)
+
+
+def test_embed_preserves_order():
+    texts = [f"чанк номер {i}" for i in range(50)]
+    embedder = BatchEmbedder(FakeEmbeddingModel(latency=0.001), batch_size=7, max_workers=4)
+
+    result = embedder.embed(texts)
+
+    assert result.shape == (50, 256)
+    for i, text in enumerate(texts):
+        np.testing.assert_allclose(result[i], fake_vector(text))
+
+
+def test_embed_retries_rate_limited_calls():
+    model = FlakyModel(failures=2)
+    embedder = BatchEmbedder(model, batch_size=4, max_workers=1, backoff=0.001)
+
+    result = embedder.embed(["a", "b"])
+
+    assert result.shape == (2, 256)
+    assert model.calls == 2
+
+
+def test_embed_raises_other_errors_without_retry():
+    model = MagicMock()
+    model.run.side_effect = ValueError("bad input")
+    embedder = BatchEmbedder(model, max_retries=3, backoff=0.001)
+
+    with pytest.raises(ValueError):
+        embedder.embed(["a"])
+    assert model.run.call_count == 1
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(RuntimeError("HTTP 429 Too Many Requests"))
+    assert not is_rate_limited(RuntimeError("connection reset"))
+
+
+def test_generate_embeddings_saves_in_batches(fake_sdk):
+    storage = MagicMock()
+    retriever = Retriever(storage=storage, embed_batch_size=3)
+    chunks = [f"текст {i}" for i in range(8)]
+    metadata = [{"source": "тест", "chunk_index": i} for i in range(8)]
+
+    result = retriever.generate_embeddings(chunks, metadata)
+
+    assert result.shape == (8, 256)
+    assert storage.save_data.call_count == 3
+    saved = sorted(call.args[2][0]["chunk_index"] for call in storage.save_data.call_args_list)
+    assert saved == [0, 3, 6]
+
+
+def test_batched_embedding_throughput():
+    latency = 0.005
+    texts = [f"документ {i}" for i in range(200)]
+    embedder = BatchEmbedder(FakeEmbeddingModel(latency=latency), batch_size=16, max_workers=8)
+
+    started = time.perf_counter()
+    embedder.embed(texts)
+    elapsed = time.perf_counter() - started
+
+    serial = latency * len(texts)
+    # 8 потоков должны дать как минимум трёхкратное ускорение относительно последовательного цикла
+    assert elapsed < serial / 3
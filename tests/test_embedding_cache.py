@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from src.internal.retriever.embedding_cache import EmbeddingCache
+from src.internal.retriever.retriever import Retriever
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def test_get_many_returns_only_hits(cache):
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    cache.put_many(["a", "b"], vectors, "doc")
+
+    found = cache.get_many(["b", "c", "a"], "doc")
+
+    assert sorted(found) == [0, 2]
+    np.testing.assert_array_equal(found[0], vectors[1])
+    assert cache.get_many(["a"], "other-model") == {}
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_eviction_keeps_size_under_limit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "small.sqlite3"), max_bytes=4 * 4 * 10)
+    for i in range(20):
+        cache.put_many([f"text {i}"], np.ones((1, 4), dtype=np.float32), "doc")
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 4 * 4 * 10
+    assert stats["evictions"] >= 10
+    assert cache.get_many(["text 19"], "doc")
+    cache.close()
+
+
+def test_running_byte_total_matches_table(tmp_path):
+    path = str(tmp_path / "bytes.sqlite3")
+    cache = EmbeddingCache(path, max_bytes=4 * 8 * 10)
+    cache.put_many(["a", "b", "a"], np.ones((3, 4), dtype=np.float32), "doc")
+    # Замена записи вектором другой длины и вытеснение
+    cache.put_many(["a"], np.ones((1, 8), dtype=np.float32), "doc")
+    for i in range(20):
+        cache.put_many([f"text {i}"], np.ones((1, 8), dtype=np.float32), "doc")
+
+    def table_bytes(cache):
+        return cache._conn.execute("SELECT COALESCE(SUM(length(vector)), 0) FROM embeddings").fetchone()[0]
+
+    assert cache.stats()["bytes"] == table_bytes(cache) <= 4 * 8 * 10
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    assert reopened.stats()["bytes"] == table_bytes(reopened)
+    reopened.close()
+
+
+def test_reingestion_skips_embedding_calls(cache, fake_sdk):
+    storage = MagicMock()
+    retriever = Retriever(storage=storage, embedding_cache=cache, embed_batch_size=2)
+    chunks = ["первый чанк", "второй чанк", "третий чанк"]
+    metadata = [{"source": "a.pdf"}] * 3
+    doc_model = fake_sdk.models.text_embeddings("doc")
+
+    first = retriever.generate_embeddings(chunks, metadata)
+    assert doc_model.calls == 3
+
+    second = retriever.generate_embeddings(chunks, metadata)
+
+    assert doc_model.calls == 3
+    np.testing.assert_array_equal(first, second)
+    assert storage.save_data.call_count == 4
@@ -0,0 +1,113 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from qdrant_client import QdrantClient
+
+from src.internal.http_server.server import Server
+from src.internal.retriever.bm25 import BM25Index
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.filters import normalize_filters
+from src.internal.storage.indexed import LexicalIndexedStorage
+from src.internal.storage.numpy_storage import NumpyStorage
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+
+TEXTS = {
+    "курсовые.pdf": ["Курсовая работа сдаётся до мая", "Оценку за курсовую ставит руководитель"],
+    "экзамены.pdf": ["Экзамен по курсовой теории в июне", "Пересдача экзамена назначается деканатом"],
+}
+
+
+def fill(storage):
+    for source, texts in TEXTS.items():
+        metadata = [{"source": source, "page": 1, "chunk_index": i} for i in range(len(texts))]
+        storage.save_data(np.stack([fake_vector(text) for text in texts]), texts, metadata)
+
+
+@pytest.fixture(params=["numpy", "qdrant"])
+def storage(request):
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, upsert_parallelism=1)
+    if request.param == "numpy":
+        storage = NumpyStorage(config)
+    else:
+        storage = QdrantStorage(config, client=QdrantClient(":memory:"))
+    fill(storage)
+    return storage
+
+
+def test_normalize_filters_rejects_unknown_fields():
+    assert normalize_filters({"source": "a.pdf", "page": [1, 2]}) == {"source": ["a.pdf"], "page": [1, 2]}
+    with pytest.raises(ValueError):
+        normalize_filters({"text": "x"})
+    with pytest.raises(ValueError):
+        normalize_filters({"page": "1"})
+
+
+def test_get_data_respects_filters(storage):
+    query = fake_vector("курсовая работа")
+
+    hits = storage.get_data(query, top_k=4, filters={"source": "экзамены.pdf"})
+
+    assert {hit["source"] for hit in hits} == {"экзамены.pdf"}
+    assert len(hits) == 2
+    assert len(storage.get_data(query, top_k=4, filters={"source": ["курсовые.pdf", "экзамены.pdf"]})) == 4
+
+
+PAGED = [
+    ("Начало правил на четвёртой странице", {"page": 4, "page_end": 5}),
+    ("Текст пятой страницы", {"page": 5}),
+    ("Текст шестой страницы", {"page": 6, "page_end": 6}),
+]
+
+
+def save_paged(storage):
+    texts = [text for text, _ in PAGED]
+    metadata = [{"source": "правила.pdf", "chunk_index": i, **pages} for i, (_, pages) in enumerate(PAGED)]
+    storage.save_data(np.stack([fake_vector(text) for text in texts]), texts, metadata)
+
+
+@pytest.mark.parametrize("page, expected", [
+    (4, {"Начало правил на четвёртой странице"}),
+    (5, {"Начало правил на четвёртой странице", "Текст пятой страницы"}),
+    ([5, 6], {text for text, _ in PAGED}),
+])
+def test_page_filter_matches_chunks_spanning_pages(storage, page, expected):
+    save_paged(storage)
+    index = BM25Index()
+    save_paged(LexicalIndexedStorage(MagicMock(), index))
+
+    hits = storage.get_data(fake_vector("страница"), top_k=10, filters={"page": page})
+    lexical = index.search("страниц правил", top_k=10, filters={"page": page})
+
+    assert {hit["text"] for hit in hits} == expected
+    assert {hit["text"] for hit in lexical} == expected
+
+
+def test_hybrid_search_filters_both_indexes():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256)
+    storage = LexicalIndexedStorage(NumpyStorage(config), BM25Index())
+    fill(storage)
+    retriever = Retriever(storage, lexical_index=storage.index, search_mode="hybrid", top_k=4)
+
+    context = retriever.find_similar_context("курсовая", filters={"source": ["курсовые.pdf"]})
+
+    assert {source for _, source in context} == {"курсовые.pdf"}
+
+
+def test_ask_passes_filters_and_validates_them():
+    generator = MagicMock()
+    generator.generate_answer.return_value = "ответ"
+    app = FastAPI()
+    app.include_router(Server(storage=MagicMock(), generator=generator).router)
+    client = TestClient(app)
+
+    response = client.post("/api/ask", json={"query": "когда экзамен", "filters": {"source": "экзамены.pdf"}})
+
+    assert response.status_code == 200
+    generator.generate_answer.assert_called_once_with("когда экзамен", filters={"source": ["экзамены.pdf"]})
+    assert client.post("/api/ask", json={"query": "?", "filters": {"text": "x"}}).status_code == 422
@@ -0,0 +1,36 @@
+import pytest
+from unittest.mock import MagicMock
+from src.internal.generator.generator import Generator
+
+
+@pytest.fixture
+def mock_retriever():
+    retriever = MagicMock()
+    retriever.search.return_value = [{"text": "Экзамен в пятницу", "source": "экзамены.pdf"}]
+    return retriever
+
+
+@pytest.fixture
+def generator(mock_retriever, monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+    generator = Generator(retriever=mock_retriever)
+    generator.client = MagicMock()
+    completion = generator.client.chat.completions.create.return_value
+    completion.choices[0].message.content = " В пятницу. "
+    return generator
+
+
+def test_generate_answer_retrieves_once(generator, mock_retriever):
+    answer = generator.generate_answer("Когда экзамен?")
+
+    assert answer == "В пятницу."
+    mock_retriever.search.assert_called_once_with("Когда экзамен?", filters=None)
+    messages = generator.client.chat.completions.create.call_args.kwargs["messages"]
+    assert "Экзамен в пятницу" in messages[-1]["content"]
+
+
+def test_generate_answer_without_context(generator, mock_retriever):
+    mock_retriever.search.return_value = []
+
+    assert generator.generate_answer("?") == "Нет релевантных контекстов."
+    generator.client.chat.completions.create.assert_not_called()
@@ -0,0 +1,101 @@
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from qdrant_client import QdrantClient
+
+from src.internal.file_processor.text_cache import PageTextCache
+from src.internal.http_server.server import Server
+from src.internal.ingestion.jobs import JobManager, PathOutsideRootError, resolve_pdf_paths
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+
+
+PDF_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "internal", "file_processor")
+SMALL_PDF = os.path.join(PDF_DIR, "проход.pdf")
+
+
+@pytest.fixture
+def job_manager(tmp_path):
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, upsert_parallelism=1)
+    storage = QdrantStorage(config, client=QdrantClient(":memory:"))
+    manager = JobManager(retriever=Retriever(storage=storage), workers=1,
+                         text_cache=PageTextCache(str(tmp_path / "pdf_text")))
+    yield manager
+    manager.shutdown(wait=True)
+
+
+@pytest.fixture
+def client(job_manager):
+    app = FastAPI()
+    app.include_router(Server(storage=job_manager.retriever.storage, job_manager=job_manager).router)
+    return TestClient(app)
+
+
+def wait_for(client, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def test_resolve_pdf_paths_from_directory():
+    paths = resolve_pdf_paths(directory=PDF_DIR)
+
+    assert len(paths) == 3
+    assert all(path.endswith(".pdf") for path in paths)
+    with pytest.raises(FileNotFoundError):
+        resolve_pdf_paths(files=["/nonexistent.pdf"])
+
+
+def test_job_reports_progress(client):
+    response = client.post("/api/jobs", json={"files": [SMALL_PDF]})
+    assert response.status_code == 202
+
+    job = wait_for(client, response.json()["id"])
+
+    assert job["status"] == "completed"
+    assert job["pages_done"] == 2
+    assert job["chunks_done"] > 0
+    assert job["embeddings_done"] == job["added"] == job["chunks_done"]
+    assert job["errors"] == []
+
+
+def test_rerun_skips_unchanged_chunks(client):
+    first = wait_for(client, client.post("/api/jobs", json={"files": [SMALL_PDF]}).json()["id"])
+    second = wait_for(client, client.post("/api/jobs", json={"files": [SMALL_PDF]}).json()["id"])
+
+    assert second["added"] == 0
+    assert second["unchanged"] == first["added"]
+    assert second["embeddings_done"] == 0
+    assert (first["text_cache_misses"], second["text_cache_hits"]) == (1, 1)
+    assert second["pages_done"] == first["pages_done"]
+
+
+def test_paths_outside_documents_root_are_rejected(client, tmp_path):
+    outside = tmp_path / "secret.pdf"
+    outside.write_bytes(b"%PDF-1.4")
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "link.pdf").symlink_to(outside)
+
+    for body in ({"files": [str(outside)]}, {"files": ["../../../../etc/passwd"]}, {"directory": str(tmp_path)}):
+        response = client.post("/api/jobs", json=body)
+        assert response.status_code == 400 and "вне каталога" in response.json()["detail"]
+
+    with pytest.raises(PathOutsideRootError):
+        resolve_pdf_paths(files=["link.pdf"], root=str(root))
+    with pytest.raises(PathOutsideRootError):
+        resolve_pdf_paths(directory=".", root=str(root))
+    assert resolve_pdf_paths(files=["проход.pdf"], root=PDF_DIR) == [os.path.join(PDF_DIR, "проход.pdf")]
+
+
+def test_unknown_job_and_bad_paths(client):
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.post("/api/jobs", json={"files": ["/nonexistent.pdf"]}).status_code == 400
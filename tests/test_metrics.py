@@ -0,0 +1,83 @@
+import logging
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.internal.generator.generator import Generator
+from src.internal.metrics.metrics import REGISTRY, MetricsRegistry, stage_histogram
+from src.internal.metrics.tracing import TRACE_ID, RequestMetricsMiddleware, TraceIdFilter
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.numpy_storage import NumpyStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import FakeLLMClient, fake_vector
+
+
+def test_render_prometheus():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("rag_x_seconds", "x", buckets=(0.1, 1.0), labels={"stage": "a"})
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    registry.counter("rag_tokens_total", "tokens").inc(7)
+    registry.gauge("rag_running", "running").set(2)
+    registry.register_collector("rag_cache", lambda: {"hits": 3, "name": "lru"})
+
+    text = registry.render_prometheus()
+
+    assert '# TYPE rag_x_seconds histogram' in text
+    assert 'rag_x_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'rag_x_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'rag_x_seconds_count{stage="a"} 2' in text
+    assert "rag_tokens_total 7" in text and "rag_running 2" in text
+    assert "rag_cache_hits 3" in text and "rag_cache_name" not in text
+    assert registry.snapshot()['rag_x_seconds{stage="a"}']["count"] == 2
+    with pytest.raises(ValueError):
+        registry.counter("rag_x_seconds", "x")
+
+
+def test_middleware_counts_routes_and_propagates_trace_id(caplog):
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware)
+    seen = []
+
+    @app.get("/api/jobs/{job_id}")
+    async def job(job_id: str):
+        logging.getLogger("test").info("job %s", job_id)
+        seen.append(TRACE_ID.get())
+        return {"id": job_id}
+
+    requests = REGISTRY.counter("rag_http_requests_total", "",
+                                labels={"method": "GET", "route": "/api/jobs/{job_id}", "status": "200"})
+    before = requests.value
+    client = TestClient(app)
+    caplog.handler.addFilter(TraceIdFilter())
+
+    with caplog.at_level(logging.INFO, logger="test"):
+        response = client.get("/api/jobs/1", headers={"X-Request-ID": "abc123"})
+    generated = client.get("/api/jobs/2").headers["x-request-id"]
+
+    assert response.headers["x-request-id"] == "abc123"
+    assert seen == ["abc123", generated] and len(generated) == 16
+    assert caplog.records[0].trace_id == "abc123"
+    assert requests.value == before + 2
+
+
+def test_answer_records_stages_and_tokens(monkeypatch):
+    monkeypatch.setenv("api", "test-key")
+    storage = NumpyStorage(StorageConfig(host="localhost", port=6333, vector_size=256))
+    texts = ["Экзамен по истории проходит в июне", "Курсовая сдаётся до мая"]
+    storage.save_data(np.stack([fake_vector(text) for text in texts]), texts,
+                      [{"source": "a.pdf", "page": 1, "chunk_index": i} for i in range(2)])
+    generator = Generator(Retriever(storage))
+    generator.client = FakeLLMClient()
+    stages = {stage: stage_histogram(stage).snapshot()["count"]
+              for stage in ("embed_query", "numpy_search", "rerank", "retriever_search", "llm_completion")}
+    prompt_tokens = REGISTRY.counter("rag_llm_prompt_tokens_total", "").value
+
+    generator.generate_answer("Когда экзамен?")
+    list(generator.stream_answer("Когда курсовая?"))
+
+    for stage, count in stages.items():
+        assert stage_histogram(stage).snapshot()["count"] == count + 2, stage
+    assert REGISTRY.counter("rag_llm_prompt_tokens_total", "").value > prompt_tokens
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.numpy_storage import AsyncNumpyStorage, NumpyStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+
+@pytest.fixture
+def config():
+    return StorageConfig(host="localhost", port=6333, vector_size=256, backend="numpy")
+
+
+def save(storage, texts, source="a.pdf", **extra):
+    metadata = [{"source": source, "page": 1, "chunk_index": i, **extra} for i in range(len(texts))]
+    storage.save_data(np.stack([fake_vector(text) for text in texts]), texts, metadata)
+
+
+def test_top_k_matches_exact_cosine(config):
+    storage = NumpyStorage(config, initial_capacity=2)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 256)).astype(np.float32)
+    texts = [f"чанк {i}" for i in range(50)]
+    storage.save_data(vectors, texts, [{"source": "a.pdf", "chunk_index": i} for i in range(50)])
+    query = rng.standard_normal(256).astype(np.float32)
+
+    result = storage.get_data(query, top_k=5)
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normed @ query))[:5]
+    assert [hit["text"] for hit in result] == [texts[i] for i in expected]
+    assert len(storage) == 50
+
+
+def test_delete_keeps_matrix_contiguous(config):
+    storage = NumpyStorage(config)
+    save(storage, ["один", "два", "три"])
+    save(storage, ["четыре"], source="b.pdf", page_id=7)
+
+    storage.delete_by_ids([next(iter(storage.get_ids_by_source("a.pdf")))])
+    storage.delete_by_page_id(7)
+
+    assert len(storage) == 2
+    assert storage.get_ids_by_source("b.pdf") == set()
+    hits = storage.get_data(fake_vector("три"), top_k=10)
+    assert len(hits) == 2
+
+
+def test_memory_mapped_storage_survives_restart(config, tmp_path):
+    storage = NumpyStorage(config, path=str(tmp_path), initial_capacity=1)
+    save(storage, ["экзамен в пятницу", "пропуск в деканате"])
+
+    reopened = NumpyStorage(config, path=str(tmp_path))
+
+    assert len(reopened) == 2
+    assert reopened.get_data(fake_vector("экзамен в пятницу"), top_k=1)[0]["text"] == "экзамен в пятницу"
+    assert reopened.get_ids_by_source("a.pdf") == storage.get_ids_by_source("a.pdf")
+
+
+def test_log_replay_and_compaction_restore_rows(config, tmp_path, monkeypatch):
+    monkeypatch.setattr(NumpyStorage, "MIN_COMPACT_ENTRIES", 4)
+    storage = NumpyStorage(config, path=str(tmp_path), initial_capacity=1)
+    texts = [f"чанк номер {i}" for i in range(8)]
+    for text in texts:
+        save(storage, [text])
+    storage.delete_by_ids(sorted(storage.get_ids_by_source("a.pdf"))[:3])
+    save(storage, ["после удаления"])
+    storage.close()
+    # Недописанная при аварийной остановке строка журнала отбрасывается
+    with open(storage._log_path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 999, "put": [["x"')
+
+    reopened = NumpyStorage(config, path=str(tmp_path))
+    save(reopened, ["после перезапуска"])
+    again = NumpyStorage(config, path=str(tmp_path))
+
+    assert os.path.getsize(storage._meta_path) > 0
+    assert again._ids == reopened._ids and len(again) == len(texts) - 3 + 2
+    for text in ["после удаления", "после перезапуска"] + [p["text"] for p in storage._payloads]:
+        assert again.get_data(fake_vector(text), top_k=1)[0]["text"] == text
+
+
+CRASH_SCRIPT = """
+import os, sys
+import numpy as np
+from src.internal.storage import numpy_storage
+from src.internal.storage.numpy_storage import NumpyStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+path, crash_point = sys.argv[1], sys.argv[2]
+config = StorageConfig(host="localhost", port=6333, vector_size=256, backend="numpy")
+storage = NumpyStorage(config, path=path)
+
+def crash(*args, **kwargs):
+    os._exit(1)
+
+if crash_point == "before_matrix":
+    storage._apply = crash
+elif crash_point == "after_vector_write":
+    storage._delete = crash
+elif crash_point == "during_compaction":
+    NumpyStorage.MIN_COMPACT_ENTRIES = 1
+    replace = os.replace
+    numpy_storage.os.replace = lambda src, dst: crash() if dst == storage._meta_path else replace(src, dst)
+# Одна операция: новый вектор у существующей точки и удаление другой точки
+storage._commit(put=[(storage._ids[1], storage._payloads[1], fake_vector("новый вектор"))],
+                delete=[storage._ids[0]])
+"""
+
+
+@pytest.mark.parametrize("crash_point", ["before_matrix", "after_vector_write", "during_compaction"])
+def test_storage_recovers_after_process_killed_mid_write(config, tmp_path, crash_point):
+    texts = ["один", "два", "три", "четыре"]
+    storage = NumpyStorage(config, path=str(tmp_path), initial_capacity=2)
+    save(storage, texts)
+    storage.close()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    killed = subprocess.run([sys.executable, "-c", CRASH_SCRIPT, str(tmp_path), crash_point], cwd=root)
+    assert killed.returncode == 1
+
+    reopened = NumpyStorage(config, path=str(tmp_path))
+    # Журнал записан до изменения матрицы, поэтому операция доводится до конца при загрузке
+    assert len(reopened) == 3
+    assert reopened.get_data(fake_vector("новый вектор"), top_k=1)[0]["text"] == "два"
+    for text in ["три", "четыре"]:
+        assert reopened.get_data(fake_vector(text), top_k=1)[0]["text"] == text
+    assert "один" not in {hit["text"] for hit in reopened.get_data(fake_vector("один"), top_k=10)}
+    assert [name for name in os.listdir(tmp_path) if ".vectors" in name] == [reopened._vectors_file]
+
+
+def test_async_search_does_not_block_event_loop_while_writer_holds_lock(config):
+    storage = NumpyStorage(config)
+    save(storage, ["экзамен в пятницу"])
+    async_storage = AsyncNumpyStorage(storage)
+    locked, release = threading.Event(), threading.Event()
+
+    def writer():
+        with storage._lock:
+            locked.set()
+            release.wait(timeout=5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    locked.wait()
+
+    async def scenario():
+        search = asyncio.ensure_future(async_storage.get_data(fake_vector("экзамен"), top_k=1))
+        await asyncio.sleep(0.05)
+        # Поиск ждёт блокировку в потоке, event loop продолжает работать
+        assert not search.done() and not release.is_set()
+        release.set()
+        return await search
+
+    hits = asyncio.run(scenario())
+    thread.join()
+    assert hits[0]["text"] == "экзамен в пятницу"
+
+
+def test_retriever_sync_with_numpy_backend(config):
+    storage = NumpyStorage(config)
+    retriever = Retriever(storage=storage)
+
+    retriever.sync_document("a.pdf", ["один", "два"], [{"page": 1, "chunk_index": i} for i in range(2)])
+    stats = retriever.sync_document("a.pdf", ["один"], [{"page": 1, "chunk_index": 0}])
+
+    assert stats == {"added": 0, "unchanged": 1, "deleted": 1}
+    assert retriever.find_similar_context("один")[0] == ("один", "a.pdf")
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from qdrant_client import QdrantClient
+
+from src.internal.file_processor.processor import PDFChunker
+from src.internal.ingestion.pipeline import IngestionPipeline
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.qdrant import QdrantStorage
+from src.storage_config.config import StorageConfig
+
+
+PDF_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "internal", "file_processor")
+EXAMS_PDF = os.path.join(PDF_DIR, "экзамены.pdf")
+
+
+@pytest.fixture
+def storage():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, upsert_parallelism=1)
+    return QdrantStorage(config, client=QdrantClient(":memory:"))
+
+
+def test_pipeline_indexes_incrementally(storage):
+    pipeline = IngestionPipeline(Retriever(storage=storage), PDFChunker(800, 150), batch_size=8, queue_size=1)
+    events = []
+
+    stats = pipeline.run(EXAMS_PDF, progress=lambda event, count: events.append((event, count)))
+
+    total = storage.client.count(storage.collection_name).count
+    assert stats == {"added": total, "unchanged": 0, "deleted": 0}
+    assert sum(count for event, count in events if event == "pages") == 32
+    # Первые пакеты записываются до того, как разобрана последняя страница
+    first_stored = events.index(("embeddings", 8))
+    last_page = max(i for i, (event, _) in enumerate(events) if event == "pages")
+    assert first_stored < last_page
+
+
+def test_pipeline_rerun_is_noop_and_removes_stale(storage, fake_sdk):
+    retriever = Retriever(storage=storage)
+    stale = {"source": EXAMS_PDF, "page": 99, "chunk_index": 0}
+    retriever.generate_embeddings(["устаревший чанк"], [stale])
+    pipeline = IngestionPipeline(retriever, PDFChunker(800, 150), batch_size=16)
+
+    first = pipeline.run(EXAMS_PDF)
+    calls = fake_sdk.models.text_embeddings("doc").calls
+    second = pipeline.run(EXAMS_PDF)
+
+    assert first["deleted"] == 1
+    assert second == {"added": 0, "unchanged": first["added"], "deleted": 0}
+    assert fake_sdk.models.text_embeddings("doc").calls == calls
+
+
+def test_pipeline_propagates_stage_errors(storage, fake_sdk, monkeypatch):
+    def broken(text):
+        raise RuntimeError("embedding service down")
+
+    monkeypatch.setattr(fake_sdk.models.text_embeddings("doc"), "run", broken)
+    pipeline = IngestionPipeline(Retriever(storage=storage), PDFChunker(800, 150), batch_size=4)
+
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        pipeline.run(EXAMS_PDF)
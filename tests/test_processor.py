@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from src.internal.file_processor import processor
+from src.internal.file_processor.processor import LateChunker, PDFChunk, PDFChunker, TokenLength
+from src.internal.file_processor.text_cache import PageTextCache
+
+
+PDF_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "internal", "file_processor")
+EXAMS_PDF = os.path.join(PDF_DIR, "экзамены.pdf")
+
+
+def test_process_pdf_returns_chunks_with_metadata():
+    chunks = PDFChunker(chunk_size=800, chunk_overlap=150).process_pdf(EXAMS_PDF)
+
+    assert chunks and all(isinstance(chunk, PDFChunk) for chunk in chunks)
+    assert chunks[0].metadata["source"] == EXAMS_PDF
+    assert chunks[0].metadata["page"] == chunks[0].page_number
+    assert chunks[-1].metadata["doc_metadata"]["page_count"] == 32
+    assert [chunk.metadata["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk.metadata["page"] <= chunk.metadata["page_end"] for chunk in chunks)
+
+
+def test_chunks_carry_across_pages():
+    per_page = PDFChunker(chunk_size=800, chunk_overlap=150, cross_page=False).process_pdf(EXAMS_PDF)
+    cross_page = PDFChunker(chunk_size=800, chunk_overlap=150).process_pdf(EXAMS_PDF)
+
+    assert all(chunk.metadata["page"] == chunk.metadata["page_end"] for chunk in per_page)
+    assert any(chunk.metadata["page"] < chunk.metadata["page_end"] for chunk in cross_page)
+    assert len(cross_page) < len(per_page)
+    assert min(len(chunk.text) for chunk in cross_page) > min(len(chunk.text) for chunk in per_page)
+
+
+def test_iter_spans_tracks_page_span():
+    chunker = LateChunker(chunk_size=40, chunk_overlap=12)
+    lines = [f"стр{page} строка {i}" for page in range(4) for i in range(3)]
+    pages = [(page, lines[page * 3:page * 3 + 3], [len(line) for line in lines[page * 3:page * 3 + 3]])
+             for page in range(4)]
+    pages.insert(2, (9, [], []))
+
+    spans = list(chunker.iter_spans(pages))
+
+    assert [text for text, _, _ in spans] == chunker.create_chunks("\n".join(lines))
+    for text, first_page, last_page in spans:
+        text_pages = [int(line[3]) for line in text.split("\n")]
+        assert (first_page, last_page) == (text_pages[0], text_pages[-1])
+
+
+def test_token_length_function():
+    class Encoding:
+        def __init__(self, ids):
+            self.ids = ids
+
+    class Tokenizer:
+        def encode(self, text):
+            return Encoding(text.split())
+
+    chunker = LateChunker(chunk_size=4, chunk_overlap=2, length_function=TokenLength(Tokenizer()))
+    chunks = chunker.create_chunks("а б\nв г\nд е\nж з")
+
+    assert chunks == ["а б\nв г", "в г\nд е", "д е\nж з"]
+    assert TokenLength(str.split)("три слова тут") == 3
+
+
+def test_process_pool_matches_serial_order():
+    serial = PDFChunker(chunk_size=800, chunk_overlap=150).process_pdfs([EXAMS_PDF, EXAMS_PDF])
+    chunker = PDFChunker(chunk_size=800, chunk_overlap=150, workers=2, pages_per_task=5, min_parallel_pages=1)
+    try:
+        parallel = chunker.process_pdfs([EXAMS_PDF, EXAMS_PDF])
+    finally:
+        chunker.close()
+
+    assert parallel == serial
+
+
+def test_process_pdfs_can_return_exceptions(tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    chunker = PDFChunker()
+
+    results = chunker.process_pdfs([str(broken), EXAMS_PDF], return_exceptions=True)
+
+    assert isinstance(results[0], Exception)
+    assert len(results[1]) > 0
+    with pytest.raises(Exception):
+        chunker.process_pdfs([str(broken)])
+
+
+def test_text_cache_rechunks_without_parsing_pdf(tmp_path, monkeypatch):
+    cache = PageTextCache(str(tmp_path / "text"))
+    renamed = tmp_path / "копия.pdf"
+    renamed.write_bytes(open(EXAMS_PDF, "rb").read())
+    first = PDFChunker(chunk_size=800, chunk_overlap=150, text_cache=cache).process_pdf(EXAMS_PDF)
+    expected = PDFChunker(chunk_size=500, chunk_overlap=50).process_pdf(str(renamed))
+    assert first == PDFChunker(chunk_size=800, chunk_overlap=150).process_pdf(EXAMS_PDF)
+
+    def no_parsing(*args, **kwargs):
+        raise AssertionError("PDF must not be opened on a cache hit")
+
+    monkeypatch.setattr(processor.fitz, "open", no_parsing)
+    hits = []
+    chunks = list(PDFChunker(chunk_size=500, chunk_overlap=50, text_cache=cache).iter_chunks(
+        str(renamed), on_text_cache=hits.append))
+
+    assert chunks == expected
+    assert chunks[0].metadata["doc_metadata"]["filename"] == "копия.pdf"
+    assert hits == [True]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1 and cache.stats()["entries"] == 1
+
+
+def test_text_cache_filled_by_process_pool_and_ignores_broken_entry(tmp_path):
+    cache = PageTextCache(str(tmp_path / "text"))
+    serial = PDFChunker(chunk_size=800, chunk_overlap=150).process_pdf(EXAMS_PDF)
+    chunker = PDFChunker(chunk_size=800, chunk_overlap=150, workers=2, pages_per_task=5, min_parallel_pages=1,
+                         text_cache=cache)
+    try:
+        assert list(chunker.iter_chunks(EXAMS_PDF)) == serial
+    finally:
+        chunker.close()
+
+    digest = cache.file_digest(EXAMS_PDF)
+    cached = cache.get(digest)
+    assert cached.page_count == 32 and cached.metadata["page_count"] == 32
+    cached.close()
+
+    with open(cache.path_for(digest), "r+b") as f:
+        f.truncate(100)
+    assert cache.get(digest) is None
+    assert PDFChunker(chunk_size=800, chunk_overlap=150, text_cache=cache).process_pdf(EXAMS_PDF) == serial
+    assert cache.get(digest) is not None
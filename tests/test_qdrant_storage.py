@@ -0,0 +1,131 @@
+import asyncio
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.ids import make_point_id
+from src.internal.storage.qdrant import AsyncQdrantStorage, QdrantStorage, collection_params, search_params
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+
+@pytest.fixture
+def storage():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256)
+    return QdrantStorage(config, client=QdrantClient(":memory:"))
+
+
+def make_chunks(source, texts):
+    metadata = [{"source": source, "page": 1, "chunk_index": i} for i in range(len(texts))]
+    return list(texts), metadata
+
+
+def test_point_id_is_deterministic():
+    meta = {"source": "a.pdf", "page": 2, "chunk_index": 0}
+
+    assert make_point_id("текст", meta) == make_point_id("текст", dict(meta))
+    assert make_point_id("текст", meta) != make_point_id("другой текст", meta)
+    assert make_point_id("текст", meta) != make_point_id("текст", {**meta, "page": 3})
+
+
+def test_save_data_twice_does_not_duplicate(storage):
+    chunks, metadata = make_chunks("a.pdf", ["один", "два"])
+    embeddings = np.stack([fake_vector(text) for text in chunks])
+
+    storage.save_data(embeddings, chunks, metadata)
+    storage.save_data(embeddings, chunks, metadata)
+
+    assert storage.client.count(storage.collection_name).count == 2
+    assert len(storage.get_ids_by_source("a.pdf")) == 2
+
+    hit = storage.get_data(fake_vector("один"), top_k=1, with_vectors=True)[0]
+    assert hit["text"] == "один"
+    assert np.allclose(hit["vector"], fake_vector("один"), atol=1e-5)
+    assert hit["score"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_sync_document_upserts_only_changes(storage, fake_sdk):
+    retriever = Retriever(storage=storage)
+    doc_model = fake_sdk.models.text_embeddings("doc")
+
+    chunks, metadata = make_chunks("a.pdf", ["один", "два", "три"])
+    assert retriever.sync_document("a.pdf", chunks, metadata) == {"added": 3, "unchanged": 0, "deleted": 0}
+
+    chunks, metadata = make_chunks("a.pdf", ["один", "два", "четыре"])
+    stats = retriever.sync_document("a.pdf", chunks, metadata)
+
+    assert stats == {"added": 1, "unchanged": 2, "deleted": 1}
+    assert doc_model.calls == 4
+    assert storage.client.count(storage.collection_name).count == 3
+    texts = {hit["text"] for hit in storage.get_data(fake_vector("четыре"), top_k=3)}
+    assert texts == {"один", "два", "четыре"}
+
+
+def test_save_data_in_pipelined_batches():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256,
+                           upsert_batch_size=2, upsert_parallelism=1, upsert_wait=False)
+    storage = QdrantStorage(config, client=QdrantClient(":memory:"))
+    chunks, metadata = make_chunks("b.pdf", [f"чанк {i}" for i in range(5)])
+
+    storage.save_data(np.stack([fake_vector(text) for text in chunks]), chunks, metadata)
+
+    assert storage.client.count(storage.collection_name).count == 5
+
+
+def test_tuning_options_map_to_collection_and_search_params():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, hnsw_m=32, hnsw_ef_construct=200,
+                           search_ef=128, on_disk=True, quantization="scalar", oversampling=2.0)
+
+    params = collection_params(config)
+    search = search_params(config)
+
+    assert params["vectors_config"].on_disk is True
+    assert params["hnsw_config"].m == 32 and params["hnsw_config"].ef_construct == 200
+    assert params["quantization_config"].scalar.always_ram is True
+    assert search.hnsw_ef == 128
+    assert search.quantization.rescore is True and search.quantization.oversampling == 2.0
+    assert search_params(StorageConfig(host="localhost", port=6333)) is None
+    with pytest.raises(ValueError):
+        StorageConfig(host="localhost", port=6333, quantization="pq")
+
+
+def test_quantized_collection_still_searchable():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, quantization="binary", oversampling=3.0)
+    storage = QdrantStorage(config, client=QdrantClient(":memory:"))
+    chunks, metadata = make_chunks("a.pdf", ["один", "два"])
+    storage.save_data(np.stack([fake_vector(text) for text in chunks]), chunks, metadata)
+
+    assert storage.get_data(fake_vector("два"), top_k=1)[0]["text"] == "два"
+
+
+def test_async_save_data_builds_batches_lazily_with_bounded_parallelism():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, upsert_batch_size=2, upsert_parallelism=2)
+    chunks, metadata = make_chunks("c.pdf", [f"чанк {i}" for i in range(9)])
+    consumed = []
+
+    def embeddings():
+        for text in chunks:
+            consumed.append(text)
+            yield fake_vector(text)
+
+    class RecordingClient:
+        def __init__(self):
+            self.active = self.peak = 0
+            self.upserts = []
+
+        async def upsert(self, collection_name, points, wait):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            # Сколько векторов было собрано к моменту отправки пакета
+            self.upserts.append((len(points), wait, len(consumed)))
+            await asyncio.sleep(0.01)
+            self.active -= 1
+
+    client = RecordingClient()
+    asyncio.run(AsyncQdrantStorage(config, client=client).save_data(embeddings(), chunks, metadata))
+
+    assert [(size, wait) for size, wait, _ in client.upserts] == [(2, False)] * 4 + [(1, True)]
+    assert client.upserts[0][2] < len(chunks)
+    assert client.peak <= 2
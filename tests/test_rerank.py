@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.internal.retriever.embedding_cache import EmbeddingCache
+from src.internal.retriever.rerank import mmr, normalize_rows, rerank_hits
+from src.internal.retriever.retriever import Retriever
+from src.internal.storage.numpy_storage import NumpyStorage
+from src.storage_config.config import StorageConfig
+from tests.fakes import fake_vector
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = normalize_rows([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.6, 0.8, 0.0]])
+    relevance = np.array([0.9, 0.89, 0.6], dtype=np.float32)
+
+    assert mmr(relevance, vectors, top_k=2, lambda_mult=0.5) == [0, 2]
+    assert mmr(relevance, vectors, top_k=2, lambda_mult=1.0) == [0, 1]
+
+
+def test_rerank_hits_without_vectors_keeps_order():
+    hits = [{"text": "a"}, {"text": "b"}, {"text": "c"}]
+    assert rerank_hits(hits, top_k=2, query_embedding=[1.0, 0.0]) == hits[:2]
+
+
+@pytest.fixture
+def storage():
+    config = StorageConfig(host="localhost", port=6333, vector_size=256, backend="numpy")
+    storage = NumpyStorage(config)
+    # Соседние окна с перекрытием дают почти одинаковые чанки
+    texts = [
+        "зачёт по курсовой работе ставит руководитель",
+        "зачёт по курсовой работе ставит руководитель проекта",
+        "курсовая работа сдаётся до конца семестра",
+        "расписание экзаменов публикуется заранее",
+    ]
+    storage.save_data(np.stack([fake_vector(text) for text in texts]), texts,
+                      [{"source": "a.pdf", "page": 1, "chunk_index": i} for i in range(len(texts))])
+    return storage
+
+
+def test_search_returns_stored_vectors_and_drops_overlap(storage, fake_sdk):
+    retriever = Retriever(storage, top_k=2, mmr_lambda=0.5)
+
+    hits = retriever.search("кто ставит зачёт по курсовой работе")
+
+    assert all(hit["vector"].shape == (256,) for hit in hits)
+    assert "руководитель" in hits[0]["text"]
+    assert "руководитель" not in hits[1]["text"]
+    assert fake_sdk.models.text_embeddings("doc").calls == 0
+
+
+def test_best_match_uses_cached_vectors(tmp_path, fake_sdk):
+    texts = ["Кошка сидит на дереве", "Собака лает на прохожего"]
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    retriever = Retriever(storage=None, embedding_cache=cache)
+    retriever.embed_chunks(texts)
+    doc_model = fake_sdk.models.text_embeddings("doc")
+    calls = doc_model.calls
+
+    result = retriever.best_match(["кошка сидит на дереве?"], [(text, "src") for text in texts], top_k=1)
+
+    assert result == texts[0]
+    assert doc_model.calls == calls
+    cache.close()
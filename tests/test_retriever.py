@@ -1,5 +1,8 @@
+import numpy as np
 import pytest
 from unittest.mock import MagicMock
+from src.internal.retriever import cache as cache_module
+from src.internal.retriever.cache import QueryEmbeddingCache
 from src.internal.retriever.retriever import Retriever
 
 
@@ -68,3 +71,39 @@ def test_best_match_with_empty_context(retriever):
     result = retriever.best_match(query_list, context_list, top_k=1)
 
     assert result == ""
+
+
+def test_find_similar_context_uses_query_cache(retriever, mock_storage, fake_sdk):
+    mock_storage.get_data.return_value = []
+    query_model = fake_sdk.models.text_embeddings("query")
+
+    retriever.find_similar_context("Когда экзамен?")
+    retriever.find_similar_context("  когда   ЭКЗАМЕН? ")
+
+    assert query_model.calls == 1
+    stats = retriever.query_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", np.zeros(2))
+    cache.put("b", np.ones(2))
+    cache.get("a")
+    cache.put("c", np.ones(2))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_query_cache_expires_entries(monkeypatch):
+    cache = QueryEmbeddingCache(max_size=2, ttl=10.0)
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache.put("a", np.zeros(2))
+    now[0] += 11.0
+
+    assert cache.get("a") is None
+    assert len(cache) == 0